@@ -1,22 +1,228 @@
+import bisect
+import csv
 import os
-import paramiko
-from ftplib import FTP
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from tkinterdnd2 import TkinterDnD, DND_FILES
 import threading
-from PIL import Image, ImageTk
+import queue
+from ftpuploader.engine import UploadEngine, split_outcomes
+from ftpuploader.metrics import TransferMetrics, describe_progress, save_run
+from ftpuploader.processes import ProcessUploadEngine
+from ftpuploader.scan import DEFAULT_EXCLUDE, FolderScan
+from ftpuploader.uploadqueue import UploadQueue
+
+# How often the Tk loop picks up progress from the upload thread
+POLL_INTERVAL_MS = 100
+
+# Globs for files taken from dropped folders; an empty include takes everything
+DROP_INCLUDE = ()
+DROP_EXCLUDE = DEFAULT_EXCLUDE
+
+# Worker processes for transfers, to use more than one core with many SFTP
+# sessions; 0 runs them on threads in this process
+UPLOAD_PROCESSES = 0
+
+# How often the file list applies status changes; any number of events per file become one update
+PANEL_REFRESH_MS = 250
+
+# File rows on screen; only these exist as Treeview items, however big the batch
+PANEL_ROWS = 10
+
+# File list columns: (name, heading, width)
+PANEL_COLUMNS = (
+    ("file", "File", 220),
+    ("state", "State", 90),
+    ("host", "Host", 130),
+    ("sent", "Sent", 110),
+    ("detail", "Error", 190),
+)
+
+# States the file list can be filtered on
+PANEL_STATES = ("all", "queued", "uploading", "uploaded", "skipped", "failed", "unavailable")
+
+
+class QueuePanel:
+    """Per-file list of state, host, bytes sent and error that stays fast with any number of files.
+
+    The Treeview only ever holds PANEL_ROWS items, refilled from self.rows
+    at the scroll position; it does not scroll itself. Files added with
+    add() (from any thread) and the changes of the tracked TransferMetrics
+    are applied together every PANEL_REFRESH_MS, and only the visible
+    items are redrawn, so the cost of a refresh does not grow with the batch.
+    """
+
+    def __init__(self, parent, font):
+        self.rows = []  # [path, state, host, size, sent, detail] per file, in the order first seen
+        self.index = {}  # path -> position in self.rows
+        self.counts = dict.fromkeys(PANEL_STATES[1:], 0)
+        self.view = None  # sorted positions of the rows that pass the filter; None when nothing is filtered
+        self.filter_state = "all"
+        self.filter_text = ""
+        self.offset = 0
+        self.metrics = None
+        self.dirty = False
+        self._lock = threading.Lock()
+        self._added = []
+
+        self.frame = tk.Frame(parent, bg="#2E3440")
+        bar = tk.Frame(self.frame, bg="#2E3440")
+        bar.pack(fill="x", pady=5)
+        self.state_filter = ttk.Combobox(bar, values=PANEL_STATES, state="readonly", width=11)
+        self.state_filter.set("all")
+        self.state_filter.bind("<<ComboboxSelected>>", lambda event: self.apply_filter())
+        self.state_filter.pack(side="left")
+        self.search = tk.StringVar()
+        self.search.trace_add("write", lambda *args: self.apply_filter())
+        ttk.Entry(bar, textvariable=self.search, width=20).pack(side="left", padx=5)
+        self.count_label = tk.Label(bar, text="", bg="#2E3440", fg="#ECEFF4", font=font)
+        self.count_label.pack(side="left", padx=5)
+        ttk.Button(bar, text="Export CSV", command=self.export, style="TButton").pack(side="right")
+
+        body = tk.Frame(self.frame, bg="#2E3440")
+        body.pack(fill="both", expand=True)
+        self.tree = ttk.Treeview(body, columns=[column[0] for column in PANEL_COLUMNS], show="headings",
+                                 height=PANEL_ROWS, selectmode="none")
+        for name, heading, width in PANEL_COLUMNS:
+            self.tree.heading(name, text=heading, anchor="w")
+            self.tree.column(name, width=width, anchor="w")
+        self.items = [self.tree.insert("", "end") for _ in range(PANEL_ROWS)]
+        self.scrollbar = ttk.Scrollbar(body, orient="vertical", command=self.on_scroll)
+        self.scrollbar.pack(side="right", fill="y")
+        self.tree.pack(side="left", fill="both", expand=True)
+        # Windows and macOS send <MouseWheel>, X11 buttons 4 and 5
+        self.tree.bind("<MouseWheel>", lambda event: self.scroll_to(self.offset + (-3 if event.delta > 0 else 3)))
+        self.tree.bind("<Button-4>", lambda event: self.scroll_to(self.offset - 3))
+        self.tree.bind("<Button-5>", lambda event: self.scroll_to(self.offset + 3))
+
+        self.redraw()
+        self.frame.after(PANEL_REFRESH_MS, self.refresh)
+
+    def add(self, file_paths):
+        """List files as queued at the next refresh. Safe from any thread."""
+        paths = [os.path.abspath(path) for path in file_paths]
+        with self._lock:
+            self._added += paths
+
+    def track(self, metrics):
+        """Follow the per-file state of an upload run from now on."""
+        self.metrics = metrics
+
+    def refresh(self):
+        """Apply what changed since the last refresh, redraw if anything did, and check again shortly."""
+        with self._lock:
+            added, self._added = self._added, []
+        for path in added:
+            position = self.index.get(path)
+            if position is None or self.rows[position][1] not in ("queued", "uploading"):
+                self.update(path, "queued", "", 0, 0, None)
+        if self.metrics is not None:
+            for path, (host, size, sent, state, detail) in self.metrics.changes().items():
+                self.update(path, state, host, size, sent, detail)
+        if self.dirty:
+            self.redraw()
+        self.frame.after(PANEL_REFRESH_MS, self.refresh)
+
+    def update(self, path, state, host, size, sent, detail):
+        """Set a file's row, keeping the state counts and the filtered view in step."""
+        position = self.index.get(path)
+        if position is None:
+            position = self.index[path] = len(self.rows)
+            self.rows.append([path, None, "", 0, 0, None])
+        row = self.rows[position]
+        if row[1] != state:
+            if row[1] is not None:
+                self.counts[row[1]] -= 1
+            self.counts[state] = self.counts.get(state, 0) + 1
+        row[1:] = [state, host, size, sent, detail]
+        if self.view is not None:
+            # Only the state changes a row's place in the view; bisect keeps it sorted
+            n = bisect.bisect_left(self.view, position)
+            listed = n < len(self.view) and self.view[n] == position
+            if self.matches(row) and not listed:
+                self.view.insert(n, position)
+            elif listed and not self.matches(row):
+                del self.view[n]
+        self.dirty = True
+
+    def matches(self, row):
+        return ((self.filter_state == "all" or row[1] == self.filter_state)
+                and self.filter_text in os.path.basename(row[0]).lower())
+
+    def apply_filter(self):
+        """Show only the rows in the chosen state whose name contains the search text."""
+        self.filter_state = self.state_filter.get()
+        self.filter_text = self.search.get().strip().lower()
+        if self.filter_state == "all" and not self.filter_text:
+            self.view = None
+        else:
+            self.view = [position for position, row in enumerate(self.rows) if self.matches(row)]
+        self.offset = 0
+        self.redraw()
+
+    def set_filter(self, state):
+        self.state_filter.set(state)
+        self.apply_filter()
+
+    def shown(self):
+        return len(self.rows) if self.view is None else len(self.view)
+
+    def redraw(self):
+        """Fill the Treeview's items with the rows at the scroll position."""
+        self.dirty = False
+        total = self.shown()
+        self.offset = max(0, min(self.offset, total - PANEL_ROWS))
+        for n, item in enumerate(self.items):
+            position = self.offset + n
+            if position < total:
+                path, state, host, size, sent, detail = self.rows[position if self.view is None else self.view[position]]
+                sent_text = f"{sent / 1e6:.1f} of {size / 1e6:.1f} MB" if size else ""
+                values = (os.path.basename(path), state, host, sent_text, detail or "")
+            else:
+                values = ("",) * len(PANEL_COLUMNS)
+            self.tree.item(item, values=values)
+        if total > PANEL_ROWS:
+            self.scrollbar.set(self.offset / total, (self.offset + PANEL_ROWS) / total)
+        else:
+            self.scrollbar.set(0, 1)
+        states = ", ".join(f"{count} {state}" for state, count in self.counts.items() if count)
+        self.count_label.config(text=f"{total} of {len(self.rows)} file(s)" + (f": {states}" if states else ""))
+
+    def on_scroll(self, action, amount, unit=None):
+        """Scrollbar command: ("moveto", fraction) or ("scroll", n, "units" or "pages")."""
+        if action == "moveto":
+            self.scroll_to(round(float(amount) * self.shown()))
+        elif unit == "pages":
+            self.scroll_to(self.offset + int(amount) * PANEL_ROWS)
+        else:
+            self.scroll_to(self.offset + int(amount))
+
+    def scroll_to(self, offset):
+        self.offset = offset
+        self.redraw()
+
+    def export(self):
+        """Save the rows that pass the filter as CSV."""
+        path = filedialog.asksaveasfilename(title="Export File List", defaultextension=".csv",
+                                            filetypes=[("CSV files", "*.csv")])
+        if not path:
+            return
+        positions = range(len(self.rows)) if self.view is None else self.view
+        try:
+            with open(path, "w", newline="", encoding="utf-8") as file:
+                writer = csv.writer(file)
+                writer.writerow(("path", "state", "host", "size", "sent", "detail"))
+                for position in positions:
+                    writer.writerow(self.rows[position])
+        except OSError as e:
+            messagebox.showerror("Export Failed", f"Error: {str(e)}")
 
-# Server configurations (replace with your server details)
-SERVERS = {
- 
-}
 
 class FileUploaderApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Singapore File Uploader")
-        self.root.geometry("600x400")
+        self.root.geometry("780x780")
         self.root.configure(bg="#2E3440")  # Dark theme background
 
         # Custom font
@@ -26,15 +232,26 @@ class FileUploaderApp:
         self.root.drop_target_register(DND_FILES)
         self.root.dnd_bind('<<Drop>>', self.on_drop)
 
-        # File list
-        self.file_list = []
+        # Files waiting to upload; kept on disk so a crash or restart loses nothing
+        self.queue = UploadQueue()
+        self.uploading = False
+
+        # Dropped folders being walked in the background
+        self.scans = []
+
+        # Progress and results posted by the upload thread
+        self.events = queue.Queue()
+
+        # Routing and uploads, with sessions reused across files and batches
+        self.engine = ProcessUploadEngine(processes=UPLOAD_PROCESSES) if UPLOAD_PROCESSES else UploadEngine()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
         # Header
         self.header = tk.Label(root, text="Singapore File Uploader", bg="#2E3440", fg="#ECEFF4", font=("Helvetica", 18, "bold"))
         self.header.pack(pady=10)
 
         # Instructions
-        self.label = tk.Label(root, text="Drag and drop files or click 'Select Files' to upload", bg="#2E3440", fg="#ECEFF4", font=self.custom_font)
+        self.label = tk.Label(root, text="Drag and drop files or folders, or click 'Select Files' to upload", bg="#2E3440", fg="#ECEFF4", font=self.custom_font)
         self.label.pack(pady=10)
 
         # Select Files Button
@@ -45,9 +262,21 @@ class FileUploaderApp:
         self.progress = ttk.Progressbar(root, orient="horizontal", length=500, mode="determinate", style="TProgressbar")
         self.progress.pack(pady=20)
 
+        # Action buttons, side by side to leave room for the file list
+        self.buttons = tk.Frame(root, bg="#2E3440")
+        self.buttons.pack(pady=5)
+
         # Upload Button
-        self.upload_button = ttk.Button(root, text="Upload Files", command=self.start_upload, style="TButton", state=tk.DISABLED)
-        self.upload_button.pack(pady=5)
+        self.upload_button = ttk.Button(self.buttons, text="Upload Files", command=self.start_upload, style="TButton", state=tk.DISABLED)
+        self.upload_button.pack(side="left", padx=5)
+
+        # Preview Button: shows how the batch would be grouped, without uploading
+        self.preview_button = ttk.Button(self.buttons, text="Preview Plan", command=self.start_preview, style="TButton", state=tk.DISABLED)
+        self.preview_button.pack(side="left", padx=5)
+
+        # Bandwidth Button: caps can be changed while an upload is running
+        self.bandwidth_button = ttk.Button(self.buttons, text="Bandwidth", command=self.show_bandwidth, style="TButton")
+        self.bandwidth_button.pack(side="left", padx=5)
 
         # Status Label
         self.status_label = tk.Label(root, text="", bg="#2E3440", fg="#ECEFF4", font=self.custom_font)
@@ -57,6 +286,11 @@ class FileUploaderApp:
         self.loading_label = tk.Label(root, text="", bg="#2E3440", fg="#ECEFF4", font=self.custom_font)
         self.loading_label.pack(pady=5)
 
+        # File list: every queued file with its state; filtered to the failures after a batch
+        self.panel = QueuePanel(root, self.custom_font)
+        self.panel.frame.pack(fill="both", expand=True, padx=10, pady=5)
+        self.panel.add(self.queue.unfinished_paths())
+
         # Configure styles
         self.configure_styles()
 
@@ -72,164 +306,236 @@ class FileUploaderApp:
         # Progress bar style
         style.configure("TProgressbar", background="#5E81AC", troughcolor="#3B4252", thickness=20)
 
+        # File list style
+        style.configure("Treeview", background="#3B4252", fieldbackground="#3B4252", foreground="#ECEFF4", font=("Helvetica", 10))
+        style.configure("Treeview.Heading", background="#4C566A", foreground="#ECEFF4", font=("Helvetica", 10, "bold"))
+
     def on_drop(self, event):
         """Handle files dropped into the window."""
         files = self.root.tk.splitlist(event.data)
-        for file in files:
-            if os.path.isfile(file):
-                self.file_list.append(file)
+        self.enqueue(file for file in files if os.path.isfile(file))
+        folders = [file for file in files if os.path.isdir(file)]
+        if folders:
+            # Walked off the Tk thread; files are queued in batches as they are found
+            scan = FolderScan(folders, self.enqueue, include=DROP_INCLUDE, exclude=DROP_EXCLUDE)
+            self.scans.append(scan.start())
+            if len(self.scans) == 1:
+                self.root.after(POLL_INTERVAL_MS, self.watch_scans)
+        self.update_ui()
+
+    def enqueue(self, file_paths):
+        """Queue files and list them in the file list. Safe from any thread."""
+        file_paths = list(file_paths)
+        self.queue.enqueue(file_paths)
+        self.panel.add(file_paths)
+
+    def scanning(self):
+        """Return True while a dropped folder is still being walked. Safe from any thread."""
+        return any(scan.is_alive() for scan in list(self.scans))
+
+    def watch_scans(self):
+        """Refresh the queued count while folders are being walked."""
+        self.scans = [scan for scan in self.scans if scan.is_alive()]
         self.update_ui()
+        if self.scans:
+            self.root.after(POLL_INTERVAL_MS * 5, self.watch_scans)
 
     def select_files(self):
         """Open a file dialog to select files."""
         files = filedialog.askopenfilenames(title="Select Files")
         if files:
-            self.file_list.extend(files)
+            self.enqueue(files)
             self.update_ui()
 
     def update_ui(self):
         """Update the UI based on the current state."""
-        if self.file_list:
+        if self.uploading:
+            # The worker picks new files up by itself; progress updates the status label
+            return
+        queued = self.queue.unfinished()
+        if queued:
             self.upload_button.config(state=tk.NORMAL)
-            self.status_label.config(text=f"{len(self.file_list)} file(s) selected")
+            self.preview_button.config(state=tk.NORMAL)
+            scanning = ", scanning folders..." if self.scans else ""
+            self.status_label.config(text=f"{queued} file(s) queued{scanning}")
         else:
             self.upload_button.config(state=tk.DISABLED)
+            self.preview_button.config(state=tk.DISABLED)
             self.status_label.config(text="No files selected")
 
     def start_upload(self):
         """Start the upload process in a separate thread."""
-        self.upload_button.config(state=tk.DISABLED)
-        self.select_button.config(state=tk.DISABLED)
-        self.loading_label.config(text="Uploading...")
-
-        # Start upload in a separate thread
-        upload_thread = threading.Thread(target=self.upload_files)
-        upload_thread.start()
-
-    def upload_files(self):
-        """Upload files to the appropriate server (FTP or SFTP)."""
-        if not self.file_list:
+        if not self.queue.unfinished():
             messagebox.showwarning("No Files", "No files selected for upload.")
             return
 
+        # Select Files stays enabled: files added now join the running upload
+        self.uploading = True
+        self.upload_button.config(state=tk.DISABLED)
+        self.preview_button.config(state=tk.DISABLED)
+        self.loading_label.config(text="Uploading...")
         self.progress["value"] = 0
-        self.progress["maximum"] = len(self.file_list)
+        self.progress["maximum"] = 1
 
-        # Track successful and failed uploads
-        successful_uploads = []
-        failed_uploads = []
+        # The worker only posts to this queue; poll_events renders it on the Tk thread
+        metrics = TransferMetrics(self.events.put)
+        self.panel.track(metrics)
 
-        for index, file_path in enumerate(self.file_list):
-            file_name = os.path.basename(file_path)
-            server_key = file_name[:7].upper()
+        # Start upload in a separate thread
+        upload_thread = threading.Thread(target=self.upload_files, args=(metrics,), daemon=True)
+        upload_thread.start()
+        self.root.after(POLL_INTERVAL_MS, self.poll_events)
+
+    def upload_files(self, metrics):
+        """Upload queued files to the appropriate server (FTP or SFTP) until the queue is empty. Runs on the worker thread."""
+        try:
+            outcomes = self.engine.drain(self.queue, metrics, more=self.scanning)
+            save_run(metrics)
+        except Exception as e:
+            self.events.put(("error", str(e)))
+        else:
+            self.events.put(("done", outcomes))
 
-            if server_key not in SERVERS:
-                failed_uploads.append((file_name, "No server configured for prefix"))
-                continue
+    def start_preview(self):
+        """Plan the selected files in a separate thread and show the plan."""
+        self.upload_button.config(state=tk.DISABLED)
+        self.preview_button.config(state=tk.DISABLED)
+        self.loading_label.config(text="Planning...")
+        preview_thread = threading.Thread(target=self.plan_files, args=(self.queue.unfinished_paths(),), daemon=True)
+        preview_thread.start()
+        self.root.after(POLL_INTERVAL_MS, self.poll_events)
+
+    def plan_files(self, file_paths):
+        """Route, check and group files without connecting. Runs on the worker thread."""
+        try:
+            plan = self.engine.plan(file_paths)
+        except Exception as e:
+            self.events.put(("error", str(e)))
+        else:
+            self.events.put(("plan", plan))
 
-            server_config = SERVERS[server_key]
+    def poll_events(self):
+        """Apply queued worker events to the widgets, then check again shortly."""
+        progress = None
+        finished = None
+        while True:
             try:
-                if server_config["type"] == "sftp":
-                    self.upload_to_sftp(file_path, server_config)
-                elif server_config["type"] == "sftp2222":
-                    self.upload_to_sftp2222(file_path, server_config)
-                elif server_config["type"] == "sftp1":
-                    self.upload_to_sftp1(file_path, server_config)
-                elif server_config["type"] == "sftp2":
-                    self.upload_to_sftp2(file_path, server_config)
-                elif server_config["type"] == "ftp":
-                    self.upload_to_ftp(file_path, server_config)
-                else:
-                    failed_uploads.append((file_name, f"Unsupported server type: {server_config['type']}"))
-                    continue
-
-                successful_uploads.append((file_name, server_config["username"]))
-                self.progress["value"] = index + 1
-                self.root.update_idletasks()
-            except Exception as e:
-                failed_uploads.append((file_name, f"Error: {str(e)}"))
+                event = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if event[0] == "progress":
+                progress = event[1]  # only the latest one matters
+            elif event[0] in ("done", "error", "plan"):
+                finished = event
+
+        if progress:
+            self.progress["maximum"] = max(progress["bytes_total"], 1)
+            self.progress["value"] = progress["bytes_sent"]
+            self.status_label.config(text=describe_progress(progress))
+
+        if finished is None:
+            self.root.after(POLL_INTERVAL_MS, self.poll_events)
+        elif finished[0] == "error":
+            messagebox.showerror("Upload Failed", finished[1])
+            self.finish_upload()
+        elif finished[0] == "plan":
+            self.loading_label.config(text="")
+            self.update_ui()
+            self.show_plan(finished[1])
+        else:
+            # Track successful and failed uploads
+            successful_uploads, failed_uploads, skipped_uploads, retried_uploads, unavailable_uploads = split_outcomes(finished[1])
 
-        # Display summary
-        self.show_summary(successful_uploads, failed_uploads)
+            # Display summary
+            self.finish_upload()
+            self.show_summary(successful_uploads, failed_uploads, skipped_uploads, retried_uploads, unavailable_uploads)
 
-        # Reset UI
-        self.file_list.clear()
+    def finish_upload(self):
+        """Reset the UI once a batch is over."""
+        self.uploading = False
         self.update_ui()
         self.loading_label.config(text="Upload Complete")
         self.upload_button.config(state=tk.NORMAL)
         self.select_button.config(state=tk.NORMAL)
 
-    def show_summary(self, successful_uploads, failed_uploads):
-        """Display a summary of successful and failed uploads."""
-        summary = "Upload Summary:\n\n"
-        summary += "Successful Uploads:\n"
-        for file_name, username in successful_uploads:
-            summary += f"- {file_name} (Server: {username})\n"
-
-        summary += "\nFailed Uploads:\n"
-        for file_name, error in failed_uploads:
-            summary += f"- {file_name} (Error: {error})\n"
-
-        messagebox.showinfo("Upload Summary", summary)
-
-    def upload_to_sftp(self, file_path, server_config):
-        """Upload a file to an SFTP server port 22 root directory."""
-        transport = paramiko.Transport((server_config["host"], 22))
-        transport.connect(username=server_config["username"], password=server_config["password"])
-        sftp = paramiko.SFTPClient.from_transport(transport)
-
-        file_name = os.path.basename(file_path)
-        remote_path = f"/{file_name}"  # Change this to your desired remote path
-        sftp.put(file_path, remote_path)
-        sftp.close()
-        transport.close()
-
-    def upload_to_sftp1(self, file_path, server_config):
-        """Upload a file to an SFTP server over port 2222 root directory."""
-        transport = paramiko.Transport((server_config["host"], 2222))
-        transport.connect(username=server_config["username"], password=server_config["password"])
-        sftp = paramiko.SFTPClient.from_transport(transport)
-
-        file_name = os.path.basename(file_path)
-        remote_path = f"/{file_name}"  # Change this to your desired remote path
-        sftp.put(file_path, remote_path)
-        sftp.close()
-        transport.close()
-
-    def upload_to_sftp2(self, file_path, server_config):
-        """Upload a file to an SFTP server for integration 1500204 directory."""
-        transport = paramiko.Transport((server_config["host"], 2222))
-        transport.connect(username=server_config["username"], password=server_config["password"])
-        sftp = paramiko.SFTPClient.from_transport(transport)
-
-        file_name = os.path.basename(file_path)
-        remote_path = f"/POS/15/1500204/{file_name}"  # Change this to your desired remote path
-        sftp.put(file_path, remote_path)
-        sftp.close()
-        transport.close()
-
-    def upload_to_sftp2222(self, file_path, server_config):
-        """Upload a file to an SFTP server for tenant 2500100 ONLY."""
-        transport = paramiko.Transport((server_config["host"], 2222))
-        transport.connect(username=server_config["username"], password=server_config["password"])
-        sftp = paramiko.SFTPClient.from_transport(transport)
-
-        file_name = os.path.basename(file_path)
-        remote_path = f"/POS/25/2500100/{file_name}"  # Change this to your desired remote path
-        sftp.put(file_path, remote_path)
-        sftp.close()
-        transport.close()
-
-    def upload_to_ftp(self, file_path, server_config):
-        """Upload a file to an FTP server."""
-        ftp = FTP(server_config["host"])
-        ftp.login(server_config["username"], server_config["password"])
-        ftp.cwd("/")  # Change this to your desired remote directory
-
-        file_name = os.path.basename(file_path)
-        with open(file_path, "rb") as file:
-            ftp.storbinary(f"STOR {file_name}", file)
-        ftp.quit()
+    def show_summary(self, successful_uploads, failed_uploads, skipped_uploads=(), retried_uploads=(), unavailable_uploads=()):
+        """Count a finished batch's outcomes; the file list has the details, filtered to what needs attention."""
+        summary = f"Upload Complete: {len(successful_uploads) + len(retried_uploads)} uploaded"
+        if retried_uploads:
+            summary += f" ({len(retried_uploads)} after retry)"
+        summary += f", {len(failed_uploads)} failed"
+        if unavailable_uploads:
+            summary += f", {len(unavailable_uploads)} not attempted"
+        if skipped_uploads:
+            summary += f", {len(skipped_uploads)} skipped"
+        self.loading_label.config(text=summary)
+        if failed_uploads:
+            self.panel.set_filter("failed")
+        elif unavailable_uploads:
+            self.panel.set_filter("unavailable")
+
+    def show_plan(self, plan):
+        """Display the upload plan in its own window."""
+        window = tk.Toplevel(self.root)
+        window.title("Upload Plan")
+        window.geometry("640x420")
+        window.configure(bg="#2E3440")
+        text = tk.Text(window, bg="#3B4252", fg="#ECEFF4", font=("Courier", 10), wrap="none")
+        scrollbar = ttk.Scrollbar(window, orient="vertical", command=text.yview)
+        text.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side="right", fill="y")
+        text.pack(side="left", fill="both", expand=True)
+        text.insert("1.0", plan.describe())
+        text.config(state=tk.DISABLED)
+
+    def show_bandwidth(self):
+        """Let the user change the global and per-host upload caps, in Mbit/s."""
+        window = tk.Toplevel(self.root)
+        window.title("Bandwidth")
+        window.configure(bg="#2E3440")
+        total_rate, host_rates = self.engine.bandwidth.rates()
+        # Entries without a host are misconfigured; uploads report them, so they get no cap here
+        hosts = sorted({config["host"] for config in self.engine.servers.values() if config.get("host")} | set(host_rates))
+
+        def to_mbps(rate):
+            return "" if rate is None else f"{rate * 8 / 1e6:g}"
+
+        tk.Label(window, text="Caps in Mbit/s, blank for unlimited", bg="#2E3440", fg="#ECEFF4", font=self.custom_font).grid(row=0, column=0, columnspan=2, padx=10, pady=10)
+        entries = {}
+        for row, host in enumerate([None] + hosts, start=1):
+            label = "All uploads" if host is None else host
+            tk.Label(window, text=label, bg="#2E3440", fg="#ECEFF4", font=self.custom_font).grid(row=row, column=0, sticky="w", padx=10)
+            entry = ttk.Entry(window, width=10)
+            entry.insert(0, to_mbps(total_rate if host is None else host_rates.get(host)))
+            entry.grid(row=row, column=1, padx=10, pady=2)
+            entries[host] = entry
+
+        def apply():
+            rates = {}
+            for host, entry in entries.items():
+                text = entry.get().strip()
+                try:
+                    rates[host] = float(text) * 1e6 / 8 if text else None
+                except ValueError:
+                    messagebox.showerror("Bandwidth", f"Not a number: {text}", parent=window)
+                    return
+                if rates[host] is not None and rates[host] <= 0:
+                    messagebox.showerror("Bandwidth", f"Caps must be above zero: {text}", parent=window)
+                    return
+            for host, rate in rates.items():
+                if host is None:
+                    self.engine.bandwidth.set_rate(rate)
+                else:
+                    self.engine.bandwidth.set_host_rate(host, rate)
+            window.destroy()
+
+        ttk.Button(window, text="Apply", command=apply, style="TButton").grid(row=len(entries) + 1, column=0, columnspan=2, pady=10)
+
+    def on_close(self):
+        """Close pooled sessions before the window goes away."""
+        self.engine.close()
+        self.queue.close()
+        self.root.destroy()
 
 
 if __name__ == "__main__":
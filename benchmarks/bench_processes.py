@@ -0,0 +1,114 @@
+"""Aggregate SFTP MB/s of the threaded engine against ProcessUploadEngine with more and more processes.
+
+    python -m benchmarks.bench_processes --hosts 4 --sessions 4 --count 64 --size-mb 8
+
+Every stand-in host runs in a process of its own, listening on its own
+127.0.0.x address, so the servers' paramiko is not what limits the
+numbers. The same files go to all hosts in every run, with a fresh
+manifest and journal, once through UploadEngine (threads in one process)
+and once through ProcessUploadEngine for each process count up to
+--max-processes. MB/s should grow with the process count until the
+cores, or the stand-ins, run out.
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from .bench_transfer import make_files
+
+USERNAME = "bench"
+PASSWORD = "bench"
+
+
+def serve(root, host, ready, stop):
+    """Run one SFTP stand-in until stop is set; runs in its own process."""
+    from .sftp_standin import SFTPStandIn
+
+    with SFTPStandIn(root, users={USERNAME: PASSWORD}, host=host) as standin:
+        ready.put(standin.port)
+        stop.wait()
+
+
+def process_counts(maximum):
+    counts = [1]
+    while counts[-1] * 2 <= maximum:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != maximum:
+        counts.append(maximum)
+    return counts
+
+
+def run(label, engine_class, servers, paths, state, **options):
+    from ftpuploader.journal import TransferJournal
+    from ftpuploader.manifest import DeliveryManifest
+
+    shutil.rmtree(state, ignore_errors=True)
+    os.makedirs(state)
+    engine = engine_class(servers=servers, manifest=DeliveryManifest(os.path.join(state, "manifest.sqlite3")),
+                          journal=TransferJournal(os.path.join(state, "journal.json")), **options)
+    try:
+        start = time.perf_counter()
+        outcomes = engine.upload_batch(paths)
+        elapsed = time.perf_counter() - start
+    finally:
+        engine.close()
+    total = sum(os.path.getsize(path) for path in paths)
+    failed = sum(1 for outcome in outcomes if outcome[2] != "uploaded")
+    print(f"{label:<14} {total / elapsed / 1e6:8.2f} MB/s  ({len(paths)} files, {elapsed:.2f}s)"
+          + (f"  FAILED {failed}" if failed else ""))
+    return total / elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hosts", type=int, default=4, help="SFTP stand-ins, one process each")
+    parser.add_argument("--sessions", type=int, default=4, help="max_sessions for every host")
+    parser.add_argument("--count", type=int, default=64, help="files per host")
+    parser.add_argument("--size-mb", type=float, default=8, help="size of each file")
+    parser.add_argument("--max-processes", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    work = tempfile.mkdtemp(prefix="ftpuploader-bench-")
+    context = multiprocessing.get_context("spawn")
+    stop = context.Event()
+    servers = {}
+    standins = []
+    paths = []
+    try:
+        for n in range(args.hosts):
+            prefix = f"BENCH{n:02d}"
+            root = os.path.join(work, f"root-{n}")
+            os.makedirs(root)
+            host = f"127.0.0.{n + 1}"
+            ready = context.Queue()
+            process = context.Process(target=serve, args=(root, host, ready, stop), daemon=True)
+            process.start()
+            standins.append(process)
+            servers[prefix] = {"type": "sftp", "host": host, "port": ready.get(timeout=60),
+                               "username": USERNAME, "password": PASSWORD, "max_sessions": args.sessions}
+            source = os.path.join(work, f"source-{n}")
+            os.makedirs(source)
+            paths += make_files(source, prefix, args.count, int(args.size_mb * 1024 * 1024))
+
+        from ftpuploader.engine import UploadEngine
+        from ftpuploader.processes import ProcessUploadEngine
+
+        print(f"{args.hosts} hosts x {args.sessions} sessions, {len(paths)} x {args.size_mb:g} MB, "
+              f"{os.cpu_count()} cores")
+        state = os.path.join(work, "state")
+        baseline = run("threads", UploadEngine, servers, paths, state)
+        for count in process_counts(args.max_processes):
+            rate = run(f"{count} process(es)", ProcessUploadEngine, servers, paths, state, processes=count)
+            print(f"{'':<14} {rate / baseline:8.2f}x threads")
+    finally:
+        stop.set()
+        for process in standins:
+            process.join(10)
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
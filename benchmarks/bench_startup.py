@@ -0,0 +1,57 @@
+"""Measure import/startup time of the GUI and headless entry points with python -X importtime.
+
+    python -m benchmarks.bench_startup --runs 7
+
+The GUI script is loaded without running its __main__ block, so no
+window is opened. Reports the median of the summed top-level import
+times and the slowest top-level imports.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GUI_SCRIPT = os.path.join(REPO, "Singapore FTP Uploader-working.py")
+
+ENTRY_POINTS = {
+    "gui": ["-c", f"import runpy; runpy.run_path({GUI_SCRIPT!r}, run_name='gui')"],
+    "cli": ["-m", "ftpuploader", "--help"],
+}
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def import_times(args):
+    """Run once and return {top-level module: cumulative microseconds}."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=REPO, capture_output=True, text=True,
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match and not match.group(3):
+            modules[match.group(4)] = int(match.group(2))
+    return modules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5, help="slowest top-level imports to list")
+    args = parser.parse_args(argv)
+
+    for name, entry_args in ENTRY_POINTS.items():
+        runs = [import_times(entry_args) for _ in range(args.runs)]
+        totals = [sum(run.values()) for run in runs]
+        print(f"{name}: {statistics.median(totals) / 1000:.1f} ms of imports (median of {args.runs})")
+        slowest = sorted(runs[-1].items(), key=lambda item: item[1], reverse=True)[:args.top]
+        for module, micros in slowest:
+            print(f"    {micros / 1000:8.1f} ms  {module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""Standard upload workloads run through UploadEngine.upload_batch against loopback stand-ins.
+
+    python -m benchmarks.bench_suite                      # every workload
+    python -m benchmarks.bench_suite tiny mixed --rtt 0.05 --bandwidth-mbps 100
+    python -m benchmarks.bench_suite --json results.json  # keep numbers to compare later
+
+Three stand-ins are started: an SFTP server for 22-style ("sftp") routes,
+one for 2222-style ("sftp1") routes and an FTP server. Files are spread
+evenly across them. Each workload runs with a fresh state directory, so
+the manifest never skips anything, and reports files/s, MB/s and p50/p99
+per-file latency.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from .ftp_standin import FTPStandIn
+
+USERNAME = "bench"
+PASSWORD = "bench"
+
+# Route prefix -> server type
+ROUTES = {
+    "BENCH22": "sftp",
+    "BENCH2K": "sftp1",
+    "BENCHFT": "ftp",
+}
+
+KB = 1024
+MB = 1024 * KB
+
+
+def tiny_workload(args):
+    return [KB] * args.tiny_count
+
+
+def mixed_workload(args):
+    # Log-uniform between 1 KiB and 64 MiB, like a day of POS exports and reports
+    rng = random.Random(8)
+    return [int(2 ** rng.uniform(10, 26)) for _ in range(args.mixed_count)]
+
+
+def large_workload(args):
+    return [int(args.large_gb * 1024 * MB)] * args.large_count
+
+
+WORKLOADS = {
+    "tiny": tiny_workload,
+    "mixed": mixed_workload,
+    "large": large_workload,
+}
+
+
+def make_files(directory, sizes):
+    """Create test files, spreading them over the routes; large ones are sparse."""
+    prefixes = list(ROUTES)
+    block = os.urandom(MB)
+    paths = []
+    for n, size in enumerate(sizes):
+        path = os.path.join(directory, f"{prefixes[n % len(prefixes)]}_{n:06d}.dat")
+        with open(path, "wb") as file:
+            if size > 64 * MB:
+                file.truncate(size)
+            else:
+                remaining = size
+                while remaining > 0:
+                    file.write(block[:min(remaining, MB)])
+                    remaining -= MB
+        paths.append(path)
+    return paths
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_workload(name, sizes, args, work):
+    from .sftp_standin import SFTPStandIn
+
+    run_dir = os.path.join(work, name)
+    source = os.path.join(run_dir, "source")
+    os.makedirs(source)
+    paths = make_files(source, sizes)
+
+    standin_options = {
+        "users": {USERNAME: PASSWORD},
+        "rtt": args.rtt,
+        "bandwidth": args.bandwidth_mbps * 1e6 / 8 if args.bandwidth_mbps else None,
+        "max_sessions_per_login": args.max_sessions,
+    }
+    standins = {}
+    for prefix, server_type in ROUTES.items():
+        root = os.path.join(run_dir, f"root-{server_type}")
+        os.makedirs(root)
+        standin_class = FTPStandIn if server_type == "ftp" else SFTPStandIn
+        standins[prefix] = standin_class(root, **standin_options).start()
+
+    # Fresh manifest and journal for every workload
+    from ftpuploader import state
+    state.STATE_DIR = os.path.join(run_dir, "state")
+    from ftpuploader.engine import UploadEngine
+    from ftpuploader.metrics import TransferMetrics
+
+    servers = {
+        prefix: {"type": server_type, "host": standins[prefix].host, "port": standins[prefix].port,
+                 "username": USERNAME, "password": PASSWORD, "max_sessions": args.max_sessions or 2}
+        for prefix, server_type in ROUTES.items()
+    }
+    engine = UploadEngine(servers=servers)
+    metrics = TransferMetrics()
+    try:
+        start = time.perf_counter()
+        outcomes = engine.upload_batch(paths, metrics)
+        elapsed = time.perf_counter() - start
+    finally:
+        engine.close()
+        for standin in standins.values():
+            standin.stop()
+
+    report = metrics.report()
+    latencies = [entry["seconds"] for entry in report["files"] if entry["seconds"] is not None]
+    total_bytes = sum(sizes)
+    failed = sum(1 for outcome in outcomes if outcome[2] != "uploaded")
+    if not args.keep:
+        shutil.rmtree(run_dir, ignore_errors=True)
+    return {
+        "workload": name,
+        "files": len(sizes),
+        "failed": failed,
+        "bytes": total_bytes,
+        "seconds": elapsed,
+        "files_per_second": len(sizes) / elapsed,
+        "mb_per_second": total_bytes / elapsed / 1e6,
+        "p50_latency": percentile(latencies, 0.50),
+        "p99_latency": percentile(latencies, 0.99),
+    }
+
+
+def print_result(result):
+    print(f"{result['workload']:<8} {result['files']:>7} files {result['bytes'] / 1e6:>10.1f} MB "
+          f"{result['seconds']:>8.2f}s {result['files_per_second']:>9.1f} files/s "
+          f"{result['mb_per_second']:>8.2f} MB/s  p50 {_ms(result['p50_latency'])}  p99 {_ms(result['p99_latency'])}"
+          + (f"  FAILED {result['failed']}" if result["failed"] else ""))
+
+
+def _ms(seconds):
+    return "     -  " if seconds is None else f"{seconds * 1000:7.1f}ms"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("workloads", nargs="*", metavar="workload",
+                        help=f"workloads to run: {', '.join(WORKLOADS)} (default: all)")
+    parser.add_argument("--rtt", type=float, default=0.02, help="injected round-trip time in seconds")
+    parser.add_argument("--bandwidth-mbps", type=float, help="cap each stand-in at this many Mbit/s")
+    parser.add_argument("--max-sessions", type=int, help="logins each stand-in allows per username")
+    parser.add_argument("--tiny-count", type=int, default=10000)
+    parser.add_argument("--mixed-count", type=int, default=200)
+    parser.add_argument("--large-count", type=int, default=2)
+    parser.add_argument("--large-gb", type=float, default=2.0)
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--keep", action="store_true", help="keep generated files and uploads")
+    args = parser.parse_args(argv)
+    for name in args.workloads:
+        if name not in WORKLOADS:
+            parser.error(f"unknown workload {name!r}")
+
+    work = tempfile.mkdtemp(prefix="ftpuploader-suite-")
+    print(f"rtt {args.rtt * 1000:.0f} ms, bandwidth {args.bandwidth_mbps or 'unlimited'} Mbit/s, "
+          f"max sessions {args.max_sessions or 'unlimited'}, work dir {work}")
+    results = []
+    for name in args.workloads or list(WORKLOADS):
+        result = run_workload(name, WORKLOADS[name](args), args, work)
+        print_result(result)
+        results.append(result)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+    if not args.keep:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
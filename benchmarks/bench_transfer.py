@@ -0,0 +1,110 @@
+"""Compare MB/s of the tuned transfer path against the original upload_to_* code.
+
+Runs both against loopback stand-ins with injected latency:
+
+    python -m benchmarks.bench_transfer --rtt 0.1 --size-mb 64 --count 3
+
+The "original" rows reproduce the pre-tuning drivers: a new connection
+per file, paramiko's default window with sftp.put, and storbinary's
+8 KiB default block size.
+"""
+import argparse
+import os
+import tempfile
+import time
+from ftplib import FTP
+
+from .ftp_standin import FTPStandIn
+
+USERNAME = "bench"
+PASSWORD = "bench"
+
+
+def original_sftp(file_path, host, port):
+    import paramiko
+
+    transport = paramiko.Transport((host, port))
+    transport.connect(username=USERNAME, password=PASSWORD)
+    sftp = paramiko.SFTPClient.from_transport(transport)
+    sftp.put(file_path, f"/{os.path.basename(file_path)}")
+    sftp.close()
+    transport.close()
+
+
+def original_ftp(file_path, host, port):
+    ftp = FTP()
+    ftp.connect(host, port)
+    ftp.login(USERNAME, PASSWORD)
+    ftp.cwd("/")
+    with open(file_path, "rb") as file:
+        ftp.storbinary(f"STOR {os.path.basename(file_path)}", file)
+    ftp.quit()
+
+
+def make_files(directory, prefix, count, size):
+    paths = []
+    block = os.urandom(1024 * 1024)
+    for n in range(count):
+        path = os.path.join(directory, f"{prefix}_{n:04d}.bin")
+        with open(path, "wb") as file:
+            remaining = size
+            while remaining > 0:
+                file.write(block[:min(remaining, len(block))])
+                remaining -= len(block)
+        paths.append(path)
+    return paths
+
+
+def timed(label, paths, upload):
+    """Upload paths one after another and print MB/s."""
+    total = sum(os.path.getsize(path) for path in paths)
+    start = time.perf_counter()
+    for path in paths:
+        upload(path)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {total / elapsed / 1e6:8.2f} MB/s  ({len(paths)} files, {elapsed:.2f}s)")
+    return total / elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rtt", type=float, default=0.1, help="injected round-trip time in seconds")
+    parser.add_argument("--size-mb", type=float, default=32, help="size of each test file")
+    parser.add_argument("--count", type=int, default=3, help="files per run")
+    parser.add_argument("--protocol", choices=["sftp", "ftp", "both"], default="both")
+    args = parser.parse_args(argv)
+
+    work = tempfile.mkdtemp(prefix="ftpuploader-bench-")
+    # Keep the manifest and journal from skipping or resuming between runs
+    os.environ["FTPUPLOADER_STATE_DIR"] = os.path.join(work, "state")
+    from ftpuploader.engine import UploadEngine
+
+    source = os.path.join(work, "source")
+    os.mkdir(source)
+    paths = make_files(source, "BENCH01", args.count, int(args.size_mb * 1024 * 1024))
+    print(f"rtt {args.rtt * 1000:.0f} ms, {args.count} x {args.size_mb:g} MB")
+
+    protocols = ["sftp", "ftp"] if args.protocol == "both" else [args.protocol]
+    for protocol in protocols:
+        root = os.path.join(work, f"{protocol}-root")
+        os.mkdir(root)
+        if protocol == "sftp":
+            from .sftp_standin import SFTPStandIn as standin_class
+            original = original_sftp
+        else:
+            standin_class = FTPStandIn
+            original = original_ftp
+        with standin_class(root, users={USERNAME: PASSWORD}, rtt=args.rtt) as standin:
+            server_config = {"type": protocol, "host": standin.host, "port": standin.port,
+                             "username": USERNAME, "password": PASSWORD}
+            engine = UploadEngine(servers={"BENCH01": server_config})
+            try:
+                before = timed(f"{protocol} original", paths, lambda path: original(path, standin.host, standin.port))
+                after = timed(f"{protocol} tuned", paths, lambda path: engine.upload(path, engine.servers["BENCH01"]))
+            finally:
+                engine.close()
+        print(f"{protocol} speedup {after / before:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
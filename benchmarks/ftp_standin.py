@@ -0,0 +1,228 @@
+"""Minimal FTP server on loopback standing in for the mall FTP servers."""
+import hashlib
+import os
+import socket
+import time
+
+from .link import StandIn
+
+
+class FTPStandIn(StandIn):
+    """Minimal passive-mode FTP server storing uploads under root."""
+
+    def _serve(self, sock):
+        _FTPSession(self, sock).run()
+
+
+class _FTPSession:
+    def __init__(self, server, sock):
+        self.server = server
+        self.sock = sock
+        self.reader = sock.makefile("rb")
+        self.cwd = "/"
+        self.username = None
+        self.logged_in = False
+        self.rest = 0
+        self.passive = None
+        self.hash = "sha256"
+
+    def reply(self, text):
+        self.sock.sendall(text.encode("utf-8") + b"\r\n")
+
+    def run(self):
+        try:
+            self.reply("220 stand-in ready")
+            for line in self.reader:
+                line = line.decode("utf-8").rstrip("\r\n")
+                command, _, argument = line.partition(" ")
+                command = command.upper()
+                if not self.logged_in and command not in ("USER", "PASS", "QUIT", "FEAT", "SYST"):
+                    self.reply("530 Please login")
+                    continue
+                handler = getattr(self, f"do_{command}", None)
+                if handler is None:
+                    self.reply(f"502 {command} not implemented")
+                    continue
+                if handler(argument) is False:
+                    break
+        except OSError:
+            pass
+        finally:
+            if self.logged_in:
+                self.server.close_login(self.username)
+            self.sock.close()
+
+    def path(self, argument):
+        return self.server.local_path(self.cwd, argument)
+
+    def open_data(self):
+        if self.passive is None:
+            self.reply("425 Use PASV first")
+            return None
+        listener, self.passive = self.passive, None
+        try:
+            listener.settimeout(10)
+            conn, _ = listener.accept()
+        finally:
+            listener.close()
+        return self.server.shape(conn)
+
+    def do_USER(self, argument):
+        self.username = argument
+        self.reply("331 Password required")
+
+    def do_PASS(self, argument):
+        if not self.server.check_password(self.username, argument):
+            self.reply("530 Login incorrect")
+            return
+        if not self.server.open_login(self.username):
+            self.reply("421 Too many connections for this login")
+            return False
+        self.logged_in = True
+        self.reply("230 Logged in")
+
+    def do_QUIT(self, argument):
+        self.reply("221 Bye")
+        return False
+
+    def do_SYST(self, argument):
+        self.reply("215 UNIX Type: L8")
+
+    def do_FEAT(self, argument):
+        self.sock.sendall(b"211-Features:\r\n SIZE\r\n REST STREAM\r\n MLSD\r\n HASH SHA-256*;MD5\r\n XMD5\r\n211 End\r\n")
+
+    def do_NOOP(self, argument):
+        self.reply("200 OK")
+
+    def do_TYPE(self, argument):
+        self.reply("200 Type set")
+
+    def do_PWD(self, argument):
+        self.reply(f'257 "{self.cwd}"')
+
+    def do_CWD(self, argument):
+        local, remote = self.path(argument)
+        if not os.path.isdir(local):
+            self.reply("550 No such directory")
+            return
+        self.cwd = remote
+        self.reply("250 OK")
+
+    def do_MKD(self, argument):
+        local, remote = self.path(argument)
+        try:
+            os.mkdir(local)
+        except OSError as e:
+            self.reply(f"550 {e.strerror}")
+            return
+        self.reply(f'257 "{remote}" created')
+
+    def do_PASV(self, argument):
+        self.passive = socket.create_server((self.server.host, 0))
+        port = self.passive.getsockname()[1]
+        address = self.server.host.replace(".", ",")
+        self.reply(f"227 Entering Passive Mode ({address},{port >> 8},{port & 0xFF})")
+
+    def do_EPSV(self, argument):
+        self.passive = socket.create_server((self.server.host, 0))
+        self.reply(f"229 Entering Extended Passive Mode (|||{self.passive.getsockname()[1]}|)")
+
+    def do_REST(self, argument):
+        self.rest = int(argument)
+        self.reply(f"350 Restarting at {self.rest}")
+
+    def do_SIZE(self, argument):
+        local, _ = self.path(argument)
+        if not os.path.isfile(local):
+            self.reply("550 No such file")
+            return
+        self.reply(f"213 {os.path.getsize(local)}")
+
+    def do_DELE(self, argument):
+        local, _ = self.path(argument)
+        try:
+            os.remove(local)
+        except OSError as e:
+            self.reply(f"550 {e.strerror}")
+            return
+        self.reply("250 Deleted")
+
+    def do_STOR(self, argument, append=False):
+        local, _ = self.path(argument)
+        offset, self.rest = self.rest, 0
+        if append:
+            mode = "ab"
+        elif offset:
+            mode = "r+b" if os.path.exists(local) else "wb"
+        else:
+            mode = "wb"
+        self.reply("150 Ok to send data")
+        conn = self.open_data()
+        if conn is None:
+            return
+        with conn, open(local, mode) as file:
+            if offset and not append:
+                file.seek(offset)
+                file.truncate()
+            while True:
+                data = conn.recv(256 * 1024)
+                if not data:
+                    break
+                file.write(data)
+        self.reply("226 Transfer complete")
+
+    def do_APPE(self, argument):
+        self.do_STOR(argument, append=True)
+
+    def do_NLST(self, argument):
+        local, _ = self.path(argument or ".")
+        self.send_listing("".join(f"{name}\r\n" for name in sorted(os.listdir(local))))
+
+    def do_MLSD(self, argument):
+        local, _ = self.path(argument or ".")
+        lines = []
+        for entry in sorted(os.scandir(local), key=lambda e: e.name):
+            stat = entry.stat()
+            kind = "dir" if entry.is_dir() else "file"
+            modify = time.strftime("%Y%m%d%H%M%S", time.gmtime(stat.st_mtime))
+            lines.append(f"type={kind};size={stat.st_size};modify={modify}; {entry.name}\r\n")
+        self.send_listing("".join(lines))
+
+    def do_OPTS(self, argument):
+        if argument.upper() in ("HASH SHA-256", "HASH MD5"):
+            self.hash = argument.split()[1].lower().replace("-", "")
+            self.reply(f"200 {argument.split()[1]}")
+        else:
+            self.reply("501 Option not understood")
+
+    def do_HASH(self, argument):
+        local, _ = self.path(argument)
+        if not os.path.isfile(local):
+            self.reply("550 No such file")
+            return
+        size = os.path.getsize(local)
+        self.reply(f"213 {self.hash.upper()} 0-{size} {file_digest(local, self.hash)} {argument}")
+
+    def do_XMD5(self, argument):
+        local, _ = self.path(argument)
+        if not os.path.isfile(local):
+            self.reply("550 No such file")
+            return
+        self.reply(f"250 {file_digest(local, 'md5').upper()}")
+
+    def send_listing(self, text):
+        self.reply("150 Here comes the listing")
+        conn = self.open_data()
+        if conn is None:
+            return
+        with conn:
+            conn.sendall(text.encode("utf-8"))
+        self.reply("226 Listing sent")
+
+
+def file_digest(path, algorithm):
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
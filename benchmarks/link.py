@@ -0,0 +1,173 @@
+"""Emulated network link and the accept loop shared by the loopback stand-in servers.
+
+Every accepted connection (FTP data connections included) is passed
+through a shaper that can add round-trip latency and cap bandwidth, so
+transfer changes can be measured without a live server.
+"""
+import os
+import queue
+import socket
+import threading
+import time
+
+
+class Throttle:
+    """Bandwidth shared by every connection it is given to, in bytes per second."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._free_at = 0.0
+
+    def wait(self, nbytes):
+        """Block until nbytes fit through the link."""
+        with self._lock:
+            start = max(self._free_at, time.monotonic())
+            self._free_at = start + nbytes / self.rate
+            done = self._free_at
+        delay = done - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def nodelay(sock):
+    """Turn off Nagle's algorithm, which holds each short reply back for ~40 ms."""
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    except OSError:
+        # Not TCP: socketpair() gives AF_UNIX sockets on POSIX
+        pass
+
+
+def shape(client, rtt=0.0, uplink=None, downlink=None):
+    """Return a socket that talks to client through an emulated link.
+
+    Bytes in each direction are delayed by rtt / 2. Bytes from the client
+    pass through the uplink Throttle and bytes to it through the downlink
+    one. The caller uses the returned socket exactly like the original.
+    Every socket involved sends small writes at once, so only rtt adds
+    latency.
+    """
+    nodelay(client)
+    if not rtt and uplink is None and downlink is None:
+        return client
+    inner, outer = socket.socketpair()
+    nodelay(inner)
+    nodelay(outer)
+    _Pipe(client, outer, rtt / 2, uplink).start()
+    _Pipe(outer, client, rtt / 2, downlink).start()
+    return inner
+
+
+class _Pipe:
+    """Copies one direction of a connection, releasing each chunk after a delay."""
+
+    def __init__(self, source, target, delay, throttle=None):
+        self.source = source
+        self.target = target
+        self.delay = delay
+        self.throttle = throttle
+        self.chunks = queue.Queue()
+
+    def start(self):
+        threading.Thread(target=self._read, daemon=True).start()
+        threading.Thread(target=self._write, daemon=True).start()
+
+    def _read(self):
+        while True:
+            try:
+                data = self.source.recv(256 * 1024)
+            except OSError:
+                data = b""
+            if data and self.throttle:
+                self.throttle.wait(len(data))
+            self.chunks.put((time.monotonic() + self.delay, data))
+            if not data:
+                return
+
+    def _write(self):
+        while True:
+            due, data = self.chunks.get()
+            wait = due - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                if not data:
+                    self.target.shutdown(socket.SHUT_WR)
+                    return
+                self.target.sendall(data)
+            except OSError:
+                return
+
+
+class StandIn:
+    """Accept loop shared by the stand-ins; subclasses implement _serve(sock)."""
+
+    def __init__(self, root, users=None, host="127.0.0.1", port=0, rtt=0.0, bandwidth=None,
+                 max_sessions_per_login=None):
+        self.root = os.path.abspath(root)
+        self.users = users  # username -> password, None accepts anyone
+        self.host = host
+        self.rtt = rtt
+        # bandwidth (bytes/s) is shared by all connections, like one uplink
+        self.uplink = Throttle(bandwidth) if bandwidth else None
+        self.downlink = Throttle(bandwidth) if bandwidth else None
+        self.max_sessions_per_login = max_sessions_per_login
+        self.rejected_logins = 0
+        self._sessions = {}
+        self._sessions_lock = threading.Lock()
+        self._listener = socket.create_server((host, port))
+        self.port = self._listener.getsockname()[1]
+        self._stopped = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._listener.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def check_password(self, username, password):
+        return self.users is None or self.users.get(username) == password
+
+    def open_login(self, username):
+        """Count a session for username, or return False if it is over its limit."""
+        with self._sessions_lock:
+            active = self._sessions.get(username, 0)
+            if self.max_sessions_per_login is not None and active >= self.max_sessions_per_login:
+                self.rejected_logins += 1
+                return False
+            self._sessions[username] = active + 1
+            return True
+
+    def close_login(self, username):
+        with self._sessions_lock:
+            self._sessions[username] -= 1
+
+    def shape(self, sock):
+        return shape(sock, self.rtt, self.uplink, self.downlink)
+
+    def local_path(self, cwd, path):
+        """Map a remote path onto the root directory, refusing to escape it."""
+        remote = os.path.normpath(os.path.join(cwd, path)).replace("\\", "/")
+        if not remote.startswith("/"):
+            remote = "/" + remote
+        return os.path.join(self.root, remote.lstrip("/")), remote
+
+    def _accept_loop(self):
+        while not self._stopped.is_set():
+            try:
+                client, _ = self._listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(self.shape(client),), daemon=True).start()
+
+    def _serve(self, sock):
+        raise NotImplementedError
@@ -0,0 +1 @@
+"""Upload engine shared by the Singapore File Uploader front ends."""
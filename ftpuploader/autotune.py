@@ -0,0 +1,138 @@
+"""Finds the fastest transport settings for a host with test uploads.
+
+A test file is uploaded to the server's remote directory with one
+setting changed at a time (ciphers, MACs, key exchange, compression,
+window and chunk size for SFTP; block size for FTP). The fastest value
+is kept before moving on to the next setting. Then parallel sessions are
+added until the server refuses a login or stops getting faster. Every
+probe opens its own session, so the handshake counts too. Test files are
+removed afterwards when the login is allowed to delete.
+"""
+import os
+import threading
+import time
+
+from . import protocols
+from .profiles import HOST_KEYS
+from .resilience import timeouts
+from .tuning import sftp_options
+
+# Bytes uploaded by every probe
+TUNE_SIZE = 8 * 1024 * 1024
+
+# Times each setting is measured; the fastest counts
+TUNE_ROUNDS = 2
+
+# Values tried per setting, in this order; the current value is measured first
+SFTP_CANDIDATES = [
+    ("ciphers", [["aes128-ctr"], ["aes256-ctr"], ["aes128-gcm@openssh.com"], ["aes256-gcm@openssh.com"]]),
+    ("macs", [["hmac-sha2-256"], ["hmac-sha2-256-etm@openssh.com"], ["hmac-sha1"]]),
+    ("kex", [["curve25519-sha256@libssh.org"], ["ecdh-sha2-nistp256"]]),
+    ("compression", [False, True]),
+    ("window_size", [2 * 1024 * 1024, 16 * 1024 * 1024, 64 * 1024 * 1024]),
+    ("chunk_size", [64 * 1024, 256 * 1024, 1024 * 1024]),
+]
+FTP_CANDIDATES = [
+    ("block_size", [32 * 1024, 256 * 1024, 1024 * 1024]),
+]
+
+# Parallel sessions tried after the settings, in this order
+SESSION_COUNTS = (2, 4)
+
+# A value must be this much faster than the best so far to replace it
+MIN_GAIN = 0.05
+
+# Name of the test files, formatted into the server's remote_path template
+TEST_NAME = ".ftpuploader-tune-{n}"
+
+
+def probe(server_config, file_path, sessions=1):
+    """Upload file_path over `sessions` new sessions at once; return bytes per second overall."""
+    protocol = server_config["protocol"]
+    driver = protocols.load(protocol)
+    options = timeouts(server_config)
+    if protocol == "sftp":
+        options.update(sftp_options(server_config))
+    errors = []
+
+    def upload(n):
+        remote_path = server_config["remote_path"].format(name=TEST_NAME.format(n=n))
+        try:
+            session = driver.Session(server_config["host"], server_config["port"], server_config["username"],
+                                     server_config["password"], **options)
+            try:
+                driver.send(session.client, file_path, remote_path, 0, server_config, lambda nbytes: None)
+                try:
+                    driver.remove(session.client, remote_path)
+                except Exception:
+                    # No delete permission: the next probe overwrites it
+                    pass
+            finally:
+                session.close()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=upload, args=(n,), daemon=True) for n in range(sessions)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if errors:
+        raise errors[0]
+    return os.path.getsize(file_path) * sessions / elapsed
+
+
+def tune(server_config, file_path, fixed=(), rounds=TUNE_ROUNDS, report=None):
+    """Return (profile, bytes per second): the fastest host profile found for a server.
+
+    server_config is a resolved entry (see Profiles.resolve); settings
+    named in fixed are left alone, as for keys set on the entry in
+    SERVERS. report(setting, value, rate, error) is called after every
+    measurement.
+    """
+    profile = {key: server_config[key] for key in HOST_KEYS if key in server_config and key not in fixed}
+
+    def measure(trial, sessions=1):
+        config = dict(server_config, **trial)
+        return max(probe(config, file_path, sessions) for _ in range(rounds))
+
+    best = measure(profile)
+    if report:
+        report("current", None, best, None)
+    candidates = SFTP_CANDIDATES if server_config["protocol"] == "sftp" else FTP_CANDIDATES
+    for key, values in candidates:
+        if key in fixed:
+            continue
+        for value in values:
+            if profile.get(key) == value:
+                continue
+            trial = dict(profile, **{key: value})
+            try:
+                rate = measure(trial)
+            except Exception as e:
+                if report:
+                    report(key, value, None, e)
+                continue
+            if report:
+                report(key, value, rate, None)
+            if rate > best * (1 + MIN_GAIN):
+                profile, best = trial, rate
+
+    if "max_sessions" not in fixed:
+        profile["max_sessions"] = 1
+        for sessions in SESSION_COUNTS:
+            try:
+                rate = measure(profile, sessions)
+            except Exception as e:
+                # Most likely a login limit: stay below it
+                if report:
+                    report("max_sessions", sessions, None, e)
+                break
+            if report:
+                report("max_sessions", sessions, rate, None)
+            if rate <= best * (1 + MIN_GAIN):
+                break
+            profile["max_sessions"], best = sessions, rate
+    return profile, best
@@ -0,0 +1,106 @@
+"""Token-bucket bandwidth caps, global and per host, adjustable while uploads run.
+
+A server entry in SERVERS can set "max_rate" (bytes per second) to cap
+that host; the global cap starts at MAX_RATE.
+"""
+import threading
+import time
+
+# Global upload cap in bytes per second; None means unlimited
+MAX_RATE = None
+
+# Seconds of traffic a bucket may save up and then send at full speed
+BURST_SECONDS = 0.5
+
+# Longest single sleep, so a raised cap takes effect quickly
+MAX_SLEEP = 0.25
+
+
+class TokenBucket:
+    """Paces callers to `rate` bytes per second; rate None means no limit.
+
+    take() may overdraw the bucket, so chunks bigger than the burst are
+    fine: the caller then waits until the debt is paid back.
+    """
+
+    def __init__(self, rate=None):
+        self._lock = threading.Lock()
+        self.rate = rate
+        self._tokens = self._burst()
+        self._updated = time.monotonic()
+
+    def set_rate(self, rate):
+        with self._lock:
+            self._refill()
+            self.rate = rate or None
+            self._tokens = min(self._tokens, self._burst())
+
+    def take(self, nbytes):
+        """Account for nbytes, sleeping as long as the cap requires."""
+        with self._lock:
+            if self.rate is None:
+                return
+            self._refill()
+            self._tokens -= nbytes
+            debt = -self._tokens
+        while debt > 0:
+            with self._lock:
+                rate = self.rate
+            if rate is None:
+                return
+            time.sleep(min(debt / rate, MAX_SLEEP))
+            with self._lock:
+                if self.rate is None:
+                    return
+                self._refill()
+                debt = -self._tokens
+
+    def _burst(self):
+        return self.rate * BURST_SECONDS if self.rate else 0
+
+    def _refill(self):
+        # Called with the lock held
+        now = time.monotonic()
+        if self.rate is not None:
+            self._tokens = min(self._burst(), self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class BandwidthLimiter:
+    """A global TokenBucket plus one per capped host.
+
+    throttle(host, nbytes) is called from the transfer loops after each
+    chunk; the next chunk waits until both the host's and the global cap
+    allow it.
+    """
+
+    def __init__(self, rate=MAX_RATE, host_rates=None):
+        self._lock = threading.Lock()
+        self.total = TokenBucket(rate)
+        self._hosts = {}
+        for host, host_rate in (host_rates or {}).items():
+            self.set_host_rate(host, host_rate)
+
+    def set_rate(self, rate):
+        """Change the global cap (bytes per second, None for unlimited)."""
+        self.total.set_rate(rate)
+
+    def set_host_rate(self, host, rate):
+        """Change one host's cap (bytes per second, None for unlimited)."""
+        with self._lock:
+            bucket = self._hosts.get(host)
+            if bucket is None:
+                bucket = self._hosts[host] = TokenBucket(rate)
+        bucket.set_rate(rate)
+
+    def rates(self):
+        """Return (global rate, {host: rate}) with None for unlimited."""
+        with self._lock:
+            return self.total.rate, {host: bucket.rate for host, bucket in self._hosts.items()}
+
+    def throttle(self, host, nbytes):
+        with self._lock:
+            bucket = self._hosts.get(host)
+        if bucket is not None:
+            bucket.take(nbytes)
+        self.total.take(nbytes)
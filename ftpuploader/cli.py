@@ -0,0 +1,190 @@
+"""Headless entry point: one-shot batch uploads and the watch-folder daemon."""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+
+from .autotune import TUNE_ROUNDS, TUNE_SIZE, tune
+from .engine import FAILED, UploadEngine, split_outcomes
+from .metrics import TransferMetrics, describe_progress, save_run
+from .processes import ProcessUploadEngine
+from .scan import DEFAULT_EXCLUDE, expand
+from .servers import SERVERS
+from .watch import POLL_INTERVAL, SETTLE_SECONDS, DropFolderWatcher
+
+
+def print_summary(successful_uploads, failed_uploads, skipped_uploads=(), retried_uploads=(),
+                  unavailable_uploads=(), stream=sys.stdout):
+    """Print what was uploaded, retried, failed, not attempted and skipped."""
+    print("Upload Summary:\n", file=stream)
+    print("Successful Uploads:", file=stream)
+    for file_name, username in successful_uploads:
+        print(f"- {file_name} (Server: {username})", file=stream)
+    if retried_uploads:
+        print("\nUploaded After Retry:", file=stream)
+        for file_name, username, detail in retried_uploads:
+            print(f"- {file_name} (Server: {username}, {detail})", file=stream)
+    print("\nFailed Uploads:", file=stream)
+    for file_name, error in failed_uploads:
+        print(f"- {file_name} (Error: {error})", file=stream)
+    if unavailable_uploads:
+        print("\nNot Attempted (server unavailable):", file=stream)
+        for file_name, reason in unavailable_uploads:
+            print(f"- {file_name} ({reason})", file=stream)
+    if skipped_uploads:
+        print("\nSkipped (already delivered):", file=stream)
+        for file_name, reason in skipped_uploads:
+            print(f"- {file_name} ({reason})", file=stream)
+
+
+def report_progress(event):
+    if event[0] == "progress":
+        logging.info(describe_progress(event[1]))
+
+
+def expand_paths(paths):
+    """Yield files from the arguments, listing directories one level deep."""
+    for path in paths:
+        if os.path.isdir(path):
+            for entry in sorted(os.scandir(path), key=lambda e: e.name):
+                if entry.is_file():
+                    yield entry.path
+        elif os.path.isfile(path):
+            yield path
+        else:
+            logging.warning("Skipping %s: not a file", path)
+
+
+def cmd_upload(args, engine):
+    if args.recursive:
+        file_paths = list(expand(args.paths, args.include, args.exclude or DEFAULT_EXCLUDE))
+    else:
+        file_paths = list(expand_paths(args.paths))
+    if not file_paths:
+        print("No files selected for upload.", file=sys.stderr)
+        return 2
+    plan = engine.plan(file_paths)
+    if args.dry_run:
+        print(plan.describe())
+        return 1 if any(status == FAILED for *_, status, _ in plan.rejected) else 0
+    metrics = TransferMetrics(report_progress if args.verbose else None)
+    outcomes = engine.upload_batch(file_paths, metrics, plan)
+    save_run(metrics, args.report, args.prometheus)
+    summary = split_outcomes(outcomes)
+    print_summary(*summary)
+    successful_uploads, failed_uploads, skipped_uploads, retried_uploads, unavailable_uploads = summary
+    return 1 if failed_uploads or unavailable_uploads else 0
+
+
+def cmd_watch(args, engine):
+    watcher = DropFolderWatcher(
+        engine, args.drop_dir, done_dir=args.done_dir, failed_dir=args.failed_dir,
+        settle=args.settle, interval=args.interval,
+        report=args.report, prometheus=args.prometheus,
+    )
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def report_probe(setting, value, rate, error):
+    label = setting if value is None else f"{setting}={value}"
+    if error is not None:
+        print(f"  {label}: Error: {str(error)}")
+    else:
+        print(f"  {label}: {rate / 1e6:.2f} MB/s")
+
+
+def cmd_tune(args, engine):
+    hosts = {}  # (host, port) -> (prefix, server config) of the first entry for it
+    for prefix, server_config in engine.servers.items():
+        if args.prefixes and prefix not in args.prefixes:
+            continue
+        problem = engine.check_server(server_config)
+        if problem:
+            print(f"Skipping {prefix}: {problem}", file=sys.stderr)
+            continue
+        hosts.setdefault((server_config["host"], server_config["port"]), (prefix, server_config))
+    if not hosts:
+        print("No servers to tune.", file=sys.stderr)
+        return 2
+
+    sample = args.sample
+    if sample is None:
+        with tempfile.NamedTemporaryFile(prefix="ftpuploader-tune-", delete=False) as file:
+            file.write(os.urandom(int(args.size_mb * 1024 * 1024)))
+            sample = file.name
+    failed = False
+    try:
+        for (host, port), (prefix, server_config) in hosts.items():
+            print(f"{server_config['protocol']} {server_config['username']}@{host}:{port} ({prefix})")
+            try:
+                profile, rate = tune(server_config, sample, fixed=SERVERS.get(prefix, {}),
+                                     rounds=args.rounds, report=report_probe)
+            except Exception as e:
+                print(f"  Error: {str(e)}")
+                failed = True
+                continue
+            print(f"  fastest: {rate / 1e6:.2f} MB/s with {profile}")
+            if not args.dry_run:
+                engine.profiles.save_host(host, port, profile)
+    finally:
+        if args.sample is None:
+            os.remove(sample)
+    if not args.dry_run:
+        print(f"Profiles saved to {engine.profiles.path}")
+    return 1 if failed else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="ftpuploader", description="Upload files to the configured FTP/SFTP servers without the GUI.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log every upload")
+    parser.add_argument("--report", help="write the JSON run report here (default: state directory)")
+    parser.add_argument("--prometheus", help="write Prometheus text metrics here (default: state directory)")
+    parser.add_argument("--processes", type=int, default=0, metavar="N",
+                        help="run transfers in N worker processes (default: threads in this process)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    upload = commands.add_parser("upload", help="upload files (or the files in directories) once")
+    upload.add_argument("paths", nargs="+")
+    upload.add_argument("-n", "--dry-run", action="store_true", help="show the upload plan without connecting")
+    upload.add_argument("-r", "--recursive", action="store_true", help="walk directories all the way down")
+    upload.add_argument("--include", action="append", default=[], metavar="GLOB",
+                        help="with -r, only take files matching this (repeatable)")
+    upload.add_argument("--exclude", action="append", default=[], metavar="GLOB",
+                        help=f"with -r, skip files and directories matching this (repeatable; default {' '.join(DEFAULT_EXCLUDE)})")
+    upload.set_defaults(func=cmd_upload)
+
+    watch = commands.add_parser("watch", help="upload files as they land in a drop directory")
+    watch.add_argument("drop_dir")
+    watch.add_argument("--done-dir", help="where uploaded files are moved (default: DROP_DIR/done)")
+    watch.add_argument("--failed-dir", help="where failed files are moved (default: DROP_DIR/failed)")
+    watch.add_argument("--settle", type=float, default=SETTLE_SECONDS, help="seconds a file must stay unchanged before upload")
+    watch.add_argument("--interval", type=float, default=POLL_INTERVAL, help="seconds between scans without inotify")
+    watch.set_defaults(func=cmd_watch)
+
+    tune_parser = commands.add_parser("tune", help="find the fastest transport settings for each host and save them")
+    tune_parser.add_argument("prefixes", nargs="*", help="only tune the hosts of these SERVERS entries")
+    tune_parser.add_argument("-n", "--dry-run", action="store_true", help="measure without saving profiles")
+    tune_parser.add_argument("--size-mb", type=float, default=TUNE_SIZE / (1024 * 1024),
+                             help="size of the random test file")
+    tune_parser.add_argument("--sample", help="upload this file instead, e.g. a typical export for judging compression")
+    tune_parser.add_argument("--rounds", type=int, default=TUNE_ROUNDS, help="measurements per setting; the fastest counts")
+    tune_parser.set_defaults(func=cmd_tune)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO if args.verbose or args.command == "watch" else logging.WARNING,
+        format="%(asctime)s %(levelname)s %(message)s",
+    )
+    engine = ProcessUploadEngine(processes=args.processes) if args.processes > 0 else UploadEngine()
+    try:
+        return args.func(args, engine)
+    finally:
+        engine.close()
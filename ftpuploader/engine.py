@@ -0,0 +1,590 @@
+"""Routing and upload orchestration shared by the GUI, CLI and watch daemon."""
+import functools
+import logging
+import os
+import threading
+import time
+
+from . import protocols, uploadqueue
+from .bandwidth import BandwidthLimiter
+from .journal import TransferJournal
+from .manifest import DeliveryManifest
+from .metrics import NO_PROGRESS, FileProgress, TransferMetrics
+from .planner import Plan, PlannedFile, PrefixIndex, missing_keys
+from .pool import ConnectionPool
+from .profiles import Profiles, host_key
+from .resilience import MAX_ATTEMPTS, CircuitBreakers, HostUnavailable, backoff_delay, timeouts
+from .scheduler import UploadScheduler
+from .servers import SERVERS
+from .tuning import segment_count, sftp_options
+from .verify import VERIFY_ATTEMPTS, VERIFY_BATCH, VERIFY_MODES, hash_prefix, new_digests, verify_mode
+
+log = logging.getLogger(__name__)
+
+# Outcome statuses reported per file by upload_batch
+UPLOADED = "uploaded"
+SKIPPED = "skipped"
+FAILED = "failed"
+UNAVAILABLE = "unavailable"  # not tried: the server's circuit breaker is open
+
+
+class UploadEngine:
+    """Routes files to their server by name prefix and uploads them.
+
+    Server entries are combined with their type and host profiles (see
+    ftpuploader.profiles) once, here; every session to a host then uses
+    the same settings.
+    """
+
+    def __init__(self, servers=None, pool=None, journal=None, manifest=None, breakers=None,
+                 max_attempts=MAX_ATTEMPTS, bandwidth=None, profiles=None):
+        self.profiles = profiles or Profiles()
+        self.servers = {
+            prefix: self.profiles.resolve(config)
+            for prefix, config in (SERVERS if servers is None else servers).items()
+        }
+        self.pool = pool or ConnectionPool()
+        self.journal = journal or TransferJournal()
+        self.manifest = manifest or DeliveryManifest()
+        self.breakers = breakers or CircuitBreakers()
+        self.max_attempts = max_attempts
+        self.bandwidth = bandwidth or BandwidthLimiter(host_rates={
+            config["host"]: config["max_rate"] for config in self.servers.values()
+            if config.get("max_rate") and config.get("host")
+        })
+        self.index = PrefixIndex(self.servers)
+
+    def route(self, file_path):
+        """Return the server config for a file, or None if its prefix is unknown."""
+        return self.index.match(os.path.basename(file_path))
+
+    def destination(self, file_path, server_config):
+        """Return (port, remote_path) a file is uploaded to, from the server's profile."""
+        return server_config["port"], server_config["remote_path"].format(name=os.path.basename(file_path))
+
+    def server_id(self, server_config):
+        port, _ = self.destination("", server_config)
+        return f"{server_config['username']}@{server_config['host']}:{port}"
+
+    def check_server(self, server_config):
+        """Return what is wrong with a server entry, or None if it can be used."""
+        missing = missing_keys(server_config)
+        if missing:
+            return f"Misconfigured server: missing {', '.join(missing)}"
+        if server_config["type"] not in self.profiles.types:
+            return f"Unsupported server type: {server_config['type']}"
+        if server_config.get("protocol") not in protocols.DRIVERS:
+            return f"Misconfigured server: protocol must be one of {', '.join(protocols.DRIVERS)}"
+        remote_path = server_config.get("remote_path")
+        try:
+            if not remote_path.startswith("/") or "{name}" not in remote_path:
+                raise ValueError(remote_path)
+            remote_path.format(name="")
+        except (AttributeError, LookupError, ValueError):
+            return "Misconfigured server: remote_path must be an absolute path containing {name}"
+        for key in ("port", "max_sessions"):
+            value = server_config.get(key)
+            if (value is not None or key == "port") and (not isinstance(value, int) or value < 1):
+                return f"Misconfigured server: {key} must be a positive integer"
+        for key in ("ciphers", "kex", "macs"):
+            value = server_config.get(key)
+            if value is not None and (not isinstance(value, (list, tuple))
+                                      or not all(isinstance(name, str) for name in value)):
+                return f"Misconfigured server: {key} must be a list of algorithm names"
+        max_rate = server_config.get("max_rate")
+        if max_rate is not None and (not isinstance(max_rate, (int, float)) or max_rate <= 0):
+            return "Misconfigured server: max_rate must be a positive number of bytes per second"
+        if verify_mode(server_config) not in VERIFY_MODES:
+            return f"Misconfigured server: verify must be one of {', '.join(VERIFY_MODES)}"
+        return None
+
+    def plan(self, file_paths, groups=None):
+        """Resolve, check and group a batch without touching the network.
+
+        Every file is routed once and hashed; files that cannot or need not
+        be uploaded are rejected with the reason, the rest are grouped by
+        host, port, login and remote directory. Pass a dict as groups to
+        reuse the Groups (and their listings) of earlier plans made with it.
+        """
+        plan = Plan(list(file_paths), groups)
+        problems = {}  # id(server config) -> check_server result
+        planned = set()
+        seen_paths = set()
+        for index, file_path in enumerate(plan.file_paths):
+            if file_path in seen_paths:
+                plan.reject(index, self.route(file_path), SKIPPED, "duplicate in this batch")
+                continue
+            seen_paths.add(file_path)
+
+            server_config = self.route(file_path)
+            if server_config is None:
+                plan.reject(index, None, FAILED, "No server configured for prefix")
+                continue
+            if id(server_config) not in problems:
+                problems[id(server_config)] = self.check_server(server_config)
+            if problems[id(server_config)]:
+                plan.reject(index, server_config, FAILED, problems[id(server_config)])
+                continue
+
+            port, remote_path = self.destination(file_path, server_config)
+            try:
+                delivery = (self.manifest.content_hash(file_path), self.server_id(server_config), remote_path)
+                size = os.path.getsize(file_path)
+            except OSError as e:
+                plan.reject(index, server_config, FAILED, f"Error: {str(e)}")
+                continue
+            if delivery in planned:
+                plan.reject(index, server_config, SKIPPED, "duplicate in this batch")
+                continue
+            if self.manifest.delivered(*delivery):
+                plan.reject(index, server_config, SKIPPED, "already delivered")
+                continue
+            planned.add(delivery)
+            plan.add(PlannedFile(index, file_path, server_config, remote_path, size, delivery),
+                     port, remote_path.rsplit("/", 1)[0] + "/")
+        return plan
+
+    def upload_batch(self, file_paths, metrics=None, plan=None):
+        """Upload files concurrently and return (file_path, server_config, status, detail) per file.
+
+        status is UPLOADED (detail says how many retries it took, if any),
+        SKIPPED (detail says why), FAILED (detail is the error) or
+        UNAVAILABLE (the server's circuit breaker was open). Files whose
+        content already reached the same server and remote path, in this
+        batch or an earlier one, are skipped. Progress is reported to
+        metrics, a TransferMetrics, as bytes go out. Pass a plan from
+        plan() to run one that was already shown to the user.
+        """
+        metrics = metrics or TransferMetrics()
+        plan = plan or self.plan(file_paths)
+        outcomes = [None] * len(plan.file_paths)
+
+        def record(index, outcome):
+            outcomes[index] = outcome
+
+        scheduler = self.scheduler()
+        scheduler.start()
+        try:
+            self.submit_plan(plan, scheduler, metrics, record)
+        finally:
+            scheduler.close()
+            scheduler.join()
+        return outcomes
+
+    def drain(self, upload_queue, metrics=None, stop_event=None, more=None):
+        """Upload from an UploadQueue until nothing is ready or in flight.
+
+        Entries are claimed CLAIM_BATCH at a time while the workers run,
+        so files enqueued during the run go out in the same run. While
+        more() returns True (a folder scan is still adding files, say) the
+        run waits for them instead of ending. Files for an unavailable host
+        are deferred until its breaker cools down. Each destination keeps
+        one Group for the whole run, so its directory is listed once
+        however many claims its files arrive in. Returns the outcomes in
+        the order the files finished.
+        """
+        metrics = metrics or TransferMetrics()
+        outcomes = []
+        lock = threading.Lock()
+        groups = {}
+
+        def settle(entries, index, outcome):
+            entry_id = entries[index][0]
+            status, detail = outcome[2], outcome[3]
+            if status in (UPLOADED, SKIPPED):
+                upload_queue.finish(entry_id, uploadqueue.DONE, detail)
+            elif status == UNAVAILABLE and upload_queue.attempts(entry_id) + 1 < uploadqueue.MAX_DEFERRALS:
+                upload_queue.defer(entry_id, self.breakers.cooldown, detail)
+            else:
+                upload_queue.finish(entry_id, uploadqueue.FAILED, detail)
+            with lock:
+                outcomes.append(outcome)
+
+        scheduler = self.scheduler()
+        scheduler.start()
+        try:
+            while not (stop_event and stop_event.is_set()):
+                if scheduler.unfinished() >= uploadqueue.CLAIM_BATCH:
+                    time.sleep(uploadqueue.CLAIM_WAIT)
+                    continue
+                # Asked before claiming: a scan that ends after an empty claim may
+                # have enqueued its last files in between
+                scanning = more is not None and more()
+                entries = upload_queue.wait_and_claim(uploadqueue.CLAIM_BATCH, uploadqueue.CLAIM_WAIT)
+                if entries:
+                    plan = self.plan([path for _, path in entries], groups)
+                    self.submit_plan(plan, scheduler, metrics, functools.partial(settle, entries))
+                elif scheduler.unfinished() == 0 and not scanning:
+                    break
+        finally:
+            scheduler.close()
+            scheduler.join()
+        return outcomes
+
+    def scheduler(self):
+        """Return the scheduler a run submits its plans to."""
+        return UploadScheduler()
+
+    def report_rejected(self, plan, metrics, on_outcome):
+        """Report the files a plan rejected, for submit_plan."""
+        # A path given twice is reported once; the first copy carries its metrics
+        reported = {planned.file_path for planned in plan.files}
+        for index, file_path, server_config, status, detail in plan.rejected:
+            if file_path not in reported:
+                reported.add(file_path)
+                metrics.file_finished(file_path, status, detail)
+            on_outcome(index, (file_path, server_config, status, detail))
+
+    def submit_plan(self, plan, scheduler, metrics, on_outcome):
+        """Queue a plan's uploads on a started UploadScheduler.
+
+        on_outcome(index, (file_path, server_config, status, detail)) is
+        called once for every entry in plan.file_paths: right away for the
+        files the plan rejected, from a worker thread for the rest.
+
+        Unless a server says "verify": "none", an upload only counts once
+        the remote copy checks out: a group's finished files are checked
+        together, with one listing, when VERIFY_BATCH are waiting or the
+        group is done. A file that does not match is uploaded once more. A
+        file the server no longer shows (drop servers that collect uploads
+        at once, write-only directories) counts as uploaded and is logged.
+        If the check itself fails VERIFY_ATTEMPTS times, the batch's files
+        fail and are not recorded as delivered. Files sent in segments are
+        always checked, "none" or not. The plan's groups may be shared with
+        plans submitted earlier (see drain), so everything queued on a
+        group carries its own plan's callbacks.
+        """
+        file_paths = plan.file_paths
+
+        def finish(index, server_config, status, detail):
+            metrics.file_finished(file_paths[index], status, detail)
+            on_outcome(index, (file_paths[index], server_config, status, detail))
+
+        self.report_rejected(plan, metrics, on_outcome)
+
+        def uploaded(planned):
+            try:
+                self.manifest.record(*planned.delivery, planned.file_path, planned.size)
+            except Exception as e:
+                # The next run would send it again, so it does not count as delivered
+                log.exception("Could not record the delivery of %s", planned.file_path)
+                finish(planned.index, planned.server_config, FAILED, f"Error: {str(e)}")
+                return
+            finish(planned.index, planned.server_config, UPLOADED, _retried(planned.retries))
+
+        def checked(group, planned, problem, error):
+            if error is not None:
+                # Sent, maybe, but nothing says the copy is whole; the next run sends it again
+                finish(planned.index, planned.server_config, FAILED, f"Error: could not verify upload: {str(error)}")
+            elif problem is None:
+                uploaded(planned)
+            elif not planned.reuploaded:
+                planned.reuploaded = True
+                with group.lock:
+                    group.remaining += 1
+                submit(group, planned)
+            else:
+                finish(planned.index, planned.server_config, FAILED, f"Verification failed: {problem}")
+
+        def verified(group, batch):
+            # batch holds (planned, checked callback of the plan it came from)
+            driver = protocols.load(group.server_config["protocol"])
+            problems, error = {}, None
+            for attempt in range(VERIFY_ATTEMPTS):
+                try:
+                    problems, error = self._verify(group, [planned for planned, _ in batch]), None
+                    break
+                except Exception as e:
+                    log.warning("Could not verify uploads to %s: %s", group.server_config["host"], e)
+                    error = e
+                    if not driver.is_transient(e) or attempt + 1 == VERIFY_ATTEMPTS:
+                        break
+                    time.sleep(backoff_delay(attempt))
+            for planned, settle in batch:
+                try:
+                    settle(problems.get(planned), error)
+                except Exception:
+                    # One file's failed report must not hold back the rest of the batch
+                    log.exception("Could not report %s", planned.file_path)
+
+        def job_done(group, planned, result, error):
+            checking = error is None and (verify_mode(group.server_config) != "none"
+                                          or self.segments(group.server_config, planned.size) > 1)
+            try:
+                if error is None:
+                    planned.retries, planned.digests = result
+                    if not checking:
+                        uploaded(planned)
+                elif isinstance(error, HostUnavailable):
+                    finish(planned.index, planned.server_config, UNAVAILABLE, str(error))
+                else:
+                    detail = f"Error: {str(error)}"
+                    if getattr(error, "retries", 0):
+                        detail += f" ({_retried(error.retries)})"
+                    finish(planned.index, planned.server_config, FAILED, detail)
+            finally:
+                # The group's count must go down whatever happened, or its last checks never run
+                batch = []
+                with group.lock:
+                    group.remaining -= 1
+                    if checking:
+                        group.unverified.append((planned, functools.partial(checked, group, planned)))
+                    if group.unverified and (group.remaining == 0 or len(group.unverified) >= VERIFY_BATCH):
+                        batch, group.unverified = group.unverified, []
+                if batch:
+                    verified(group, batch)
+
+        def submit(group, planned):
+            server_config = group.server_config
+            progress = FileProgress(metrics, planned.file_path, server_config["host"])
+            scheduler.submit(group.login,
+                             functools.partial(self._run_job, group, planned.file_path, server_config, progress),
+                             functools.partial(job_done, group, planned), planned.size)
+
+        # Smallest files go first (see UploadScheduler); a group's directory
+        # is listed by whichever of its files starts first
+        for group, files in plan.batches():
+            server_config = group.server_config
+            if "max_sessions" in server_config:
+                scheduler.login_limits[group.login] = server_config["max_sessions"]
+            with group.lock:
+                group.remaining += len(files)
+            for planned in files:
+                metrics.add_file(planned.file_path, server_config["host"], planned.size)
+                submit(group, planned)
+
+    def _run_job(self, group, file_path, server_config, progress):
+        """Upload one file, retrying transient errors; return (retries, digests of what was sent).
+
+        Retries back off exponentially with jitter. Every transient error
+        counts against the circuit breaker of the server's host and port,
+        and once it is open the remaining attempts (and files) fail with
+        HostUnavailable.
+        """
+        server = host_key(server_config["host"], group.port)
+        driver = protocols.load(server_config["protocol"])
+        retries = 0
+        while True:
+            self.breakers.check(server)
+            try:
+                self._list_group(group, progress)
+                progress.metrics.file_started(file_path)
+                with group.lock:
+                    # The listing predates this file's first attempt; later ones ask the server
+                    listing = None if file_path in group.attempted else group.remote_sizes
+                    group.attempted.add(file_path)
+                digests = self.upload(file_path, server_config, progress, listing)
+            except Exception as e:
+                if not driver.is_transient(e):
+                    # The server answered, so it is up; the problem is this file or login
+                    self.breakers.success(server)
+                    e.retries = retries
+                    raise
+                self.breakers.failure(server)
+                retries += 1
+                if retries >= self.max_attempts:
+                    e.retries = retries - 1
+                    raise
+                time.sleep(backoff_delay(retries - 1))
+            else:
+                self.breakers.success(server)
+                return retries, digests
+
+    def _list_group(self, group, progress):
+        """List a group's remote directory once, on its first upload.
+
+        The sizes stand in for per-file size checks when a file's first
+        attempt resumes a transfer from an earlier run. If the group's
+        server cannot be reached or refuses the login, the rest of the
+        group fails straight away instead of retrying every file, until
+        the breakers' cooldown has passed and the next file tries again.
+        """
+        with group.lock:
+            if group.error is not None and time.monotonic() - group.failed_at >= self.breakers.cooldown:
+                # A group can live for a whole drain; the login may have been refused only for a while
+                group.listed, group.error = False, None
+            if not group.listed:
+                group.listed = True
+                config = group.server_config
+                protocol = config["protocol"]
+                driver = protocols.load(protocol)
+
+                def list_dir(client):
+                    try:
+                        return driver.list_sizes(client, group.remote_dir)
+                    except Exception:
+                        # No MLSD, no permission: uploads check sizes one by one
+                        return None
+
+                try:
+                    group.remote_sizes = self.pool.run(
+                        protocol, config["host"], group.port, config["username"], config["password"],
+                        list_dir, self.session_options(protocol, config), progress.opened,
+                    )
+                except Exception as e:
+                    if driver.is_transient(e):
+                        # Let the next attempt connect and list again
+                        group.listed = False
+                        raise
+                    group.error, group.failed_at = e, time.monotonic()
+        if group.error is not None:
+            raise group.error
+
+    def _verify(self, group, batch):
+        """Check a batch of a group's uploads on the server; return {planned file: problem}.
+
+        Sizes come from one listing of the group's directory (or one size
+        request per file if the server will not list it). With "verify":
+        "checksum" a file whose size matches is also compared against the
+        server's checksum, where the server offers one. A file that is not
+        found is logged and left out: it cannot be checked, which is not
+        the same as a bad copy.
+        """
+        config = group.server_config
+        protocol = config["protocol"]
+        driver = protocols.load(protocol)
+        checksums = verify_mode(config) == "checksum"
+
+        def remote_size(client, planned):
+            try:
+                return driver.remote_size(client, planned.remote_path)
+            except Exception as e:
+                if driver.is_transient(e):
+                    raise
+                return None
+
+        def check(client):
+            try:
+                sizes = driver.list_sizes(client, group.remote_dir)
+            except Exception:
+                sizes = None
+            problems = {}
+            for planned in batch:
+                if sizes is not None:
+                    size = sizes.get(planned.remote_path.rsplit("/", 1)[1])
+                else:
+                    size = remote_size(client, planned)
+                if size is None:
+                    log.info("Could not verify %s: not found on the server", planned.file_path)
+                elif size != planned.size:
+                    problems[planned] = f"remote size {size}, local size {planned.size}"
+                elif checksums and planned.digests and not group.no_checksum:
+                    checksum = driver.remote_checksum(client, planned.remote_path)
+                    if checksum is None:
+                        # Asking again for every file would only waste round trips
+                        group.no_checksum = True
+                    elif checksum[1] != planned.digests.get(checksum[0]):
+                        problems[planned] = f"{checksum[0]} checksum differs"
+            return problems
+
+        return self.pool.run(protocol, config["host"], group.port, config["username"], config["password"],
+                             check, self.session_options(protocol, config))
+
+    def upload(self, file_path, server_config, progress=NO_PROGRESS, listing=None):
+        """Upload one file with its server's protocol, resuming a broken transfer."""
+        return self.transfer(server_config["protocol"], file_path, server_config, progress, listing)
+
+    def transfer(self, protocol, file_path, server_config, progress=NO_PROGRESS, listing=None):
+        """Send one file with a protocol driver over a pooled session.
+
+        The journal decides whether the server's partial copy can be
+        resumed. Its size comes from listing ({name: size} of the remote
+        directory) when given, which only holds until the file is first
+        sent; otherwise the server is asked. The driver is only imported
+        the first time it is needed. With "verify": "checksum" the file is
+        hashed as it goes out and {algorithm: hex digest} is returned;
+        otherwise None.
+        """
+        driver = protocols.load(protocol)
+        host, username = server_config["host"], server_config["username"]
+        port, remote_path = self.destination(file_path, server_config)
+
+        segments = self.segments(server_config, os.path.getsize(file_path))
+
+        def send(client):
+            nonlocal listing
+            digests = {}
+            if verify_mode(server_config) == "checksum":
+                digests = new_digests(driver.CHECKSUMS)
+            if segments > 1:
+                # Segments leave holes, so the remote size says nothing about what arrived
+                remote_size = None
+            elif listing is not None:
+                # The pool may call send again on a new session; by then only the server knows
+                sizes, listing = listing, None
+                remote_size = lambda: sizes.get(os.path.basename(remote_path))
+            else:
+                remote_size = lambda: driver.remote_size(client, remote_path)
+            key, offset = self.journal.begin(file_path, host, port, username, remote_path, remote_size)
+            progress.resumed(offset)
+            if digests and offset:
+                hash_prefix(file_path, offset, digests)
+
+            def sent(nbytes):
+                self.journal.advance(key, nbytes)
+                progress.sent(nbytes)
+                # Holds the transfer loop back before its next chunk when over a cap
+                self.bandwidth.throttle(host, nbytes)
+
+            if segments > 1:
+                driver.send_segmented(client, file_path, remote_path, segments, server_config, sent)
+                if digests:
+                    # Ranges go out in parallel, so hash the local file once they are all sent
+                    hash_prefix(file_path, os.path.getsize(file_path), digests)
+            else:
+                driver.send(client, file_path, remote_path, offset, server_config, sent, digests.values())
+            self.journal.finish(key)
+            return {name: digest.hexdigest() for name, digest in digests.items()} or None
+
+        return self.pool.run(protocol, host, port, username, server_config["password"], send,
+                             self.session_options(protocol, server_config), progress.opened)
+
+    def segments(self, server_config, size):
+        """Return how many parallel byte ranges a file of size bytes is sent to a server in."""
+        if not hasattr(protocols.load(server_config["protocol"]), "send_segmented"):
+            return 1
+        return segment_count(size, server_config)
+
+    def session_options(self, protocol, server_config):
+        """Return the keyword arguments a new Session for this server is opened with."""
+        options = timeouts(server_config)
+        if protocol == "sftp":
+            options.update(sftp_options(server_config))
+        return options
+
+    def close(self):
+        """Close pooled sessions and the manifest."""
+        self.pool.close_all()
+        self.manifest.close()
+
+
+def split_outcomes(outcomes):
+    """Turn upload_batch outcomes into the lists shown in summaries.
+
+    Returns (successful, failed, skipped, retried, unavailable); files that
+    only went through after retries are listed under retried.
+    """
+    successful_uploads = []
+    failed_uploads = []
+    skipped_uploads = []
+    retried_uploads = []
+    unavailable_uploads = []
+    for file_path, server_config, status, detail in outcomes:
+        file_name = os.path.basename(file_path)
+        if status == UPLOADED and detail:
+            retried_uploads.append((file_name, server_config["username"], detail))
+        elif status == UPLOADED:
+            successful_uploads.append((file_name, server_config["username"]))
+        elif status == SKIPPED:
+            skipped_uploads.append((file_name, detail))
+        elif status == UNAVAILABLE:
+            unavailable_uploads.append((file_name, detail))
+        else:
+            failed_uploads.append((file_name, detail))
+    return successful_uploads, failed_uploads, skipped_uploads, retried_uploads, unavailable_uploads
+
+
+def _retried(retries):
+    if not retries:
+        return None
+    return f"after {retries} {'retry' if retries == 1 else 'retries'}"
@@ -0,0 +1,92 @@
+"""Checkpoint journal of in-flight transfers so a retried batch can resume."""
+import json
+import os
+import threading
+
+from .state import state_path
+
+# In-flight progress is written to disk at most once per this many bytes per file
+CHECKPOINT_BYTES = 4 * 1024 * 1024
+
+
+def transfer_key(file_path, host, port, username, remote_path):
+    return "|".join([os.path.abspath(file_path), host, str(port), username, remote_path])
+
+
+class TransferJournal:
+    """JSON file of transfers that have started but not finished.
+
+    Each entry records the local file, its size and mtime, the server and
+    remote path, and the bytes confirmed so far. The file is replaced
+    atomically, so a crash leaves either the old or the new journal.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or state_path("journal.json")
+        self._lock = threading.Lock()
+        self._unsaved = {}  # key -> bytes advanced since the last save
+        try:
+            with open(self.path) as file:
+                self._entries = json.load(file)
+        except (FileNotFoundError, ValueError):
+            self._entries = {}
+
+    def begin(self, file_path, host, port, username, remote_path, remote_size):
+        """Record a transfer as in flight and return (key, offset to resume from).
+
+        remote_size() reports what the server already holds. It is only
+        trusted when the journal shows the same local file (size and mtime)
+        was being sent to the same place; otherwise the upload starts over.
+        Pass remote_size=None to always start over.
+        """
+        key = transfer_key(file_path, host, port, username, remote_path)
+        stat = os.stat(file_path)
+        with self._lock:
+            entry = self._entries.get(key)
+        offset = 0
+        if remote_size and entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+            try:
+                offset = remote_size() or 0
+            except Exception:
+                offset = 0
+            if offset > stat.st_size:
+                offset = 0
+        with self._lock:
+            self._entries[key] = {
+                "path": os.path.abspath(file_path),
+                "size": stat.st_size,
+                "mtime": stat.st_mtime_ns,
+                "server": f"{username}@{host}:{port}",
+                "remote_path": remote_path,
+                "bytes_confirmed": offset,
+            }
+            self._unsaved[key] = 0
+            self._save()
+        return key, offset
+
+    def advance(self, key, nbytes):
+        """Count bytes handed to the server, saving every CHECKPOINT_BYTES."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry["bytes_confirmed"] += nbytes
+            self._unsaved[key] = self._unsaved.get(key, 0) + nbytes
+            if self._unsaved[key] >= CHECKPOINT_BYTES:
+                self._unsaved[key] = 0
+                self._save()
+
+    def finish(self, key):
+        """Forget a transfer that completed."""
+        with self._lock:
+            self._unsaved.pop(key, None)
+            if self._entries.pop(key, None) is not None:
+                self._save()
+
+    def _save(self):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump(self._entries, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.path)
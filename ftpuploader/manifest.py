@@ -0,0 +1,92 @@
+"""Persistent record of file contents already delivered to each server."""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from .state import state_path
+
+# Bytes hashed per read
+HASH_CHUNK = 1024 * 1024
+
+
+class DeliveryManifest:
+    """SQLite cache of content hashes and the deliveries made with them.
+
+    A file's hash is computed once and reused for as long as its size and
+    mtime stay the same. A delivery is keyed by (hash, server, remote path),
+    so renamed or re-dropped copies of a delivered file are recognised.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or state_path("manifest.sqlite3")
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS hashes (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime INTEGER NOT NULL,
+                sha256 TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS deliveries (
+                sha256 TEXT NOT NULL,
+                server TEXT NOT NULL,
+                remote_path TEXT NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                delivered_at REAL NOT NULL,
+                PRIMARY KEY (sha256, server, remote_path)
+            );
+        """)
+
+    def content_hash(self, file_path):
+        """Return the file's SHA-256, hashing it only if it changed since last time."""
+        path = os.path.abspath(file_path)
+        stat = os.stat(path)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT sha256 FROM hashes WHERE path = ? AND size = ? AND mtime = ?",
+                (path, stat.st_size, stat.st_mtime_ns),
+            ).fetchone()
+        if row:
+            return row[0]
+        digest = hashlib.sha256()
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(HASH_CHUNK), b""):
+                digest.update(chunk)
+        sha256 = digest.hexdigest()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO hashes (path, size, mtime, sha256) VALUES (?, ?, ?, ?)",
+                (path, stat.st_size, stat.st_mtime_ns, sha256),
+            )
+        return sha256
+
+    def delivered(self, sha256, server, remote_path):
+        """Return True if this content already reached server at remote_path."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM deliveries WHERE sha256 = ? AND server = ? AND remote_path = ?",
+                (sha256, server, remote_path),
+            ).fetchone()
+        return row is not None
+
+    def record(self, sha256, server, remote_path, file_path, size):
+        """Remember a successful delivery of size bytes.
+
+        size is the one the upload was planned with: the local file may be
+        gone by now (moved away by whoever dropped it, say).
+        """
+        path = os.path.abspath(file_path)
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO deliveries (sha256, server, remote_path, path, size, delivered_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (sha256, server, remote_path, path, size, time.time()),
+            )
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,297 @@
+"""Byte-level progress, throughput and latency metrics for an upload batch."""
+import json
+import os
+import threading
+import time
+
+from .state import state_path
+
+# Progress events are sent to the listener at most this often
+PROGRESS_INTERVAL = 0.1
+
+# Phases timed per host: TCP connect plus handshake, login, and the file transfer
+PHASES = ("connect", "auth", "transfer")
+
+
+class TransferMetrics:
+    """Thread-safe collector fed by the protocol drivers.
+
+    listener, if given, is called from worker threads with
+    ("progress", snapshot) at most every PROGRESS_INTERVAL seconds and
+    ("file", file_path, status, detail) whenever a file is finished. The
+    GUI passes a queue's put method and drains it from the Tk main loop.
+    Per-file state is read with changes(), which returns only the files
+    touched since the last call, however many events there were.
+    """
+
+    def __init__(self, listener=None):
+        self.listener = listener
+        self.started = time.time()
+        self._clock_start = time.monotonic()
+        self._lock = threading.Lock()
+        self._files = {}
+        self._changed = set()
+        self._hosts = {}
+        self._bytes_total = 0
+        self._bytes_sent = 0
+        self._bytes_resumed = 0
+        self._files_done = 0
+        self._last_progress = 0.0
+
+    def add_file(self, file_path, host, size):
+        """Count a file that is going to be uploaded."""
+        with self._lock:
+            self._files[file_path] = {
+                "host": host, "size": size, "sent": 0, "status": "queued", "error": None, "detail": None,
+                "started": None, "finished": None,
+            }
+            self._changed.add(file_path)
+            self._bytes_total += size
+            self._host(host)["files"] += 1
+
+    def file_started(self, file_path):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._files[file_path]
+            entry["started"] = now
+            entry["status"] = "uploading"
+            self._changed.add(file_path)
+            host = self._host(entry["host"])
+            if host["first_start"] is None:
+                host["first_start"] = now
+
+    def bytes_sent(self, file_path, nbytes):
+        """Count bytes handed to the server for a file."""
+        with self._lock:
+            entry = self._files[file_path]
+            entry["sent"] += nbytes
+            self._changed.add(file_path)
+            self._bytes_sent += nbytes
+            host = self._host(entry["host"])
+            host["bytes"] += nbytes
+            host["last_activity"] = time.monotonic()
+        self._progress()
+
+    def bytes_resumed(self, file_path, offset):
+        """(Re)start a file at offset, the bytes the server already holds.
+
+        Progress jumps to offset without crediting throughput; bytes sent by
+        an earlier attempt that are being sent again stop counting as progress.
+        """
+        with self._lock:
+            entry = self._files[file_path]
+            delta = offset - entry["sent"]
+            entry["sent"] = offset
+            self._changed.add(file_path)
+            self._bytes_sent += delta
+            self._bytes_resumed += delta
+        self._progress()
+
+    def phase(self, host, name, seconds):
+        with self._lock:
+            self._host(host)["phases"][name].append(seconds)
+
+    def file_finished(self, file_path, status, detail=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._files.get(file_path)
+            if entry is None:
+                # Never routed, so it was never added
+                entry = self._files[file_path] = {
+                    "host": "", "size": 0, "sent": 0, "started": None, "finished": None,
+                }
+            entry["status"] = status
+            entry["error"] = detail if status in ("failed", "unavailable") else None
+            entry["detail"] = detail
+            entry["finished"] = now
+            self._changed.add(file_path)
+            if entry["started"] is not None and status == "uploaded":
+                self._host(entry["host"])["phases"]["transfer"].append(now - entry["started"])
+            # Whatever was not sent no longer counts towards the ETA
+            unsent = entry["size"] - entry["sent"]
+            if unsent > 0:
+                self._bytes_total -= unsent
+            self._files_done += 1
+        if self.listener:
+            self.listener(("file", file_path, status, detail))
+        self._progress(force=True)
+
+    def changes(self):
+        """Return {file_path: (host, size, sent, status, detail)} for files changed since the last call."""
+        with self._lock:
+            changed, self._changed = self._changed, set()
+            changes = {}
+            for path in changed:
+                entry = self._files[path]
+                changes[path] = (entry["host"], entry["size"], entry["sent"], entry["status"], entry["detail"])
+            return changes
+
+    def snapshot(self):
+        """Return overall progress: files, bytes, rate (bytes/s) and ETA (seconds or None)."""
+        with self._lock:
+            elapsed = time.monotonic() - self._clock_start
+            transferred = self._bytes_sent - self._bytes_resumed
+            rate = transferred / elapsed if elapsed > 0 else 0.0
+            remaining = max(0, self._bytes_total - self._bytes_sent)
+            return {
+                "files_total": len(self._files),
+                "files_done": self._files_done,
+                "bytes_total": self._bytes_total,
+                "bytes_sent": self._bytes_sent,
+                "rate": rate,
+                "eta": remaining / rate if rate > 0 else None,
+                "elapsed": elapsed,
+            }
+
+    def host_stats(self):
+        """Return per-host bytes, files, throughput and phase latencies."""
+        with self._lock:
+            stats = {}
+            for name, host in self._hosts.items():
+                active = 0.0
+                if host["first_start"] is not None and host["last_activity"] is not None:
+                    active = host["last_activity"] - host["first_start"]
+                stats[name] = {
+                    "files": host["files"],
+                    "bytes": host["bytes"],
+                    "throughput": host["bytes"] / active if active > 0 else 0.0,
+                    "phases": {phase: _summarize(values) for phase, values in host["phases"].items()},
+                }
+            return stats
+
+    def report(self):
+        """Return a JSON-serialisable run report."""
+        with self._lock:
+            files = [
+                {"path": path, "host": entry["host"], "size": entry["size"], "sent": entry["sent"],
+                 "status": entry["status"], "error": entry["error"], "seconds": _duration(entry)}
+                for path, entry in self._files.items()
+            ]
+        return {
+            "started": self.started,
+            "summary": self.snapshot(),
+            "hosts": self.host_stats(),
+            "files": files,
+        }
+
+    def write_json(self, path):
+        _write_atomic(path, json.dumps(self.report(), indent=2))
+
+    def write_prometheus(self, path):
+        """Write the run in Prometheus text format, e.g. for node_exporter's textfile collector."""
+        snapshot = self.snapshot()
+        hosts = self.host_stats()
+        with self._lock:
+            outcomes = {}
+            for entry in self._files.values():
+                key = (entry["host"], entry["status"])
+                outcomes[key] = outcomes.get(key, 0) + 1
+        lines = [
+            "# TYPE ftpuploader_run_seconds gauge",
+            f"ftpuploader_run_seconds {snapshot['elapsed']:.3f}",
+            "# TYPE ftpuploader_run_bytes_per_second gauge",
+            f"ftpuploader_run_bytes_per_second {snapshot['rate']:.1f}",
+            "# TYPE ftpuploader_files gauge",
+        ]
+        for (host, status), count in sorted(outcomes.items()):
+            lines.append(f'ftpuploader_files{{host="{host}",status="{status}"}} {count}')
+        lines.append("# TYPE ftpuploader_host_bytes gauge")
+        for host, stats in sorted(hosts.items()):
+            lines.append(f'ftpuploader_host_bytes{{host="{host}"}} {stats["bytes"]}')
+        lines.append("# TYPE ftpuploader_host_bytes_per_second gauge")
+        for host, stats in sorted(hosts.items()):
+            lines.append(f'ftpuploader_host_bytes_per_second{{host="{host}"}} {stats["throughput"]:.1f}')
+        lines.append("# TYPE ftpuploader_phase_seconds summary")
+        for host, stats in sorted(hosts.items()):
+            for phase, summary in stats["phases"].items():
+                labels = f'host="{host}",phase="{phase}"'
+                lines.append(f"ftpuploader_phase_seconds_sum{{{labels}}} {summary['total']:.4f}")
+                lines.append(f"ftpuploader_phase_seconds_count{{{labels}}} {summary['count']}")
+        _write_atomic(path, "\n".join(lines) + "\n")
+
+    def _host(self, host):
+        if host not in self._hosts:
+            self._hosts[host] = {
+                "files": 0, "bytes": 0, "first_start": None, "last_activity": None,
+                "phases": {phase: [] for phase in PHASES},
+            }
+        return self._hosts[host]
+
+    def _progress(self, force=False):
+        if not self.listener:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_progress < PROGRESS_INTERVAL:
+                return
+            self._last_progress = now
+        self.listener(("progress", self.snapshot()))
+
+
+class FileProgress:
+    """Progress callbacks for one file, handed to the protocol drivers."""
+
+    def __init__(self, metrics=None, file_path=None, host=None):
+        self.metrics = metrics
+        self.file_path = file_path
+        self.host = host
+
+    def sent(self, nbytes):
+        if self.metrics:
+            self.metrics.bytes_sent(self.file_path, nbytes)
+
+    def resumed(self, offset):
+        """Called at the start of every attempt with the offset it resumes from."""
+        if self.metrics:
+            self.metrics.bytes_resumed(self.file_path, offset)
+
+    def opened(self, timings):
+        """Record connect/auth times of a session opened for this file."""
+        if self.metrics:
+            for phase, seconds in timings.items():
+                self.metrics.phase(self.host, phase, seconds)
+
+
+# Used when a driver is called without metrics
+NO_PROGRESS = FileProgress()
+
+
+def _summarize(values):
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "total": sum(ordered),
+        "p50": ordered[len(ordered) // 2] if ordered else None,
+        "max": ordered[-1] if ordered else None,
+    }
+
+
+def _duration(entry):
+    if entry["started"] is None or entry["finished"] is None:
+        return None
+    return entry["finished"] - entry["started"]
+
+
+def _write_atomic(path, text):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as file:
+        file.write(text)
+    os.replace(temp_path, path)
+
+
+def describe_progress(snapshot):
+    """One-line progress text: files, MB sent, rate and ETA."""
+    text = (f"{snapshot['files_done']}/{snapshot['files_total']} file(s), "
+            f"{snapshot['bytes_sent'] / 1e6:.1f} of {snapshot['bytes_total'] / 1e6:.1f} MB")
+    if snapshot["rate"]:
+        text += f" at {snapshot['rate'] / 1e6:.2f} MB/s"
+    if snapshot["eta"] is not None and snapshot["files_done"] < snapshot["files_total"]:
+        minutes, seconds = divmod(int(snapshot["eta"]), 60)
+        text += f", {minutes}:{seconds:02d} left"
+    return text
+
+
+def save_run(metrics, json_path=None, prometheus_path=None):
+    """Write the JSON run report and Prometheus metrics, by default into the state directory."""
+    metrics.write_json(json_path or state_path("last-run.json"))
+    metrics.write_prometheus(prometheus_path or state_path("ftpuploader.prom"))
@@ -0,0 +1,144 @@
+"""Batch planning: resolve, validate and group files before any network I/O."""
+import os
+import threading
+from collections import OrderedDict
+
+# Keys a server entry needs before anything is sent to it
+REQUIRED_KEYS = ("type", "host", "username", "password")
+
+
+class PrefixIndex:
+    """Precompiled lookup from file name prefix to server entry.
+
+    Prefixes may have any length; the longest matching prefix wins, so
+    "H6000" and "H600099" can both be configured.
+    """
+
+    def __init__(self, servers):
+        self._by_length = {}
+        for prefix, server_config in servers.items():
+            self._by_length.setdefault(len(prefix), {})[prefix.upper()] = server_config
+        self._lengths = sorted(self._by_length, reverse=True)
+
+    def match(self, file_name):
+        """Return the server config for a file name, or None."""
+        name = file_name.upper()
+        for length in self._lengths:
+            if length <= len(name):
+                server_config = self._by_length[length].get(name[:length])
+                if server_config is not None:
+                    return server_config
+        return None
+
+
+class PlannedFile:
+    """A file that will be uploaded, with everything resolved up front."""
+
+    def __init__(self, index, file_path, server_config, remote_path, size, delivery):
+        self.index = index
+        self.file_path = file_path
+        self.server_config = server_config
+        self.remote_path = remote_path
+        self.size = size
+        self.delivery = delivery  # (content hash, server id, remote path) for the manifest
+        # Set once uploaded, for verification
+        self.retries = 0
+        self.digests = None
+        self.reuploaded = False
+
+
+class Group:
+    """One destination, host, port, login and remote directory, and what is known about it.
+
+    A Group can outlive the plan that made it: plans that share a groups
+    dict (see Plan) share its listing and counters.
+    """
+
+    def __init__(self, server_config, port, remote_dir):
+        self.server_config = server_config
+        self.port = port
+        self.remote_dir = remote_dir
+        # Filled in by the first upload of the group: one listing of remote_dir
+        # (name -> size, or None if the server refused it) or the error that
+        # kept the group from connecting at all, and when it happened
+        self.lock = threading.Lock()
+        self.listed = False
+        self.remote_sizes = None
+        self.error = None
+        self.failed_at = None
+        self.remaining = 0  # submitted uploads not finished yet
+        self.attempted = set()  # file paths sent at least once, which the listing no longer describes
+        self.unverified = []  # uploaded files waiting to be checked in one batch
+        self.no_checksum = False  # the server has no checksum command
+
+    @property
+    def login(self):
+        """(host, port, username): what session caps and the connection pool go by."""
+        return (self.server_config["host"], self.port, self.server_config["username"])
+
+    @property
+    def key(self):
+        return (self.server_config["host"], self.port, self.server_config["username"],
+                self.server_config["password"], self.remote_dir)
+
+
+class Plan:
+    """The execution plan for a batch.
+
+    groups holds one Group per destination, in the order the
+    destinations first appear in the batch, and batches() pairs each with
+    the plan's files for it. Groups are taken from known, a dict kept by
+    the caller, when it is given, so later plans reuse them. rejected
+    holds (index, file_path, server_config, status, detail) for every
+    file that will not be uploaded, with the reason.
+    """
+
+    def __init__(self, file_paths, known=None):
+        self.file_paths = file_paths
+        self.groups = OrderedDict()
+        self.group_files = {}  # group key -> this plan's files for it
+        self.rejected = []
+        self._known = known
+
+    def add(self, planned, port, remote_dir):
+        group = Group(planned.server_config, port, remote_dir)
+        if self._known is not None:
+            group = self._known.setdefault(group.key, group)
+        self.groups.setdefault(group.key, group)
+        self.group_files.setdefault(group.key, []).append(planned)
+
+    def batches(self):
+        """Return [(group, files)] for every destination, in plan order."""
+        return [(group, self.group_files[key]) for key, group in self.groups.items()]
+
+    def reject(self, index, server_config, status, detail):
+        self.rejected.append((index, self.file_paths[index], server_config, status, detail))
+
+    @property
+    def files(self):
+        return [planned for _, files in self.batches() for planned in files]
+
+    def describe(self):
+        """Return the plan as text for a dry run or the UI."""
+        files = self.files
+        lines = [f"{len(files)} file(s), {sum(p.size for p in files) / 1e6:.1f} MB "
+                 f"in {len(self.groups)} destination(s); {len(self.rejected)} not uploaded"]
+        for group, files in self.batches():
+            config = group.server_config
+            size = sum(planned.size for planned in files)
+            lines.append("")
+            lines.append(f"{config['type']} {config['username']}@{config['host']}:{group.port} "
+                         f"{group.remote_dir}  ({len(files)} file(s), {size / 1e6:.1f} MB)")
+            for planned in files:
+                lines.append(f"  {os.path.basename(planned.file_path)}  {planned.size} bytes")
+        if self.rejected:
+            lines.append("")
+            lines.append("Not uploaded:")
+            for _, file_path, _, status, detail in self.rejected:
+                lines.append(f"  {os.path.basename(file_path)}  {status}: {detail}")
+        return "\n".join(lines)
+
+
+def missing_keys(server_config):
+    """Return the required keys a server entry lacks."""
+    return [key for key in REQUIRED_KEYS if not isinstance(server_config.get(key), str)]
@@ -0,0 +1,171 @@
+"""Pooled, already-authenticated SFTP/FTP sessions keyed by (host, port, username)."""
+import threading
+import time
+
+from . import protocols
+
+# Seconds between keepalives sent on idle sessions
+KEEPALIVE_INTERVAL = 30
+
+# Idle sessions older than this are closed by the reaper
+IDLE_TIMEOUT = 300
+
+# Most idle sessions kept open at once, least recently used are closed first
+MAX_IDLE_SESSIONS = 8
+
+
+class ConnectionPool:
+    """Hands out authenticated sessions and keeps idle ones around for reuse.
+
+    Idle sessions are kept alive with keepalives/NOOPs, closed after
+    IDLE_TIMEOUT seconds and capped at MAX_IDLE_SESSIONS (least recently
+    used first). A session stays in the pool while it is pinged, and a
+    job that wants it waits rather than opening one more to the server.
+    A session whose action fails is closed rather than pooled again; if
+    it was a reused session that dropped, the action is retried once on
+    a fresh one.
+    """
+
+    def __init__(self, idle_timeout=IDLE_TIMEOUT, max_idle=MAX_IDLE_SESSIONS,
+                 keepalive_interval=KEEPALIVE_INTERVAL):
+        self.idle_timeout = idle_timeout
+        self.max_idle = max_idle
+        self.keepalive_interval = keepalive_interval
+        self._lock = threading.Lock()
+        self._pinged = threading.Condition(self._lock)
+        self._idle = []  # (key, session), least recently used first
+        self._pinging = None  # the idle session the reaper is pinging
+        self._closed = False
+        self._wakeup = threading.Event()
+        self._reaper = threading.Thread(target=self._reap_loop, name="pool-reaper", daemon=True)
+        self._reaper.start()
+
+    def acquire(self, protocol, host, port, username, password, options=None):
+        """Return an idle session for (host, port, username) or open a new one.
+
+        protocol names a driver in ftpuploader.protocols; options are passed
+        to its Session class when a new one is opened. Only a session idle
+        for longer than keepalive_interval is checked with a round trip
+        first; run() replaces one that turns out dead anyway.
+        """
+        key = (host, port, username)
+        while True:
+            session = self._take_idle(key)
+            if session is None:
+                return self._open(protocol, host, port, username, password, options)
+            if time.monotonic() - session.last_used <= self.keepalive_interval or session.is_alive():
+                return session
+            session.close()
+
+    def release(self, key, session):
+        """Return a healthy session to the pool."""
+        session.last_used = time.monotonic()
+        evicted = []
+        with self._lock:
+            if self._closed:
+                evicted.append(session)
+            else:
+                self._idle.append((key, session))
+                while len(self._idle) > self.max_idle:
+                    index = next(n for n, item in enumerate(self._idle) if item[1] is not self._pinging)
+                    evicted.append(self._idle.pop(index)[1])
+        for old in evicted:
+            old.close()
+
+    def run(self, protocol, host, port, username, password, action, options=None, on_open=None):
+        """Call action(client) on a pooled session and return its result.
+
+        A session is closed whenever the action raises: after an aborted
+        FTP transfer, say, the server's late reply to it would be read as
+        the answer to the next command. If the session came from the pool
+        and the error is transient (it most likely went stale while idle),
+        the action is retried once on a new session; other errors are
+        raised. on_open(timings) is called with the connect/auth times of
+        any session opened rather than reused.
+        """
+        key = (host, port, username)
+        session = self.acquire(protocol, host, port, username, password, options)
+        reused = session.used
+        if on_open and not reused:
+            on_open(session.timings)
+        session.used = True
+        try:
+            result = action(session.client)
+        except Exception as e:
+            session.close()
+            if not reused or not protocols.load(protocol).is_transient(e):
+                raise
+            session = self._open(protocol, host, port, username, password, options)
+            session.used = True
+            if on_open:
+                on_open(session.timings)
+            try:
+                result = action(session.client)
+            except Exception:
+                session.close()
+                raise
+        self.release(key, session)
+        return result
+
+    def close_all(self):
+        """Close every idle session and stop the reaper."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        self._wakeup.set()
+        for _, session in idle:
+            session.close()
+
+    def _open(self, protocol, host, port, username, password, options):
+        # The driver (and its protocol library) is imported on first use
+        session_class = protocols.load(protocol).Session
+        return session_class(host, port, username, password, **(options or {}))
+
+    def _take_idle(self, key):
+        with self._lock:
+            while True:
+                pinging = False
+                for index in range(len(self._idle) - 1, -1, -1):
+                    if self._idle[index][0] == key:
+                        if self._idle[index][1] is not self._pinging:
+                            return self._idle.pop(index)[1]
+                        pinging = True
+                if not pinging:
+                    return None
+                # It still counts against the login's session cap, so wait for it
+                self._pinged.wait()
+
+    def _reap_loop(self):
+        while not self._wakeup.wait(self.keepalive_interval):
+            self._reap()
+
+    def _reap(self):
+        """Close expired sessions and keep the rest alive, one at a time."""
+        now = time.monotonic()
+        with self._lock:
+            expired = [item for item in self._idle if now - item[1].last_used > self.idle_timeout]
+            self._idle = [item for item in self._idle if now - item[1].last_used <= self.idle_timeout]
+            live = list(self._idle)
+        for _, session in expired:
+            session.close()
+        for item in live:
+            with self._lock:
+                if self._closed:
+                    return
+                if item not in self._idle:
+                    continue  # a worker took it meanwhile
+                self._pinging = item[1]
+            try:
+                item[1].keepalive()
+                healthy = True
+            except Exception:
+                healthy = False
+            with self._lock:
+                self._pinging = None
+                # close_all() may have taken and closed it meanwhile
+                dead = not healthy and item in self._idle
+                if dead:
+                    self._idle.remove(item)
+                self._pinged.notify_all()
+            if dead:
+                item[1].close()
@@ -0,0 +1,373 @@
+"""Optional engine that runs uploads in worker processes, to use more than one core.
+
+paramiko encrypts, MACs and frames SSH packets mostly while holding the
+GIL, so with many SFTP sessions open the threaded engine tops out at one
+core. ProcessUploadEngine plans in this process as usual, then spreads
+each host's files over worker processes. Every worker has its own
+UploadEngine, sessions and journal; progress and outcomes come back over
+one multiprocessing queue and are applied to the caller's
+TransferMetrics, so the GUI and CLI see the same events as with threads.
+"""
+import functools
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import zlib
+
+from .engine import FAILED, UploadEngine
+from .journal import TransferJournal
+from .manifest import DeliveryManifest
+from .metrics import PROGRESS_INTERVAL
+from .planner import Plan, PlannedFile
+from .scheduler import PER_LOGIN_LIMIT, UploadScheduler
+
+log = logging.getLogger(__name__)
+
+# Worker processes started by ProcessUploadEngine unless told otherwise
+PROCESSES = os.cpu_count() or 1
+
+# Seconds close() waits for a worker to finish before it is terminated
+STOP_TIMEOUT = 10
+
+
+class ProcessUploadEngine(UploadEngine):
+    """UploadEngine whose transfers run in worker processes.
+
+    A login's files are spread over as many workers as its session cap
+    allows (at most all of them), and each of those workers gets its share
+    of the cap, so no login sees more sessions than with threads.
+    Which worker a file goes to depends only on its name, so a broken
+    transfer resumes from the same worker's journal on the next run.
+    Bandwidth caps set on self.bandwidth are split between the workers
+    that have files out (for a host cap, files for that host) and passed
+    on again whenever that changes. The workers start with the first run
+    and stay up until close(). Circuit breakers are kept per worker.
+    """
+
+    def __init__(self, servers=None, processes=PROCESSES, **kwargs):
+        super().__init__(servers=servers, **kwargs)
+        self.processes = max(1, processes)
+        self._context = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._workers = []  # (process, inbox) per slot
+        self._outbox = None
+        self._reader = None
+        self._closed = False
+        self._runs = {}  # run id -> _Run
+        self._run_ids = itertools.count()
+        self._pending = {}  # token -> (run, planned, on_outcome, slot)
+        self._busy = {}  # (slot, host) -> files out in that worker for that host
+        self._tokens = itertools.count()
+        self._rates = None  # last caps passed on to the workers, per slot
+        # Most sessions any login on a host may open: how many workers its files can reach
+        self._host_limits = {}
+        for config in self.servers.values():
+            if "host" in config:
+                self._host_limits[config["host"]] = max(self._host_limits.get(config["host"], 1),
+                                                        config.get("max_sessions", PER_LOGIN_LIMIT))
+
+    def scheduler(self):
+        with self._lock:
+            run = _Run(next(self._run_ids), self._runs)
+            self._runs[run.id] = run
+        return run
+
+    def submit_plan(self, plan, scheduler, metrics, on_outcome):
+        """Send a plan's uploads to the worker processes.
+
+        Same contract as UploadEngine.submit_plan; scheduler is the _Run
+        returned by scheduler(), and on_outcome is called from the thread
+        that reads the workers' queue.
+        """
+        self._start()
+        scheduler.metrics = metrics
+        self.report_rejected(plan, metrics, on_outcome)
+        shards = {}  # slot -> file entries for that worker
+        shares = {}  # (id(server config), n) -> config with that worker's session cap
+        for group, files in plan.batches():
+            server_config = group.server_config
+            host = server_config["host"]
+            limit = server_config.get("max_sessions", PER_LOGIN_LIMIT)
+            slots = self._slots(host, limit)
+            for planned in files:
+                metrics.add_file(planned.file_path, host, planned.size)
+                n = zlib.crc32(os.path.basename(planned.file_path).encode("utf-8")) % len(slots)
+                key = (id(server_config), n)
+                if key not in shares:
+                    shares[key] = dict(server_config, max_sessions=limit // len(slots) + (n < limit % len(slots)))
+                token = next(self._tokens)
+                with self._lock:
+                    self._pending[token] = (scheduler, planned, on_outcome, slots[n])
+                    self._busy[slots[n], host] = self._busy.get((slots[n], host), 0) + 1
+                scheduler.add()
+                shards.setdefault(slots[n], []).append(
+                    (token, planned.file_path, shares[key], planned.remote_path, planned.size,
+                     planned.delivery, group.port, group.remote_dir),
+                )
+        # The workers about to get files get their share of the caps first
+        self._send_rates()
+        for slot, entries in shards.items():
+            self._workers[slot][1].put(("files", scheduler.id, entries))
+
+    def close(self):
+        """Stop the worker processes, then close pooled sessions and the manifest."""
+        with self._lock:
+            self._closed = True
+            workers, self._workers = self._workers, []
+        for _, inbox in workers:
+            inbox.put(None)
+        for process, _ in workers:
+            process.join(STOP_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+        if self._reader is not None:
+            self._reader.join()
+        super().close()
+
+    def _slots(self, host, limit):
+        """Return the worker slots a host's files are spread over."""
+        count = max(1, min(limit, self.processes))
+        first = zlib.crc32(host.encode("utf-8")) % self.processes
+        return [(first + n) % self.processes for n in range(count)]
+
+    def _start(self):
+        with self._lock:
+            if self._workers:
+                return
+            self._outbox = self._context.Queue()
+            self._workers = [self._start_worker(slot) for slot in range(self.processes)]
+            self._rates = None
+            self._reader = threading.Thread(target=self._read, name="process-engine-reader", daemon=True)
+            self._reader.start()
+        self._send_rates()
+
+    def _start_worker(self, slot):
+        root, extension = os.path.splitext(self.journal.path)
+        inbox = self._context.Queue()
+        process = self._context.Process(
+            target=_worker_main, name=f"upload-process-{slot}", daemon=True,
+            args=(slot, self.servers, self.manifest.path, f"{root}-{slot}{extension}", inbox, self._outbox),
+        )
+        process.start()
+        return process, inbox
+
+    def _send_rates(self):
+        """Pass each worker its share of the bandwidth caps if the shares changed.
+
+        A cap is split evenly between the workers with files out for it, so
+        one busy worker gets all of it; idle workers get the same share as
+        the busy ones, and are passed a new one before any files.
+        """
+        total, host_rates = self.bandwidth.rates()
+        with self._lock:
+            busy = {slot for (slot, _), count in self._busy.items() if count}
+            share = total / max(1, len(busy)) if total else None
+            rates = [(share, {}) for _ in range(self.processes)]
+            for host, rate in host_rates.items():
+                slots = self._slots(host, self._host_limits.get(host, PER_LOGIN_LIMIT))
+                sending = sum(1 for slot in slots if self._busy.get((slot, host)))
+                for slot in slots:
+                    rates[slot][1][host] = rate / max(1, sending) if rate else None
+            if rates == self._rates:
+                return
+            self._rates = rates
+            # Sent under the lock so a newer share never arrives before an older one
+            for (_, inbox), (share, hosts) in zip(self._workers, rates):
+                inbox.put(("rates", share, hosts))
+
+    def _read(self):
+        """Apply the workers' messages until close(); runs on its own thread."""
+        checked = time.monotonic()
+        while True:
+            if time.monotonic() - checked >= PROGRESS_INTERVAL:
+                checked = time.monotonic()
+                self._check_workers()
+                self._send_rates()
+            try:
+                message = self._outbox.get(timeout=PROGRESS_INTERVAL)
+            except queue.Empty:
+                with self._lock:
+                    if self._closed:
+                        return
+                continue
+            if message[0] == "metrics":
+                _, run_id, name, args = message
+                with self._lock:
+                    run = self._runs.get(run_id)
+                if run is not None and run.metrics is not None:
+                    getattr(run.metrics, name)(*args)
+            else:
+                _, token, status, detail = message
+                for entry in self._take_pending([token]):
+                    self._settle(entry, status, detail)
+
+    def _take_pending(self, tokens):
+        """Remove and return the pending entries of tokens that are still out."""
+        entries = []
+        with self._lock:
+            for token in tokens:
+                entry = self._pending.pop(token, None)
+                if entry is not None:
+                    key = (entry[3], entry[1].server_config["host"])
+                    self._busy[key] -= 1
+                    if not self._busy[key]:
+                        del self._busy[key]
+                    entries.append(entry)
+        return entries
+
+    def _settle(self, entry, status, detail):
+        run, planned, on_outcome, _ = entry
+        try:
+            on_outcome(planned.index, (planned.file_path, planned.server_config, status, detail))
+        except Exception:
+            log.exception("Reporting %s failed", planned.file_path)
+        finally:
+            run.done()
+
+    def _check_workers(self):
+        """Fail the files of a worker that died and start a new one in its place."""
+        with self._lock:
+            if self._closed:
+                return
+            dead = [slot for slot, (process, _) in enumerate(self._workers) if not process.is_alive()]
+            lost = []
+            for slot in dead:
+                log.warning("Upload process %s exited with code %s; restarting it",
+                            slot, self._workers[slot][0].exitcode)
+                self._workers[slot] = self._start_worker(slot)
+                lost += [token for token, entry in self._pending.items() if entry[3] == slot]
+            if dead:
+                self._rates = None
+        for entry in self._take_pending(lost):
+            detail = "Error: upload process exited"
+            entry[0].metrics.file_finished(entry[1].file_path, FAILED, detail)
+            self._settle(entry, FAILED, detail)
+
+
+class _Run:
+    """Takes the place of the UploadScheduler of one run: counts its files still out in workers."""
+
+    def __init__(self, run_id, runs):
+        self.id = run_id
+        self.metrics = None
+        self.login_limits = {}
+        self._runs = runs
+        self._unfinished = 0
+        self._condition = threading.Condition()
+
+    def start(self, workers=None):
+        pass
+
+    def add(self):
+        with self._condition:
+            self._unfinished += 1
+
+    def done(self):
+        with self._condition:
+            self._unfinished -= 1
+            self._condition.notify_all()
+
+    def unfinished(self):
+        with self._condition:
+            return self._unfinished
+
+    def close(self):
+        pass
+
+    def join(self):
+        with self._condition:
+            while self._unfinished:
+                self._condition.wait()
+        self._runs.pop(self.id, None)
+
+
+class _MetricsRelay:
+    """Takes the place of TransferMetrics in a worker, forwarding to the parent's.
+
+    bytes_sent is added up per file and forwarded at most every
+    PROGRESS_INTERVAL seconds, so a fast transfer does not flood the queue;
+    anything else goes out at once, after the bytes before it.
+    """
+
+    def __init__(self, outbox, run_id):
+        self.outbox = outbox
+        self.run_id = run_id
+        self._lock = threading.Lock()
+        self._unsent = {}
+        self._flushed = time.monotonic()
+
+    def add_file(self, file_path, host, size):
+        # The parent counted the file before it sent it here
+        pass
+
+    def file_started(self, file_path):
+        self._forward("file_started", file_path)
+
+    def bytes_sent(self, file_path, nbytes):
+        with self._lock:
+            self._unsent[file_path] = self._unsent.get(file_path, 0) + nbytes
+            if time.monotonic() - self._flushed >= PROGRESS_INTERVAL:
+                self._flush()
+
+    def bytes_resumed(self, file_path, offset):
+        self._forward("bytes_resumed", file_path, offset)
+
+    def phase(self, host, name, seconds):
+        self._forward("phase", host, name, seconds)
+
+    def file_finished(self, file_path, status, detail=None):
+        self._forward("file_finished", file_path, status, detail)
+
+    def _forward(self, name, *args):
+        with self._lock:
+            self._flush()
+            self.outbox.put(("metrics", self.run_id, name, args))
+
+    def _flush(self):
+        # Called with the lock held
+        for file_path, nbytes in self._unsent.items():
+            self.outbox.put(("metrics", self.run_id, "bytes_sent", (file_path, nbytes)))
+        self._unsent = {}
+        self._flushed = time.monotonic()
+
+
+def _report(outbox, tokens, index, outcome):
+    outbox.put(("outcome", tokens[index], outcome[2], outcome[3]))
+
+
+def _worker_main(slot, servers, manifest_path, journal_path, inbox, outbox):
+    """Run uploads sent by a ProcessUploadEngine until it sends None."""
+    engine = UploadEngine(servers=servers, manifest=DeliveryManifest(manifest_path),
+                          journal=TransferJournal(journal_path))
+    scheduler = UploadScheduler()
+    scheduler.start()
+    # A run's destinations keep one Group each, as in UploadEngine.drain
+    groups, groups_run = {}, None
+    try:
+        while True:
+            message = inbox.get()
+            if message is None:
+                break
+            if message[0] == "rates":
+                _, total, host_rates = message
+                engine.bandwidth.set_rate(total)
+                for host, rate in host_rates.items():
+                    engine.bandwidth.set_host_rate(host, rate)
+                continue
+            _, run_id, entries = message
+            if run_id != groups_run:
+                groups, groups_run = {}, run_id
+            plan = Plan([entry[1] for entry in entries], groups)
+            for index, entry in enumerate(entries):
+                _, file_path, server_config, remote_path, size, delivery, port, remote_dir = entry
+                plan.add(PlannedFile(index, file_path, server_config, remote_path, size, delivery), port, remote_dir)
+            engine.submit_plan(plan, scheduler, _MetricsRelay(outbox, run_id),
+                               functools.partial(_report, outbox, [entry[0] for entry in entries]))
+    finally:
+        scheduler.close()
+        scheduler.join()
+        engine.close()
@@ -0,0 +1,84 @@
+"""Server profiles: where each server type uploads to and how sessions to a host are tuned.
+
+A profile is a plain dict. Type profiles give each server type used in
+SERVERS its protocol, port and remote path template. Host profiles add
+transport settings for one host and port. Both can be overridden by
+profiles.json in the state directory:
+
+    {
+      "types": {"sftp3": {"protocol": "sftp", "port": 2022, "remote_path": "/in/{name}"}},
+      "hosts": {"sftp.example.com:2222": {"ciphers": ["aes128-gcm@openssh.com"],
+                                          "compression": false, "window_size": 33554432,
+                                          "chunk_size": 1048576, "max_sessions": 2}}
+    }
+
+`python -m ftpuploader tune` writes the host profiles it measured to be
+fastest. A key set on the server entry in SERVERS wins over both.
+"""
+import json
+import logging
+import os
+
+from .state import state_path
+
+log = logging.getLogger(__name__)
+
+# Built-in type profiles; remote_path is formatted with {name}, the file name
+TYPE_PROFILES = {
+    "sftp": {"protocol": "sftp", "port": 22, "remote_path": "/{name}"},
+    "sftp1": {"protocol": "sftp", "port": 2222, "remote_path": "/{name}"},
+    "sftp2": {"protocol": "sftp", "port": 2222, "remote_path": "/POS/15/1500204/{name}"},  # integration 1500204
+    "sftp2222": {"protocol": "sftp", "port": 2222, "remote_path": "/POS/25/2500100/{name}"},  # tenant 2500100 ONLY
+    "ftp": {"protocol": "ftp", "port": 21, "remote_path": "/{name}"},
+}
+
+# Settings a host profile may carry
+HOST_KEYS = ("ciphers", "kex", "macs", "compression", "window_size", "max_packet_size",
+             "chunk_size", "block_size", "max_sessions")
+
+
+def host_key(host, port):
+    return f"{host}:{port}"
+
+
+class Profiles:
+    """Type and host profiles, read once from profiles.json."""
+
+    def __init__(self, path=None):
+        self.path = path or state_path("profiles.json")
+        try:
+            with open(self.path) as file:
+                self._data = json.load(file)
+        except FileNotFoundError:
+            self._data = {}
+        except ValueError as e:
+            log.warning("Ignoring %s: %s", self.path, e)
+            self._data = {}
+        self.types = {name: dict(profile) for name, profile in TYPE_PROFILES.items()}
+        for name, profile in self._data.get("types", {}).items():
+            self.types[name] = dict(self.types.get(name, {}), **profile)
+        self.hosts = dict(self._data.get("hosts", {}))
+
+    def resolve(self, server_config):
+        """Return a copy of a server entry with its type and host profiles filled in.
+
+        An entry of an unknown type is returned as it is, for check_server
+        to report.
+        """
+        profile = self.types.get(server_config.get("type"))
+        if profile is None:
+            return server_config
+        resolved = dict(profile)
+        port = server_config.get("port", profile.get("port"))
+        resolved.update(self.hosts.get(host_key(server_config.get("host"), port), {}))
+        resolved.update(server_config)
+        return resolved
+
+    def save_host(self, host, port, profile):
+        """Store a host profile and rewrite profiles.json, keeping everything else in it."""
+        self.hosts[host_key(host, port)] = {key: profile[key] for key in HOST_KEYS if key in profile}
+        self._data["hosts"] = self.hosts
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump(self._data, file, indent=2, sort_keys=True)
+        os.replace(temp_path, self.path)
@@ -0,0 +1,27 @@
+"""Protocol drivers, imported only when a server of that protocol is used.
+
+Each driver module provides a Session class (an authenticated
+connection the pool can reuse), is_transient(error) to tell errors worth
+retrying from the rest, and the transfer primitives the engine calls on
+a session's client:
+
+    list_sizes(client, remote_dir)
+    remote_size(client, remote_path)
+    remote_checksum(client, remote_path)   # (algorithm, hex digest) or None
+    remove(client, remote_path)
+    CHECKSUMS                              # algorithms remote_checksum may report
+    send(client, file_path, remote_path, offset, server_config, on_sent, digests=())
+
+and optionally, for sending large files as parallel byte ranges:
+
+    send_segmented(client, file_path, remote_path, segments, server_config, on_sent)
+"""
+import importlib
+
+# Driver modules; a server's profile names one as its "protocol"
+DRIVERS = ("sftp", "ftp")
+
+
+def load(protocol):
+    """Import and return a protocol driver module, e.g. load("sftp")."""
+    return importlib.import_module(f".{protocol}", __name__)
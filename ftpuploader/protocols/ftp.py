@@ -0,0 +1,117 @@
+"""FTP driver built on ftplib."""
+import os
+import time
+from ftplib import FTP, error_perm, error_temp
+
+from ..resilience import is_network_error
+from ..tuning import ftp_block_size
+
+# Digests remote_checksum may report, kept while a file is sent when checksums are on
+CHECKSUMS = ("sha256", "md5")
+
+
+class Session:
+    """An authenticated FTP control connection."""
+
+    used = False
+
+    def __init__(self, host, port, username, password,
+                 connect_timeout=None, auth_timeout=None, transfer_timeout=None):
+        started = time.monotonic()
+        self.client = FTP()
+        self.client.connect(host, port, timeout=connect_timeout)
+        connected = time.monotonic()
+        try:
+            self.client.sock.settimeout(auth_timeout)
+            self.client.login(username, password)
+            # Data connections are opened with self.timeout too
+            self.client.timeout = transfer_timeout
+            self.client.sock.settimeout(transfer_timeout)
+        except Exception:
+            self.client.close()
+            raise
+        self.timings = {"connect": connected - started, "auth": time.monotonic() - connected}
+        self.last_used = time.monotonic()
+
+    def is_alive(self):
+        """Return True if the server still answers a NOOP."""
+        try:
+            self.client.voidcmd("NOOP")
+        except Exception:
+            return False
+        return True
+
+    def keepalive(self):
+        self.client.voidcmd("NOOP")
+
+    def close(self):
+        try:
+            self.client.quit()
+        except Exception:
+            self.client.close()
+
+
+def is_transient(error):
+    """Return True if an error is worth retrying: 4xx replies and network trouble."""
+    return isinstance(error, error_temp) or is_network_error(error)
+
+
+def list_sizes(ftp, remote_dir):
+    """Return {file name: size} for remote_dir from one MLSD."""
+    return {
+        name: int(facts["size"])
+        for name, facts in ftp.mlsd(remote_dir)
+        if facts.get("type") == "file" and "size" in facts
+    }
+
+
+def remote_size(ftp, remote_path):
+    ftp.voidcmd("TYPE I")  # SIZE is only meaningful in binary mode
+    return ftp.size(remote_path)
+
+
+def remove(ftp, remote_path):
+    ftp.delete(remote_path)
+
+
+def remote_checksum(ftp, remote_path):
+    """Return (algorithm, hex digest) from HASH (SHA-256) or XMD5, or None if the server has neither."""
+    try:
+        ftp.sendcmd("OPTS HASH SHA-256")
+        # 213 SHA-256 0-1234 <hash> <file name>
+        return "sha256", ftp.sendcmd(f"HASH {remote_path}").split()[3].lower()
+    except (error_perm, IndexError):
+        pass
+    try:
+        # 250 <hash>, though some servers put the file name first
+        return "md5", ftp.sendcmd(f"XMD5 {remote_path}").split()[-1].lower()
+    except error_perm:
+        return None
+
+
+def send(ftp, file_path, remote_path, offset, server_config, on_sent, digests=()):
+    """Store file_path as remote_path from offset on, with REST+STOR or APPE.
+
+    Every block also goes through the hash objects in digests on its way out.
+    """
+    remote_dir, file_name = remote_path.rsplit("/", 1)
+    ftp.cwd(remote_dir or "/")
+    block_size = ftp_block_size(os.path.getsize(file_path), server_config)
+
+    def sent(block):
+        for digest in digests:
+            digest.update(block)
+        on_sent(len(block))
+    with open(file_path, "rb") as file:
+        file.seek(offset)
+        if not offset:
+            ftp.storbinary(f"STOR {file_name}", file, block_size, sent)
+            return
+        try:
+            ftp.storbinary(f"STOR {file_name}", file, block_size, sent, rest=offset)
+        except error_perm as e:
+            # Servers without REST STOR reject it before any data moves
+            if not str(e).startswith(("500", "501", "502", "504")):
+                raise
+            file.seek(offset)
+            ftp.storbinary(f"APPE {file_name}", file, block_size, sent)
@@ -0,0 +1,195 @@
+"""SFTP driver built on paramiko."""
+import os
+import socket
+import threading
+import time
+
+import paramiko
+
+from ..pool import KEEPALIVE_INTERVAL
+from ..resilience import is_network_error
+from ..tuning import read_ahead, sftp_chunk_size, sftp_options
+
+# Digests remote_checksum may report, kept while a file is sent when checksums are on
+CHECKSUMS = ("md5",)
+
+
+def prefer(preferred, available):
+    """Return available reordered so the preferred names it has come first, in their order."""
+    first = [name for name in preferred if name in available]
+    return tuple(first + [name for name in available if name not in first])
+
+
+class Session:
+    """An authenticated SFTP channel on its own transport.
+
+    ciphers, kex and macs list algorithms to offer first; the server picks
+    the first of ours it supports, and names paramiko lacks are ignored.
+    """
+
+    used = False
+
+    def __init__(self, host, port, username, password, window_size=None, max_packet_size=None,
+                 connect_timeout=None, auth_timeout=None, transfer_timeout=None,
+                 ciphers=None, kex=None, macs=None, compression=False):
+        sizing = {}
+        if window_size:
+            sizing["default_window_size"] = window_size
+        if max_packet_size:
+            sizing["default_max_packet_size"] = max_packet_size
+        started = time.monotonic()
+        sock = socket.create_connection((host, port), timeout=connect_timeout)
+        self.transport = paramiko.Transport(sock, **sizing)
+        try:
+            security = self.transport.get_security_options()
+            if ciphers:
+                security.ciphers = prefer(ciphers, security.ciphers)
+            if kex:
+                security.kex = prefer(kex, security.kex)
+            if macs:
+                security.digests = prefer(macs, security.digests)
+            self.transport.use_compression(bool(compression))
+            if connect_timeout:
+                self.transport.banner_timeout = connect_timeout
+            if auth_timeout:
+                self.transport.auth_timeout = auth_timeout
+            self.transport.start_client(timeout=connect_timeout)
+            connected = time.monotonic()
+            self.transport.auth_password(username, password)
+            self.timings = {"connect": connected - started, "auth": time.monotonic() - connected}
+            # paramiko sends the keepalives from its own transport thread
+            self.transport.set_keepalive(KEEPALIVE_INTERVAL)
+            self.client = paramiko.SFTPClient.from_transport(
+                self.transport, window_size=window_size, max_packet_size=max_packet_size,
+            )
+            # A stalled server raises socket.timeout instead of hanging the worker
+            self.client.get_channel().settimeout(transfer_timeout)
+        except Exception:
+            self.transport.close()
+            raise
+        self.last_used = time.monotonic()
+
+    def is_alive(self):
+        """Return True if the session still answers requests."""
+        if not self.transport.is_active():
+            return False
+        try:
+            self.client.normalize(".")
+        except Exception:
+            return False
+        return True
+
+    def keepalive(self):
+        """Nothing to do, the transport keeps itself alive."""
+
+    def close(self):
+        try:
+            self.client.close()
+        except Exception:
+            pass
+        self.transport.close()
+
+
+def is_transient(error):
+    """Return True if an error is worth retrying on a fresh connection."""
+    if isinstance(error, paramiko.AuthenticationException):
+        return False
+    return isinstance(error, paramiko.SSHException) or is_network_error(error)
+
+
+def list_sizes(sftp, remote_dir):
+    """Return {file name: size} for remote_dir."""
+    return {attr.filename: attr.st_size for attr in sftp.listdir_attr(remote_dir)}
+
+
+def remote_size(sftp, remote_path):
+    return sftp.stat(remote_path).st_size
+
+
+def remove(sftp, remote_path):
+    sftp.remove(remote_path)
+
+
+def remote_checksum(sftp, remote_path):
+    """Return ("md5", hex digest) from the check-file extension, or None if the server lacks it."""
+    try:
+        with sftp.open(remote_path, "rb") as remote:
+            return "md5", remote.check("md5").hex()
+    except (IOError, paramiko.SFTPError) as e:
+        if is_network_error(e):
+            raise
+        return None
+
+
+def send(sftp, file_path, remote_path, offset, server_config, on_sent, digests=()):
+    """Write file_path to remote_path from offset on, with pipelined writes.
+
+    Every chunk also goes through the hash objects in digests on its way out.
+    """
+    with open(file_path, "rb") as local, sftp.open(remote_path, "r+b" if offset else "wb") as remote:
+        local.seek(offset)
+        remote.seek(offset)
+        # Don't wait for each write to be acknowledged
+        remote.set_pipelined(True)
+        for chunk in read_ahead(local, sftp_chunk_size(server_config)):
+            for digest in digests:
+                digest.update(chunk)
+            remote.write(chunk)
+            on_sent(len(chunk))
+
+
+def send_segmented(sftp, file_path, remote_path, segments, server_config, on_sent):
+    """Write file_path to remote_path as byte ranges over parallel SFTP channels.
+
+    Each range gets its own channel on the session's transport (so it
+    counts as one login) and writes at its offset into the same remote
+    file. Every range reads into one reusable buffer, so memory stays flat
+    however big the file is.
+    """
+    size = os.path.getsize(file_path)
+    transport = sftp.get_channel().get_transport()
+    chunk_size = sftp_chunk_size(server_config)
+    # Create or truncate the file once; the ranges only write into it
+    sftp.open(remote_path, "wb").close()
+
+    step = -(-size // segments)
+    ranges = [(start, min(start + step, size)) for start in range(0, size, step)]
+    errors = []
+    # Algorithms were settled by the session's transport; a channel only takes the sizing
+    options = sftp_options(server_config)
+    sizing = {key: options[key] for key in ("window_size", "max_packet_size")}
+
+    def write_range(start, end):
+        client = None
+        try:
+            client = paramiko.SFTPClient.from_transport(transport, **sizing)
+            client.get_channel().settimeout(sftp.get_channel().gettimeout())
+            buffer = memoryview(bytearray(chunk_size))
+            with open(file_path, "rb") as local, client.open(remote_path, "r+b") as remote:
+                local.seek(start)
+                remote.seek(start)
+                remote.set_pipelined(True)
+                position = start
+                while position < end and not errors:
+                    count = local.readinto(buffer[:min(chunk_size, end - position)])
+                    if not count:
+                        raise IOError(f"{file_path} shrank during upload")
+                    remote.write(buffer[:count])
+                    on_sent(count)
+                    position += count
+        except Exception as e:
+            errors.append(e)
+        finally:
+            if client is not None:
+                client.close()
+
+    threads = [
+        threading.Thread(target=write_range, args=bounds, name=f"segment-{n}", daemon=True)
+        for n, bounds in enumerate(ranges)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
@@ -0,0 +1,115 @@
+"""Timeouts, retry with backoff, and per-server circuit breakers.
+
+The timeouts can be overridden per entry in SERVERS with the keys
+"connect_timeout", "auth_timeout" and "transfer_timeout".
+"""
+import errno
+import random
+import socket
+import threading
+import time
+
+# Seconds to wait for the TCP connection (and the SSH handshake)
+CONNECT_TIMEOUT = 15
+
+# Seconds to wait for the login to be accepted
+AUTH_TIMEOUT = 30
+
+# Seconds a transfer may go without the server reading or answering anything
+TRANSFER_TIMEOUT = 60
+
+# Attempts per file, the first one included, when errors are transient
+MAX_ATTEMPTS = 4
+
+# Backoff before retry n is up to BACKOFF_BASE * 2**n seconds, capped at BACKOFF_MAX
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+
+# Consecutive connection failures that open a server's breaker
+BREAKER_THRESHOLD = 3
+
+# Seconds an open breaker fails a server's files before letting one try through
+BREAKER_COOLDOWN = 60
+
+# Socket errors that mean the network or the server hiccuped, not a setting
+TRANSIENT_ERRNOS = {
+    errno.ECONNREFUSED, errno.ECONNRESET, errno.ECONNABORTED, errno.EPIPE,
+    errno.ETIMEDOUT, errno.EHOSTUNREACH, errno.ENETUNREACH, errno.ENETDOWN,
+}
+
+
+class HostUnavailable(Exception):
+    """Raised instead of connecting while a server's breaker is open."""
+
+
+def timeouts(server_config):
+    """Return the Session timeouts for a server."""
+    return {
+        "connect_timeout": server_config.get("connect_timeout", CONNECT_TIMEOUT),
+        "auth_timeout": server_config.get("auth_timeout", AUTH_TIMEOUT),
+        "transfer_timeout": server_config.get("transfer_timeout", TRANSFER_TIMEOUT),
+    }
+
+
+def is_network_error(error):
+    """Return True for timeouts, dropped connections and unreachable hosts."""
+    if isinstance(error, (socket.timeout, ConnectionError, EOFError)):
+        return True
+    return isinstance(error, OSError) and error.errno in TRANSIENT_ERRNOS
+
+
+def backoff_delay(retry, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+    """Seconds to wait before retry number `retry` (0 for the first), with jitter.
+
+    The delay is drawn from the upper half of the exponential step, so
+    workers that failed together don't all come back at the same moment.
+    """
+    step = min(cap, base * 2 ** retry)
+    return random.uniform(step / 2, step)
+
+
+class CircuitBreakers:
+    """One breaker per server address, "host:port", shared by every batch an engine runs.
+
+    After `threshold` connection failures in a row a server's breaker
+    opens and its files fail at once for `cooldown` seconds. Then one
+    attempt is let through: success closes the breaker, failure opens it
+    again. Servers on other ports of the same host are not affected.
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = {}  # server -> consecutive failures
+        self._open_until = {}  # server -> monotonic time the cooldown ends
+        self._trial = set()  # servers with a post-cooldown attempt in flight
+
+    def check(self, server):
+        """Raise HostUnavailable if the server's breaker is open."""
+        with self._lock:
+            until = self._open_until.get(server)
+            if until is None:
+                return
+            remaining = until - time.monotonic()
+            if remaining <= 0 and server not in self._trial:
+                self._trial.add(server)
+                return
+        raise HostUnavailable(f"{server} unavailable after {self.threshold} connection failures; "
+                              f"retrying in {max(0, remaining):.0f}s")
+
+    def success(self, server):
+        with self._lock:
+            self._failures.pop(server, None)
+            self._open_until.pop(server, None)
+            self._trial.discard(server)
+
+    def failure(self, server):
+        """Count a connection failure; return True if it opened the breaker."""
+        with self._lock:
+            failures = self._failures[server] = self._failures.get(server, 0) + 1
+            if server in self._trial or (failures >= self.threshold and server not in self._open_until):
+                self._trial.discard(server)
+                self._open_until[server] = time.monotonic() + self.cooldown
+                return True
+            return False
@@ -0,0 +1,127 @@
+"""Streaming, filtered walk of dropped folders."""
+import fnmatch
+import logging
+import os
+import re
+import threading
+
+log = logging.getLogger(__name__)
+
+# Files handed on at a time while a folder is being scanned
+SCAN_BATCH = 500
+
+# Names skipped unless the caller passes its own exclude patterns
+DEFAULT_EXCLUDE = (".*",)
+
+
+def _compile(patterns):
+    """Return a match function for any of the globs, or None if there are none."""
+    if not patterns:
+        return None
+    regex = re.compile("|".join(fnmatch.translate(os.path.normcase(pattern)) for pattern in patterns))
+    return lambda name, relative: bool(regex.match(os.path.normcase(name)) or regex.match(os.path.normcase(relative)))
+
+
+def walk_files(root, include=(), exclude=DEFAULT_EXCLUDE):
+    """Yield the files under root, depth first, without building a list.
+
+    Patterns are globs matched against a name and against its path
+    relative to root ("*.csv", "archive/*"). A file must match one of
+    include (if given) and none of exclude; an excluded directory is not
+    entered. Symlinked directories are followed once: a directory already
+    visited (by device and inode) is skipped, so link loops end.
+    """
+    root = os.path.abspath(root)
+    included, excluded = _compile(include), _compile(exclude)
+    try:
+        stat = os.stat(root)
+    except OSError as e:
+        log.warning("Skipping %s: %s", root, e)
+        return
+    visited = {(stat.st_dev, stat.st_ino)}
+    # (directory, its path relative to root) still to list; only directories are held
+    pending = [(root, "")]
+    while pending:
+        directory, prefix = pending.pop()
+        try:
+            entries = os.scandir(directory)
+        except OSError as e:
+            log.warning("Skipping %s: %s", directory, e)
+            continue
+        subdirectories = []
+        with entries:
+            for entry in entries:
+                relative = prefix + entry.name
+                if excluded and excluded(entry.name, relative):
+                    continue
+                try:
+                    if entry.is_dir():
+                        stat = entry.stat()
+                        if (stat.st_dev, stat.st_ino) not in visited:
+                            visited.add((stat.st_dev, stat.st_ino))
+                            subdirectories.append((entry.path, relative + "/"))
+                    elif entry.is_file() and (not included or included(entry.name, relative)):
+                        yield entry.path
+                except OSError as e:
+                    log.warning("Skipping %s: %s", entry.path, e)
+        # Reversed so directories come out in listing order
+        pending.extend(reversed(subdirectories))
+
+
+def expand(paths, include=(), exclude=DEFAULT_EXCLUDE):
+    """Yield files from a mix of file and directory paths, walking directories."""
+    for path in paths:
+        if os.path.isdir(path):
+            yield from walk_files(path, include, exclude)
+        elif os.path.isfile(path):
+            yield path
+        else:
+            log.warning("Skipping %s: not a file", path)
+
+
+def batched(iterable, size=SCAN_BATCH):
+    """Yield lists of up to size items."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class FolderScan:
+    """Walks dropped folders on a background thread, handing files on in batches.
+
+    on_batch(file_paths) is called from the scan thread for every
+    SCAN_BATCH files found, so uploads can start long before a big tree
+    is fully walked; on_done(count) is called once at the end.
+    """
+
+    def __init__(self, paths, on_batch, on_done=None, include=(), exclude=DEFAULT_EXCLUDE):
+        self.paths = list(paths)
+        self.on_batch = on_batch
+        self.on_done = on_done
+        self.include = include
+        self.exclude = exclude
+        self.found = 0
+        self.thread = threading.Thread(target=self._run, name="folder-scan", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def is_alive(self):
+        return self.thread.is_alive()
+
+    def _run(self):
+        try:
+            for batch in batched(expand(self.paths, self.include, self.exclude)):
+                self.on_batch(batch)
+                self.found += len(batch)
+        except Exception:
+            log.exception("Scanning %s failed", ", ".join(self.paths))
+        finally:
+            if self.on_done:
+                self.on_done(self.found)
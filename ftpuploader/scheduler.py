@@ -0,0 +1,128 @@
+"""Runs uploads in parallel across servers with global and per-login caps."""
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# Uploads running at once across all servers
+MAX_WORKERS = 8
+
+# Sessions opened at once per login (host, port, username) unless the server
+# sets "max_sessions"; some mall servers reject more than 1-2 logins per account
+PER_LOGIN_LIMIT = 2
+
+# Bytes a queued job's size is discounted by per second it waits, so big
+# files still get their turn while small ones keep arriving
+AGING_RATE = 10 * 1024 * 1024
+
+
+class UploadScheduler:
+    """Worker pool that never exceeds a login's session cap.
+
+    Jobs are queued per login, (host, port, username) as in the
+    connection pool, so a slow server only ties up its own slots while
+    the other workers keep serving the rest, and tenants that share a
+    host each keep their own cap. A free worker takes the smallest job
+    among logins with a free slot (shortest job first), where a job's
+    size shrinks by aging_rate bytes for every second it has waited; jobs
+    of equal size go in submission order. Jobs are fed with submit() for
+    as long as the started workers are running.
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS, per_login_limit=PER_LOGIN_LIMIT, login_limits=None,
+                 aging_rate=AGING_RATE):
+        self.max_workers = max_workers
+        self.per_login_limit = per_login_limit
+        self.login_limits = dict(login_limits or {})
+        self.aging_rate = aging_rate
+
+    def limit_for(self, login):
+        return max(1, self.login_limits.get(login, self.per_login_limit))
+
+    def start(self, workers=None):
+        """Start the workers; jobs can then be submitted until close()."""
+        self._queues = {}  # login -> heap of (priority, sequence, func, on_done)
+        self._sequence = itertools.count()
+        self._active = {}
+        self._unfinished = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"upload-worker-{n}", daemon=True)
+            for n in range(self.max_workers if workers is None else workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, login, func, on_done=None, size=0):
+        """Queue func() for a login; size (bytes) decides its place in line.
+
+        on_done(result, error) is called from the worker thread when it ends;
+        an exception it raises is logged.
+        """
+        # Every waiting job ages at the same rate, so size minus aging_rate
+        # times the wait orders the same as this fixed key
+        priority = size + self.aging_rate * time.monotonic()
+        with self._condition:
+            heapq.heappush(self._queues.setdefault(login, []),
+                           (priority, next(self._sequence), func, on_done))
+            self._active.setdefault(login, 0)
+            self._unfinished += 1
+            self._condition.notify()
+
+    def unfinished(self):
+        """Return how many submitted jobs are queued or running."""
+        with self._condition:
+            return self._unfinished
+
+    def close(self):
+        """Let the workers exit once every submitted job is done."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def _next_job(self):
+        # Called with the condition held
+        best = None
+        for login, queue in self._queues.items():
+            if queue and self._active[login] < self.limit_for(login) and (best is None or queue[0] < best[1][0]):
+                best = (login, queue)
+        if best is None:
+            return None
+        login, queue = best
+        self._active[login] += 1
+        _, _, func, on_done = heapq.heappop(queue)
+        return login, func, on_done
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                job = self._next_job()
+                while job is None:
+                    if self._closed and not any(self._queues.values()):
+                        return
+                    self._condition.wait()
+                    job = self._next_job()
+            login, func, on_done = job
+            try:
+                result, error = func(), None
+            except Exception as e:
+                result, error = None, e
+            try:
+                if on_done:
+                    on_done(result, error)
+            except Exception:
+                # The worker must live on, or the jobs still queued would never run
+                log.exception("Completion callback failed")
+            finally:
+                with self._condition:
+                    self._active[login] -= 1
+                    self._unfinished -= 1
+                    self._condition.notify_all()
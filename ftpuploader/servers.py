@@ -0,0 +1,10 @@
+"""Routing table from file name prefix to upload server.
+
+Keys are file name prefixes of any length (usually 7 characters) and are
+matched case-insensitively; when several match, the longest wins.
+"""
+
+# Server configurations (replace with your server details)
+SERVERS = {
+ 
+}
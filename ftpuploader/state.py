@@ -0,0 +1,11 @@
+"""Where the uploader keeps its on-disk state between runs."""
+import os
+
+# Overridable so several installs (or tests) on one box don't share state
+STATE_DIR = os.environ.get("FTPUPLOADER_STATE_DIR", os.path.join(os.path.expanduser("~"), ".ftpuploader"))
+
+
+def state_path(name):
+    """Return the path of a state file, creating the state directory if needed."""
+    os.makedirs(STATE_DIR, exist_ok=True)
+    return os.path.join(STATE_DIR, name)
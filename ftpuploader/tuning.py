@@ -0,0 +1,105 @@
+"""Transfer tuning for high-latency links: SSH window sizes, chunking and read-ahead.
+
+Every default can be overridden per entry in SERVERS, or per host in a
+profile (see ftpuploader.profiles), with the keys "window_size",
+"max_packet_size", "chunk_size", "block_size", "segment_threshold" and
+"segments". SFTP sessions also take "ciphers", "kex" and "macs" (lists
+of algorithm names to prefer, in order) and "compression".
+"""
+import queue
+import threading
+
+# SSH channel window we advertise; paramiko's 2 MiB default caps a 200 ms link at ~10 MB/s
+WINDOW_SIZE = 16 * 1024 * 1024
+
+# Largest SSH packet we ask for; SFTP writes are capped at 32 KiB per request anyway
+MAX_PACKET_SIZE = 32 * 1024
+
+# Bytes read from disk per SFTP write; paramiko splits it into pipelined requests
+SFTP_CHUNK_SIZE = 256 * 1024
+
+# Local chunks read ahead of the network on a background thread
+READ_AHEAD_DEPTH = 8
+
+# SFTP files at least this big are sent in parallel segments
+SEGMENT_THRESHOLD = 256 * 1024 * 1024
+
+# Segments (SFTP channels on the same login) per large file
+SEGMENTS = 4
+
+# FTP storbinary block size by file size: (files up to this many bytes, block size)
+FTP_BLOCK_SIZES = [
+    (256 * 1024, 32 * 1024),
+    (16 * 1024 * 1024, 256 * 1024),
+    (None, 1024 * 1024),
+]
+
+
+def sftp_options(server_config):
+    """Return the Transport/SFTPClient sizing and algorithm preferences for a server."""
+    options = {
+        "window_size": server_config.get("window_size", WINDOW_SIZE),
+        "max_packet_size": server_config.get("max_packet_size", MAX_PACKET_SIZE),
+    }
+    for key in ("ciphers", "kex", "macs", "compression"):
+        if key in server_config:
+            options[key] = server_config[key]
+    return options
+
+
+def sftp_chunk_size(server_config):
+    return server_config.get("chunk_size", SFTP_CHUNK_SIZE)
+
+
+def segment_count(file_size, server_config):
+    """Return how many parallel segments to split a file into; 1 means a plain upload."""
+    if not file_size or file_size < server_config.get("segment_threshold", SEGMENT_THRESHOLD):
+        return 1
+    return max(1, server_config.get("segments", SEGMENTS))
+
+
+def ftp_block_size(file_size, server_config):
+    """Return the storbinary block size for a file, bigger for bigger files."""
+    if "block_size" in server_config:
+        return server_config["block_size"]
+    for limit, block_size in FTP_BLOCK_SIZES:
+        if limit is None or file_size <= limit:
+            return block_size
+
+
+def read_ahead(file, chunk_size, depth=READ_AHEAD_DEPTH):
+    """Yield chunks of file, reading up to depth chunks ahead on another thread.
+
+    Disk reads overlap with network writes instead of alternating with them.
+    """
+    chunks = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def reader():
+        try:
+            while not stop.is_set():
+                chunk = file.read(chunk_size)
+                chunks.put(chunk)
+                if not chunk:
+                    return
+        except Exception as e:
+            chunks.put(e)
+
+    thread = threading.Thread(target=reader, name="read-ahead", daemon=True)
+    thread.start()
+    try:
+        while True:
+            chunk = chunks.get()
+            if isinstance(chunk, Exception):
+                raise chunk
+            if not chunk:
+                return
+            yield chunk
+    finally:
+        # Unblock the reader if the consumer stopped early
+        stop.set()
+        while thread.is_alive():
+            try:
+                chunks.get_nowait()
+            except queue.Empty:
+                thread.join(0.01)
@@ -0,0 +1,179 @@
+"""Durable queue of files waiting to be uploaded, kept in SQLite."""
+import os
+import sqlite3
+import threading
+import time
+
+from .scheduler import AGING_RATE
+from .state import state_path
+
+# Entry states
+PENDING = "pending"
+IN_FLIGHT = "in-flight"
+DONE = "done"
+FAILED = "failed"
+RETRY = "retry"  # waiting for retry_at
+
+# Finished entries are deleted after this many seconds
+KEEP_FINISHED = 7 * 24 * 3600
+
+# Entries a worker claims at a time; more are claimed once fewer than this are left
+CLAIM_BATCH = 64
+
+# Seconds a draining worker waits for new entries before checking again
+CLAIM_WAIT = 0.2
+
+# A file whose host stays unavailable this many times is marked failed
+MAX_DEFERRALS = 10
+
+
+class UploadQueue:
+    """Files to upload, with their state, in a WAL-mode SQLite database.
+
+    enqueue() only appends rows, so it stays quick however long the queue
+    is. Entries are claimed smallest first, where an entry's size shrinks
+    by AGING_RATE bytes for every second since it was enqueued, as in
+    UploadScheduler; the order holds across the whole queue, not just the
+    entries a run has claimed. Entries claimed by a worker are IN_FLIGHT
+    until they are finished or deferred; if the process dies first,
+    opening the queue again puts them back to PENDING. A path is queued at
+    most once while unfinished.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or state_path("queue.sqlite3")
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # With WAL a commit survives a crash of the process, which is what matters here
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS queue (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                path TEXT NOT NULL,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                retry_at REAL,
+                detail TEXT,
+                updated_at REAL NOT NULL,
+                priority REAL NOT NULL DEFAULT 0
+            );
+            CREATE UNIQUE INDEX IF NOT EXISTS queue_unfinished ON queue (path)
+                WHERE state IN ('pending', 'in-flight', 'retry');
+            CREATE INDEX IF NOT EXISTS queue_state ON queue (state, retry_at);
+        """)
+        with self._db:
+            if "priority" not in [row[1] for row in self._db.execute("PRAGMA table_info(queue)")]:
+                # Queues written before entries had a size: order what is there by age alone
+                self._db.execute("ALTER TABLE queue ADD COLUMN priority REAL NOT NULL DEFAULT 0")
+                self._db.execute("UPDATE queue SET priority = ? * updated_at", (AGING_RATE,))
+            self._db.execute("CREATE INDEX IF NOT EXISTS queue_priority ON queue (state, priority)")
+            self._db.execute("UPDATE queue SET state = ? WHERE state = ?", (PENDING, IN_FLIGHT))
+            self._db.execute("DELETE FROM queue WHERE state IN (?, ?) AND updated_at < ?",
+                             (DONE, FAILED, time.time() - KEEP_FINISHED))
+
+    def enqueue(self, file_paths):
+        """Append files as PENDING and return how many were new."""
+        now = time.time()
+        rows = [(os.path.abspath(path), PENDING, now, _size(path) + AGING_RATE * now) for path in file_paths]
+        with self._lock:
+            with self._db:
+                before = self._db.total_changes
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO queue (path, state, updated_at, priority) VALUES (?, ?, ?, ?)", rows,
+                )
+                added = self._db.total_changes - before
+            if added:
+                self._ready.notify_all()
+        return added
+
+    def claim(self, limit):
+        """Mark up to limit ready entries IN_FLIGHT and return [(id, path)], smallest first.
+
+        Ready means PENDING, or RETRY with retry_at in the past.
+        """
+        with self._lock:
+            return self._claim(limit)
+
+    def wait_and_claim(self, limit, timeout):
+        """Like claim(), but wait up to timeout seconds for something to be enqueued."""
+        with self._lock:
+            entries = self._claim(limit)
+            if not entries:
+                self._ready.wait(timeout)
+                entries = self._claim(limit)
+            return entries
+
+    def finish(self, entry_id, state, detail=None):
+        """Record an entry as DONE or FAILED."""
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE queue SET state = ?, detail = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (state, detail, time.time(), entry_id),
+            )
+
+    def defer(self, entry_id, delay, detail=None):
+        """Put an entry back for another try in delay seconds."""
+        now = time.time()
+        with self._lock:
+            with self._db:
+                self._db.execute(
+                    "UPDATE queue SET state = ?, retry_at = ?, detail = ?, attempts = attempts + 1,"
+                    " updated_at = ? WHERE id = ?",
+                    (RETRY, now + delay, detail, now, entry_id),
+                )
+
+    def attempts(self, entry_id):
+        with self._lock:
+            row = self._db.execute("SELECT attempts FROM queue WHERE id = ?", (entry_id,)).fetchone()
+        return row[0] if row else 0
+
+    def counts(self):
+        """Return {state: number of entries}."""
+        with self._lock:
+            return dict(self._db.execute("SELECT state, COUNT(*) FROM queue GROUP BY state"))
+
+    def unfinished(self):
+        """Return how many entries are not DONE or FAILED yet."""
+        counts = self.counts()
+        return counts.get(PENDING, 0) + counts.get(IN_FLIGHT, 0) + counts.get(RETRY, 0)
+
+    def unfinished_paths(self):
+        """Return the paths of entries that are not DONE or FAILED, oldest first."""
+        with self._lock:
+            return [row[0] for row in self._db.execute(
+                "SELECT path FROM queue WHERE state IN (?, ?, ?) ORDER BY id", (PENDING, IN_FLIGHT, RETRY),
+            )]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _claim(self, limit):
+        # Called with the lock held. Pending and due entries are read apart
+        # so each query can use its index, then merged in priority order
+        rows = self._db.execute(
+            "SELECT priority, id, path FROM queue WHERE state = ? ORDER BY priority, id LIMIT ?",
+            (PENDING, limit),
+        ).fetchall()
+        rows += self._db.execute(
+            "SELECT priority, id, path FROM queue WHERE state = ? AND retry_at <= ? ORDER BY priority, id LIMIT ?",
+            (RETRY, time.time(), limit),
+        ).fetchall()
+        rows = [(entry_id, path) for _, entry_id, path in sorted(rows)[:limit]]
+        if rows:
+            with self._db:
+                self._db.executemany(
+                    "UPDATE queue SET state = ?, updated_at = ? WHERE id = ?",
+                    [(IN_FLIGHT, time.time(), entry_id) for entry_id, _ in rows],
+                )
+        return rows
+
+
+def _size(path):
+    """Return a file's size, or 0 if it cannot be read (the upload will say why)."""
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
@@ -0,0 +1,47 @@
+"""Checking uploads against the server: sizes from directory listings, optional checksums.
+
+A server entry in SERVERS can set "verify" to "size" (the default),
+"checksum" (size, then the server's checksum where it offers one) or
+"none". Files sent as parallel segments get at least the size check
+whatever the setting.
+"""
+import hashlib
+
+# What is checked after upload unless the server entry says otherwise
+VERIFY = "size"
+VERIFY_MODES = ("none", "size", "checksum")
+
+# A group's finished uploads are checked with one listing once this many are waiting
+VERIFY_BATCH = 200
+
+# Tries at checking a batch when the server cannot be reached; its files fail after that
+VERIFY_ATTEMPTS = 2
+
+# Bytes read at a time when a resumed file's already-sent part is hashed
+HASH_CHUNK = 1024 * 1024
+
+
+def verify_mode(server_config):
+    return server_config.get("verify", VERIFY)
+
+
+def new_digests(names):
+    """Return {name: hash object} to feed with a file's bytes as they are sent."""
+    return {name: hashlib.new(name) for name in names}
+
+
+def hash_prefix(file_path, length, digests):
+    """Feed the first length bytes of a file to digests.
+
+    Needed when a transfer resumes, since those bytes went out in an
+    earlier attempt and never pass through this one, and for segmented
+    uploads, whose ranges go out in parallel.
+    """
+    with open(file_path, "rb") as file:
+        while length > 0:
+            chunk = file.read(min(HASH_CHUNK, length))
+            if not chunk:
+                break
+            for digest in digests.values():
+                digest.update(chunk)
+            length -= len(chunk)
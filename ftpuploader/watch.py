@@ -0,0 +1,131 @@
+"""Watch-folder daemon that uploads files as they land in a drop directory."""
+import logging
+import os
+import shutil
+import threading
+import time
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:  # not on Linux, or not installed: poll instead
+    INotify = None
+
+from .engine import SKIPPED, UNAVAILABLE, UPLOADED
+from .metrics import TransferMetrics, save_run
+
+log = logging.getLogger(__name__)
+
+# Seconds between directory scans when inotify is unavailable
+POLL_INTERVAL = 5
+
+# A file must keep the same size and mtime this long before it is uploaded
+SETTLE_SECONDS = 3
+
+
+class DropFolderWatcher:
+    """Uploads files from drop_dir and moves them to done_dir or failed_dir.
+
+    A file is only picked up once its size and mtime have not changed for
+    `settle` seconds, so exports still being written are left alone.
+    inotify only wakes the loop early; the settle check decides.
+    """
+
+    def __init__(self, engine, drop_dir, done_dir=None, failed_dir=None,
+                 settle=SETTLE_SECONDS, interval=POLL_INTERVAL, report=None, prometheus=None):
+        self.engine = engine
+        self.drop_dir = os.path.abspath(drop_dir)
+        self.done_dir = done_dir or os.path.join(self.drop_dir, "done")
+        self.failed_dir = failed_dir or os.path.join(self.drop_dir, "failed")
+        self.settle = settle
+        self.interval = interval
+        self.report = report
+        self.prometheus = prometheus
+        self.stop_event = threading.Event()
+        self._seen = {}  # path -> (size, mtime, time the pair was first seen)
+        self._inotify = None
+
+    def run(self):
+        """Watch until stop() is called."""
+        os.makedirs(self.done_dir, exist_ok=True)
+        os.makedirs(self.failed_dir, exist_ok=True)
+        if INotify is not None:
+            self._inotify = INotify()
+            self._inotify.add_watch(self.drop_dir, flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE)
+            log.info("Watching %s with inotify", self.drop_dir)
+        else:
+            log.info("Watching %s every %ss", self.drop_dir, self.interval)
+        try:
+            while not self.stop_event.is_set():
+                ready = self.stable_files()
+                if ready:
+                    self.process(ready)
+                self._wait()
+        finally:
+            if self._inotify is not None:
+                self._inotify.close()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def stable_files(self):
+        """Return files whose size and mtime have settled."""
+        now = time.monotonic()
+        current = {}
+        with os.scandir(self.drop_dir) as entries:
+            for entry in entries:
+                if not entry.is_file() or entry.name.startswith("."):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                signature = (stat.st_size, stat.st_mtime_ns)
+                previous = self._seen.get(entry.path)
+                if previous and previous[:2] == signature:
+                    current[entry.path] = previous
+                else:
+                    current[entry.path] = signature + (now,)
+        self._seen = current
+        return sorted(path for path, (_, _, since) in current.items() if now - since >= self.settle)
+
+    def process(self, paths):
+        """Upload settled files and move each to done or failed.
+
+        Files for a server whose circuit breaker is open stay in the drop
+        directory and are tried again once the breaker lets them through.
+        """
+        metrics = TransferMetrics()
+        outcomes = self.engine.upload_batch(paths, metrics)
+        save_run(metrics, self.report, self.prometheus)
+        for file_path, server_config, status, detail in outcomes:
+            if status == UPLOADED:
+                log.info("Uploaded %s to %s", os.path.basename(file_path), server_config["username"])
+                self._move(file_path, self.done_dir)
+            elif status == SKIPPED:
+                log.info("Skipped %s: %s", os.path.basename(file_path), detail)
+                self._move(file_path, self.done_dir)
+            elif status == UNAVAILABLE:
+                log.warning("Deferred %s: %s", os.path.basename(file_path), detail)
+                continue
+            else:
+                log.warning("Failed %s: %s", os.path.basename(file_path), detail)
+                self._move(file_path, self.failed_dir)
+            self._seen.pop(file_path, None)
+
+    def _move(self, file_path, target_dir):
+        target = os.path.join(target_dir, os.path.basename(file_path))
+        if os.path.exists(target):
+            stem, ext = os.path.splitext(target)
+            target = f"{stem}.{time.strftime('%Y%m%d%H%M%S')}{ext}"
+        try:
+            shutil.move(file_path, target)
+        except OSError as e:
+            log.error("Could not move %s to %s: %s", file_path, target_dir, e)
+
+    def _wait(self):
+        # Poll more often while files are settling so they go out promptly
+        timeout = min(self.interval, self.settle) if self._seen else self.interval
+        if self._inotify is not None:
+            self._inotify.read(timeout=int(timeout * 1000))
+        else:
+            self.stop_event.wait(timeout)
@@ -0,0 +1,95 @@
+"""Fixtures for behaviour tests against the loopback stand-in servers in benchmarks/."""
+import os
+import sys
+import tempfile
+
+# The package and the stand-ins are imported from the repository root; state
+# files the tests do not pass explicitly go to a scratch directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("FTPUPLOADER_STATE_DIR", tempfile.mkdtemp(prefix="ftpuploader-tests-"))
+
+import pytest
+
+from benchmarks.ftp_standin import FTPStandIn
+from benchmarks.sftp_standin import SFTPStandIn
+from ftpuploader import engine as engine_module
+from ftpuploader.engine import UploadEngine
+from ftpuploader.journal import TransferJournal
+from ftpuploader.manifest import DeliveryManifest
+from ftpuploader.profiles import Profiles
+
+USERNAME = "tester"
+PASSWORD = "secret"
+
+STANDINS = {"ftp": FTPStandIn, "sftp": SFTPStandIn}
+
+
+@pytest.fixture(autouse=True)
+def quick_backoff(monkeypatch):
+    """Retry at once instead of backing off for seconds."""
+    monkeypatch.setattr(engine_module, "backoff_delay", lambda retry: 0.01)
+
+
+@pytest.fixture
+def standin(tmp_path):
+    """Return start(protocol): a running stand-in of that protocol, stopped after the test."""
+    servers = []
+
+    def start(protocol, **options):
+        root = tmp_path / f"remote-{protocol}-{len(servers)}"
+        root.mkdir()
+        server = STANDINS[protocol](str(root), users={USERNAME: PASSWORD}, **options).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def make_engine(tmp_path):
+    """Return make(servers): an UploadEngine keeping its state under tmp_path, closed after the test."""
+    engines = []
+
+    def make(servers, **kwargs):
+        state = tmp_path / "state"
+        state.mkdir(exist_ok=True)
+        engine = UploadEngine(servers=servers, journal=TransferJournal(str(state / "journal.json")),
+                              manifest=DeliveryManifest(str(state / "manifest.sqlite3")),
+                              profiles=Profiles(str(state / "profiles.json")), **kwargs)
+        engines.append(engine)
+        return engine
+
+    yield make
+    for engine in engines:
+        engine.close()
+
+
+@pytest.fixture
+def make_file(tmp_path):
+    """Return make(name, size): a local file of random bytes."""
+    source = tmp_path / "source"
+    source.mkdir()
+
+    def make(name, size):
+        path = source / name
+        path.write_bytes(os.urandom(size))
+        return str(path)
+
+    return make
+
+
+def server_entry(protocol, server, **extra):
+    """Return a SERVERS entry for a running stand-in."""
+    return dict({"type": protocol, "host": server.host, "port": server.port,
+                 "username": USERNAME, "password": PASSWORD}, **extra)
+
+
+def remote_file(server, file_path):
+    """Return the bytes a stand-in holds for an uploaded file, or None."""
+    path = os.path.join(server.root, os.path.basename(file_path))
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as file:
+        return file.read()
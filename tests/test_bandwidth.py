@@ -0,0 +1,50 @@
+import threading
+import time
+
+from ftpuploader.bandwidth import BURST_SECONDS, BandwidthLimiter, TokenBucket
+
+
+def timed(func):
+    started = time.monotonic()
+    func()
+    return time.monotonic() - started
+
+
+def test_bucket_paces_to_its_rate_after_the_burst():
+    bucket = TokenBucket(1000000)
+
+    # The burst goes out at once; everything after it at the rate
+    elapsed = timed(lambda: [bucket.take(50000) for _ in range(20)])
+
+    expected = (20 * 50000 - 1000000 * BURST_SECONDS) / 1000000
+    assert expected * 0.9 <= elapsed <= expected + 0.2
+
+
+def test_unlimited_bucket_never_waits():
+    bucket = TokenBucket()
+
+    assert timed(lambda: bucket.take(10 ** 12)) < 0.05
+
+
+def test_lifting_the_cap_releases_a_waiting_caller():
+    bucket = TokenBucket(1000)
+    bucket.take(500)  # spend the burst
+    waiter = threading.Thread(target=bucket.take, args=(10000,))
+    waiter.start()
+    time.sleep(0.1)
+    assert waiter.is_alive()
+
+    bucket.set_rate(None)
+    waiter.join(1)
+    assert not waiter.is_alive()
+
+
+def test_host_cap_and_global_cap_both_apply():
+    limiter = BandwidthLimiter(rate=None, host_rates={"slow.example.com": 100000})
+
+    assert timed(lambda: [limiter.throttle("fast.example.com", 100000) for _ in range(5)]) < 0.05
+    assert timed(lambda: [limiter.throttle("slow.example.com", 25000) for _ in range(4)]) >= 0.4
+
+    limiter.set_rate(200000)
+    limiter.set_host_rate("slow.example.com", None)
+    assert limiter.rates() == (200000, {"slow.example.com": None})
@@ -0,0 +1,73 @@
+import os
+import shutil
+
+from conftest import server_entry
+from ftpuploader import manifest as manifest_module
+from ftpuploader.engine import SKIPPED, UPLOADED
+from ftpuploader.manifest import DeliveryManifest
+from ftpuploader.protocols import ftp
+
+
+def test_unchanged_content_is_not_hashed_again(tmp_path, make_file, monkeypatch):
+    manifest = DeliveryManifest(str(tmp_path / "manifest.sqlite3"))
+    path = make_file("TEST_1.txt", 1000)
+    opened = []
+    monkeypatch.setattr(manifest_module, "open", lambda *args: opened.append(args[0]) or open(*args), raising=False)
+    try:
+        first = manifest.content_hash(path)
+        assert manifest.content_hash(path) == first
+        assert len(opened) == 1
+
+        with open(path, "ab") as file:
+            file.write(b"more")
+        assert manifest.content_hash(path) != first
+        assert len(opened) == 2
+    finally:
+        manifest.close()
+
+
+def test_delivered_content_is_skipped_under_any_name(standin, make_engine, make_file):
+    server = standin("ftp")
+    engine = make_engine({"TEST": server_entry("ftp", server)})
+    path = make_file("TEST_1.txt", 1000)
+
+    assert engine.upload_batch([path])[0][2] == UPLOADED
+    assert engine.upload_batch([path])[0][2:] == (SKIPPED, "already delivered")
+
+    # Same content under another name goes to another remote path, so it is sent
+    copy = os.path.join(os.path.dirname(path), "TEST_2.txt")
+    shutil.copy(path, copy)
+    assert engine.upload_batch([copy])[0][2] == UPLOADED
+
+    # Changed content at the same path is sent again
+    with open(path, "ab") as file:
+        file.write(b"more")
+    assert engine.upload_batch([path])[0][2] == UPLOADED
+
+
+def test_a_batch_sends_each_content_and_path_once(standin, make_engine, make_file):
+    server = standin("ftp")
+    engine = make_engine({"TEST": server_entry("ftp", server)})
+    path = make_file("TEST_1.txt", 1000)
+
+    outcomes = engine.upload_batch([path, path])
+
+    assert [outcome[2] for outcome in outcomes] == [UPLOADED, SKIPPED]
+
+
+def test_file_moved_away_after_upload_is_recorded(standin, make_engine, make_file, monkeypatch):
+    server = standin("ftp")
+    engine = make_engine({"TEST": server_entry("ftp", server, verify="none")})
+    path = make_file("TEST_1.txt", 1000)
+    send = ftp.send
+
+    def send_and_move(client, file_path, remote_path, offset, server_config, on_sent, digests=()):
+        send(client, file_path, remote_path, offset, server_config, on_sent, digests)
+        os.rename(file_path, file_path + ".done")
+
+    monkeypatch.setattr(ftp, "send", send_and_move)
+    outcomes = engine.upload_batch([path])
+
+    assert outcomes[0][2] == UPLOADED
+    assert engine.manifest.delivered(engine.manifest.content_hash(path + ".done"), engine.server_id(outcomes[0][1]),
+                                     "/" + os.path.basename(path)) is True
@@ -0,0 +1,73 @@
+import os
+
+from conftest import PASSWORD, USERNAME
+from ftpuploader.engine import FAILED, SKIPPED
+from ftpuploader.planner import PrefixIndex
+
+
+def entry(**extra):
+    return dict({"type": "ftp", "host": "ftp.example.com", "username": USERNAME, "password": PASSWORD}, **extra)
+
+
+def test_longest_prefix_wins_whatever_the_case():
+    short, long = entry(), entry(host="other.example.com")
+    index = PrefixIndex({"H6000": short, "H600099": long})
+
+    assert index.match("H6000_1.txt") is short
+    assert index.match("h600099_1.txt") is long
+    assert index.match("H600098_1.txt") is short
+    assert index.match("H600") is None
+    assert index.match("X_1.txt") is None
+
+
+def test_files_are_grouped_per_destination(make_engine, make_file):
+    engine = make_engine({
+        "A": entry(),
+        "B": entry(type="sftp2"),
+        "C": entry(type="sftp2222"),
+    })
+    paths = [make_file(name, 100) for name in ("A_1.txt", "B_1.txt", "A_2.txt", "C_1.txt", "B_2.txt")]
+
+    plan = engine.plan(paths)
+
+    assert plan.rejected == []
+    assert [(group.remote_dir, [os.path.basename(planned.file_path) for planned in files])
+            for group, files in plan.batches()] == [
+        ("/", ["A_1.txt", "A_2.txt"]),
+        ("/POS/15/1500204/", ["B_1.txt", "B_2.txt"]),
+        ("/POS/25/2500100/", ["C_1.txt"]),
+    ]
+    assert plan.describe().startswith("5 file(s), 0.0 MB in 3 destination(s); 0 not uploaded")
+
+
+def test_files_that_cannot_be_sent_are_rejected_with_the_reason(make_engine, make_file):
+    engine = make_engine({
+        "A": entry(),
+        "BAD": entry(remote_path="/no-name"),
+        "ODD": entry(type="gopher"),
+    })
+    good = make_file("A_1.txt", 100)
+    paths = [good, make_file("BAD_1.txt", 100), make_file("ODD_1.txt", 100), make_file("Z_1.txt", 100),
+             os.path.join(os.path.dirname(good), "A_missing.txt"), good]
+
+    plan = engine.plan(paths)
+
+    rejected = {index: (status, detail) for index, _, _, status, detail in plan.rejected}
+    assert [planned.index for planned in plan.files] == [0]
+    assert rejected[1] == (FAILED, "Misconfigured server: remote_path must be an absolute path containing {name}")
+    assert rejected[2] == (FAILED, "Unsupported server type: gopher")
+    assert rejected[3] == (FAILED, "No server configured for prefix")
+    assert rejected[4][0] == FAILED and rejected[4][1].startswith("Error: ")
+    assert rejected[5] == (SKIPPED, "duplicate in this batch")
+
+
+def test_plans_sharing_groups_reuse_them(make_engine, make_file):
+    engine = make_engine({"A": entry()})
+    groups = {}
+
+    first = engine.plan([make_file("A_1.txt", 100)], groups)
+    second = engine.plan([make_file("A_2.txt", 100)], groups)
+
+    assert len(groups) == 1
+    assert first.batches()[0][0] is second.batches()[0][0]
+    assert [planned.file_path for planned in second.files] == [second.file_paths[0]]
@@ -0,0 +1,105 @@
+import threading
+import time
+
+import pytest
+
+from conftest import PASSWORD, USERNAME, remote_file, server_entry
+from ftpuploader.metrics import FileProgress, TransferMetrics
+from ftpuploader.pool import ConnectionPool
+
+
+class FailingProgress(FileProgress):
+    """Progress that raises a local error as soon as the first block is out, aborting the transfer."""
+
+    def sent(self, nbytes):
+        raise ValueError("local failure")
+
+
+@pytest.mark.parametrize("protocol", ["ftp", "sftp"])
+def test_upload_after_failed_transfer_uses_a_working_session(protocol, standin, make_engine, make_file):
+    server = standin(protocol)
+    engine = make_engine({"TEST": server_entry(protocol, server)})
+    config = engine.servers["TEST"]
+    path = make_file("TEST_1.bin", 2 * 1024 * 1024)
+    metrics = TransferMetrics()
+    metrics.add_file(path, server.host, 2 * 1024 * 1024)
+
+    with pytest.raises(ValueError):
+        engine.upload(path, config, FailingProgress(metrics, path, server.host))
+    # An aborted FTP STOR leaves a reply behind; a session reused after it answers one command late
+    engine.upload(path, config)
+    engine.upload(path, config)
+
+    with open(path, "rb") as file:
+        assert remote_file(server, path) == file.read()
+
+
+def test_failed_action_closes_the_session(standin):
+    server = standin("ftp")
+    pool = ConnectionPool()
+    opened = []
+
+    def fail(client):
+        raise ValueError("local failure")
+
+    try:
+        pool.run("ftp", server.host, server.port, USERNAME, PASSWORD, lambda client: client.pwd(),
+                 on_open=opened.append)
+        pool.run("ftp", server.host, server.port, USERNAME, PASSWORD, lambda client: client.pwd(),
+                 on_open=opened.append)
+        assert len(opened) == 1  # the second run reused the first session
+
+        with pytest.raises(ValueError):
+            pool.run("ftp", server.host, server.port, USERNAME, PASSWORD, fail, on_open=opened.append)
+        assert len(opened) == 1  # a local error is not retried
+
+        pool.run("ftp", server.host, server.port, USERNAME, PASSWORD, lambda client: client.pwd(),
+                 on_open=opened.append)
+        assert len(opened) == 2  # the failed session was not pooled again
+    finally:
+        pool.close_all()
+
+
+def test_fresh_sessions_are_not_probed(standin, monkeypatch):
+    from ftpuploader.protocols import ftp
+
+    server = standin("ftp")
+    pool = ConnectionPool()
+    probes = []
+    monkeypatch.setattr(ftp.Session, "is_alive", lambda session: probes.append(session) or True)
+    try:
+        for _ in range(3):
+            pool.run("ftp", server.host, server.port, USERNAME, PASSWORD, lambda client: client.pwd())
+        assert probes == []
+    finally:
+        pool.close_all()
+
+
+def test_session_being_pinged_is_waited_for_not_replaced(standin, monkeypatch):
+    from ftpuploader.protocols import ftp
+
+    server = standin("ftp")
+    pool = ConnectionPool()
+    opened = []
+    pinging = threading.Event()
+    keepalive = ftp.Session.keepalive
+
+    def slow_keepalive(session):
+        pinging.set()
+        time.sleep(0.2)
+        keepalive(session)
+
+    monkeypatch.setattr(ftp.Session, "keepalive", slow_keepalive)
+    try:
+        pool.run("ftp", server.host, server.port, USERNAME, PASSWORD, lambda client: client.pwd(),
+                 on_open=opened.append)
+        reaper = threading.Thread(target=pool._reap)
+        reaper.start()
+        pinging.wait(1)
+        pool.run("ftp", server.host, server.port, USERNAME, PASSWORD, lambda client: client.pwd(),
+                 on_open=opened.append)
+        reaper.join()
+        assert len(opened) == 1  # the second run waited for the pinged session
+        assert len(pool._idle) == 1
+    finally:
+        pool.close_all()
@@ -0,0 +1,81 @@
+import pytest
+
+from conftest import remote_file, server_entry
+from ftpuploader.bandwidth import BandwidthLimiter
+from ftpuploader.engine import FAILED, UPLOADED
+from ftpuploader.journal import TransferJournal
+from ftpuploader.manifest import DeliveryManifest
+from ftpuploader.processes import ProcessUploadEngine
+from ftpuploader.profiles import Profiles
+
+
+class Inbox:
+    """Stands in for a worker's queue, keeping what was put on it."""
+
+    def __init__(self):
+        self.messages = []
+
+    def put(self, message):
+        self.messages.append(message)
+
+
+@pytest.fixture
+def make_process_engine(tmp_path):
+    """Return make(servers, **kwargs): a ProcessUploadEngine keeping its state under tmp_path."""
+    engines = []
+
+    def make(servers, **kwargs):
+        state = tmp_path / "state"
+        state.mkdir(exist_ok=True)
+        engine = ProcessUploadEngine(servers=servers, journal=TransferJournal(str(state / "journal.json")),
+                                     manifest=DeliveryManifest(str(state / "manifest.sqlite3")),
+                                     profiles=Profiles(str(state / "profiles.json")), **kwargs)
+        engines.append(engine)
+        return engine
+
+    yield make
+    for engine in engines:
+        engine.close()
+
+
+def test_worker_processes_upload_within_the_session_cap(standin, make_process_engine, make_file):
+    server = standin("ftp", max_sessions_per_login=2)
+    engine = make_process_engine({"TEST": server_entry("ftp", server, max_sessions=2)}, processes=3)
+    paths = [make_file(f"TEST_{n}.bin", 100000) for n in range(12)] + [make_file("NONE_1.txt", 10)]
+
+    outcomes = engine.upload_batch(paths)
+
+    assert [outcome[2] for outcome in outcomes] == [UPLOADED] * 12 + [FAILED]
+    assert server.rejected_logins == 0
+    for path in paths[:12]:
+        with open(path, "rb") as file:
+            assert remote_file(server, path) == file.read()
+
+
+def test_caps_are_split_between_busy_workers(make_process_engine):
+    engine = make_process_engine({"TEST": {"type": "ftp", "host": "ftp.example.com", "username": "user",
+                                           "password": "secret", "max_sessions": 2}},
+                                 processes=4, bandwidth=BandwidthLimiter(rate=800, host_rates={"ftp.example.com": 400}))
+    inboxes = [Inbox() for _ in range(4)]
+    engine._workers = [(None, inbox) for inbox in inboxes]
+    first, second = engine._slots("ftp.example.com", 2)
+
+    def rates():
+        engine._send_rates()
+        return [inbox.messages[-1][1:] for inbox in inboxes]
+
+    try:
+        # Nobody busy: each worker could be the only one, so each may use it all
+        assert [share for share, _ in rates()] == [800] * 4
+        engine._busy = {(first, "ftp.example.com"): 3}
+        shares = rates()
+        assert shares[first] == (800, {"ftp.example.com": 400})
+        engine._busy[second, "ftp.example.com"] = 1
+        shares = rates()
+        assert shares[first] == shares[second] == (400, {"ftp.example.com": 200})
+        # Unchanged shares are not sent again
+        count = len(inboxes[first].messages)
+        engine._send_rates()
+        assert len(inboxes[first].messages) == count
+    finally:
+        engine._workers = []
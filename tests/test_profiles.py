@@ -0,0 +1,63 @@
+import json
+
+from ftpuploader.profiles import Profiles
+
+
+def write_profiles(tmp_path, data):
+    path = tmp_path / "profiles.json"
+    path.write_text(json.dumps(data))
+    return str(path)
+
+
+def test_entry_gets_its_type_then_host_profile(tmp_path):
+    profiles = Profiles(write_profiles(tmp_path, {
+        "hosts": {"sftp.example.com:2222": {"ciphers": ["aes128-ctr"], "window_size": 1024, "max_sessions": 2}},
+    }))
+
+    resolved = profiles.resolve({"type": "sftp2", "host": "sftp.example.com", "username": "user",
+                                 "password": "secret", "max_sessions": 4})
+
+    assert resolved["protocol"] == "sftp"
+    assert resolved["port"] == 2222
+    assert resolved["remote_path"] == "/POS/15/1500204/{name}"
+    assert resolved["ciphers"] == ["aes128-ctr"]
+    assert resolved["window_size"] == 1024
+    assert resolved["max_sessions"] == 4  # the entry wins over its host profile
+
+
+def test_host_profile_is_kept_per_port(tmp_path):
+    profiles = Profiles(write_profiles(tmp_path, {"hosts": {"sftp.example.com:22": {"compression": True}}}))
+
+    assert profiles.resolve({"type": "sftp", "host": "sftp.example.com"})["compression"] is True
+    assert "compression" not in profiles.resolve({"type": "sftp1", "host": "sftp.example.com"})
+    assert "compression" not in profiles.resolve({"type": "sftp", "host": "sftp.example.com", "port": 2022})
+
+
+def test_type_profiles_extend_the_built_in_ones(tmp_path):
+    profiles = Profiles(write_profiles(tmp_path, {
+        "types": {"sftp3": {"protocol": "sftp", "port": 2022, "remote_path": "/in/{name}"},
+                  "ftp": {"remote_path": "/upload/{name}"}},
+    }))
+
+    assert profiles.resolve({"type": "sftp3", "host": "h"})["port"] == 2022
+    assert profiles.resolve({"type": "ftp", "host": "h"})["remote_path"] == "/upload/{name}"
+    assert profiles.resolve({"type": "ftp", "host": "h"})["port"] == 21
+
+
+def test_unknown_type_and_bad_file_are_left_alone(tmp_path):
+    path = tmp_path / "profiles.json"
+    path.write_text("{not json")
+    profiles = Profiles(str(path))
+    entry = {"type": "gopher", "host": "h"}
+
+    assert profiles.resolve(entry) is entry
+    assert profiles.resolve({"type": "ftp", "host": "h"})["port"] == 21
+
+
+def test_saved_host_profile_is_read_back(tmp_path):
+    path = write_profiles(tmp_path, {"types": {"sftp3": {"protocol": "sftp", "port": 2022, "remote_path": "/{name}"}}})
+    Profiles(path).save_host("sftp.example.com", 2022, {"window_size": 4096, "elapsed": 1.5})
+
+    profiles = Profiles(path)
+    assert profiles.hosts == {"sftp.example.com:2022": {"window_size": 4096}}
+    assert profiles.resolve({"type": "sftp3", "host": "sftp.example.com"})["window_size"] == 4096
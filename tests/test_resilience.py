@@ -0,0 +1,73 @@
+import os
+import socket
+import time
+
+import pytest
+
+from conftest import server_entry
+from ftpuploader.engine import FAILED, UNAVAILABLE, UPLOADED
+from ftpuploader.resilience import CircuitBreakers, HostUnavailable, backoff_delay
+
+
+def closed_port():
+    """Return a loopback port nothing listens on."""
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def test_refused_port_leaves_other_ports_on_the_host_alone(standin, make_engine, make_file):
+    server = standin("ftp")
+    engine = make_engine({
+        "DEAD": dict(server_entry("ftp", server), port=closed_port()),
+        "LIVE": server_entry("ftp", server),
+    })
+    paths = [make_file(f"DEAD_{n}.txt", 100) for n in range(5)] + [make_file(f"LIVE_{n}.txt", 100) for n in range(5)]
+
+    outcomes = engine.upload_batch(paths)
+
+    statuses = {os.path.basename(path): status for path, _, status, _ in outcomes}
+    assert all(statuses[f"LIVE_{n}.txt"] == UPLOADED for n in range(5))
+    assert all(statuses[f"DEAD_{n}.txt"] in (FAILED, UNAVAILABLE) for n in range(5))
+    assert UNAVAILABLE in {statuses[f"DEAD_{n}.txt"] for n in range(5)}
+
+
+def test_breakers_are_kept_per_host_and_port():
+    breakers = CircuitBreakers(threshold=2, cooldown=60)
+    breakers.failure("example.com:22")
+    breakers.failure("example.com:22")
+
+    with pytest.raises(HostUnavailable):
+        breakers.check("example.com:22")
+    breakers.check("example.com:2222")
+
+
+
+def test_one_attempt_goes_through_after_the_cooldown():
+    breakers = CircuitBreakers(threshold=1, cooldown=0.05)
+    assert breakers.failure("example.com:21") is True
+    with pytest.raises(HostUnavailable):
+        breakers.check("example.com:21")
+
+    time.sleep(0.06)
+    breakers.check("example.com:21")
+    with pytest.raises(HostUnavailable):
+        breakers.check("example.com:21")  # only one trial at a time
+
+    assert breakers.failure("example.com:21") is True  # a failed trial opens it again
+    with pytest.raises(HostUnavailable):
+        breakers.check("example.com:21")
+    time.sleep(0.06)
+    breakers.check("example.com:21")
+    breakers.success("example.com:21")
+    breakers.check("example.com:21")
+    breakers.check("example.com:21")
+
+
+def test_backoff_grows_with_jitter_up_to_the_cap():
+    for retry in range(8):
+        step = min(30.0, 2 ** retry)
+        delays = [backoff_delay(retry) for _ in range(50)]
+        assert all(step / 2 <= delay <= step for delay in delays)
@@ -0,0 +1,39 @@
+import pytest
+
+from conftest import remote_file, server_entry
+from ftpuploader.engine import UPLOADED
+from ftpuploader.protocols import ftp, sftp
+
+DRIVERS = {"ftp": ftp, "sftp": sftp}
+
+
+@pytest.mark.parametrize("protocol", ["ftp", "sftp"])
+def test_retry_resumes_after_a_mid_file_drop(protocol, standin, make_engine, make_file, monkeypatch):
+    server = standin(protocol)
+    engine = make_engine({"TEST": server_entry(protocol, server)})
+    path = make_file("TEST_1.bin", 3 * 1024 * 1024)
+    driver = DRIVERS[protocol]
+    send = driver.send
+    offsets = []
+
+    def dropping_send(client, file_path, remote_path, offset, server_config, on_sent, digests=()):
+        offsets.append(offset)
+        if len(offsets) > 1:
+            return send(client, file_path, remote_path, offset, server_config, on_sent, digests)
+        total = []
+
+        def sent(nbytes):
+            on_sent(nbytes)
+            total.append(nbytes)
+            if sum(total) >= 1024 * 1024:
+                raise ConnectionResetError("connection dropped")
+        return send(client, file_path, remote_path, offset, server_config, sent, digests)
+
+    monkeypatch.setattr(driver, "send", dropping_send)
+    outcomes = engine.upload_batch([path])
+
+    assert outcomes[0][2] == UPLOADED
+    assert offsets[0] == 0
+    assert offsets[1] >= 1024 * 1024
+    with open(path, "rb") as file:
+        assert remote_file(server, path) == file.read()
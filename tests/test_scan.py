@@ -0,0 +1,89 @@
+import os
+import threading
+
+from conftest import server_entry
+from ftpuploader.engine import UPLOADED
+from ftpuploader.scan import FolderScan, batched, expand, walk_files
+from ftpuploader.uploadqueue import UploadQueue
+
+
+def make_tree(root, paths):
+    for path in paths:
+        path = root / path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("x")
+
+
+def relative(root, paths):
+    return sorted(os.path.relpath(path, root).replace(os.sep, "/") for path in paths)
+
+
+def test_walk_filters_names_and_relative_paths(tmp_path):
+    make_tree(tmp_path, ["A_1.csv", "A_2.txt", ".hidden.csv", ".git/A_3.csv", "archive/A_4.csv",
+                         "day/A_5.csv", "day/deep/A_6.csv"])
+
+    assert relative(tmp_path, walk_files(str(tmp_path))) == [
+        "A_1.csv", "A_2.txt", "archive/A_4.csv", "day/A_5.csv", "day/deep/A_6.csv",
+    ]
+    assert relative(tmp_path, walk_files(str(tmp_path), include=["*.csv"], exclude=[".*", "archive"])) == [
+        "A_1.csv", "day/A_5.csv", "day/deep/A_6.csv",
+    ]
+    assert relative(tmp_path, walk_files(str(tmp_path), exclude=["day/*"])) == [
+        ".git/A_3.csv", ".hidden.csv", "A_1.csv", "A_2.txt", "archive/A_4.csv",
+    ]
+
+
+def test_symlink_loops_end(tmp_path):
+    make_tree(tmp_path, ["a/A_1.txt", "a/b/A_2.txt"])
+    os.symlink(tmp_path / "a", tmp_path / "a" / "b" / "back")
+    os.symlink(tmp_path, tmp_path / "a" / "top")
+    os.symlink(tmp_path / "a" / "b", tmp_path / "b_again")
+
+    # Each directory is listed once, through whichever path reached it first
+    assert sorted(os.path.basename(path) for path in walk_files(str(tmp_path))) == ["A_1.txt", "A_2.txt"]
+
+
+def test_expand_mixes_files_and_folders_and_skips_missing_paths(tmp_path):
+    make_tree(tmp_path, ["dropped/A_1.txt", "dropped/sub/A_2.txt", "A_3.txt"])
+
+    files = list(expand([str(tmp_path / "dropped"), str(tmp_path / "A_3.txt"), str(tmp_path / "gone")]))
+
+    assert relative(tmp_path, files) == ["A_3.txt", "dropped/A_1.txt", "dropped/sub/A_2.txt"]
+    assert list(batched(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+
+def test_folder_scan_hands_files_on_and_reports_the_count(tmp_path):
+    make_tree(tmp_path, [f"dropped/A_{n}.txt" for n in range(7)])
+    batches, done = [], []
+
+    scan = FolderScan([str(tmp_path / "dropped")], batches.append, done.append).start()
+    scan.thread.join()
+
+    assert relative(tmp_path, [path for batch in batches for path in batch]) == [
+        f"dropped/A_{n}.txt" for n in range(7)
+    ]
+    assert done == [7]
+
+
+def test_drain_waits_for_files_enqueued_as_a_scan_ends(tmp_path, standin, make_engine, make_file):
+    server = standin("ftp")
+    engine = make_engine({"TEST": server_entry("ftp", server)})
+    upload_queue = UploadQueue(str(tmp_path / "queue.sqlite3"))
+    wait_and_claim = upload_queue.wait_and_claim
+    finished = threading.Event()
+
+    def claim_then_finish_scan(limit, timeout):
+        entries = wait_and_claim(limit, timeout)
+        if not entries and not finished.is_set():
+            # The scan's last batch lands after the claim came back empty
+            upload_queue.enqueue([make_file("TEST_1.txt", 100)])
+            finished.set()
+        return entries
+
+    upload_queue.wait_and_claim = claim_then_finish_scan
+    try:
+        outcomes = engine.drain(upload_queue, more=lambda: not finished.is_set())
+    finally:
+        upload_queue.close()
+
+    assert [outcome[2] for outcome in outcomes] == [UPLOADED]
@@ -0,0 +1,103 @@
+import sqlite3
+import threading
+import time
+
+from conftest import server_entry
+from ftpuploader.engine import FAILED
+from ftpuploader.scheduler import UploadScheduler
+
+
+def test_each_login_keeps_its_own_session_cap():
+    # Two tenants on one host, as with the sftp2 and sftp2222 types
+    first = ("sftp.example.com", 2222, "tenant1")
+    second = ("sftp.example.com", 2222, "tenant2")
+    scheduler = UploadScheduler(max_workers=8, login_limits={first: 1, second: 3})
+    lock = threading.Lock()
+    active = {first: 0, second: 0}
+    peak = {first: 0, second: 0}
+
+    def job(login):
+        with lock:
+            active[login] += 1
+            peak[login] = max(peak[login], active[login])
+        time.sleep(0.05)
+        with lock:
+            active[login] -= 1
+
+    scheduler.start()
+    for _ in range(6):
+        scheduler.submit(first, lambda: job(first))
+        scheduler.submit(second, lambda: job(second))
+    scheduler.close()
+    scheduler.join()
+
+    assert peak == {first: 1, second: 3}
+
+
+def test_failing_callback_leaves_the_worker_running():
+    login = ("ftp.example.com", 21, "user")
+    scheduler = UploadScheduler(max_workers=1)
+    done = []
+
+    def broken(result, error):
+        raise RuntimeError("callback failed")
+
+    scheduler.start()
+    scheduler.submit(login, lambda: 1, broken)
+    scheduler.submit(login, lambda: 2, lambda result, error: done.append(result))
+    scheduler.close()
+    scheduler.join()
+
+    assert done == [2]
+    assert scheduler.unfinished() == 0
+
+
+def test_file_whose_delivery_cannot_be_recorded_is_reported_failed(standin, make_engine, make_file, monkeypatch):
+    server = standin("ftp")
+    engine = make_engine({"TEST": server_entry("ftp", server)})
+    paths = [make_file(f"TEST_{n}.txt", 1000) for n in range(3)]
+
+    def broken_record(*args):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(engine.manifest, "record", broken_record)
+    outcomes = engine.upload_batch(paths)
+
+    assert [outcome[2:] for outcome in outcomes] == [(FAILED, "Error: database is locked")] * 3
+
+
+def test_smallest_jobs_go_first():
+    login = ("ftp.example.com", 21, "user")
+    scheduler = UploadScheduler(max_workers=1, aging_rate=0)
+    release = threading.Event()
+    order = []
+
+    scheduler.start()
+    # Holds the only worker until everything else is queued
+    scheduler.submit(login, release.wait)
+    for size in (5000000, 10, 300000, 2000):
+        scheduler.submit(login, lambda size=size: order.append(size), size=size)
+    release.set()
+    scheduler.close()
+    scheduler.join()
+
+    assert order == [10, 2000, 300000, 5000000]
+
+
+def test_waiting_jobs_age_past_newer_smaller_ones():
+    login = ("ftp.example.com", 21, "user")
+    # 1 GB/s: a job that waited 0.2 s counts as 200 MB smaller
+    scheduler = UploadScheduler(max_workers=1, aging_rate=1e9)
+    release = threading.Event()
+    order = []
+
+    scheduler.start()
+    scheduler.submit(login, release.wait)
+    scheduler.submit(login, lambda: order.append("big"), size=50000000)
+    time.sleep(0.2)
+    scheduler.submit(login, lambda: order.append("small"), size=1)
+    release.set()
+    scheduler.close()
+    scheduler.join()
+
+    assert order == ["big", "small"]
@@ -0,0 +1,70 @@
+import paramiko
+
+from conftest import remote_file, server_entry
+from ftpuploader.engine import FAILED, UPLOADED
+from ftpuploader.protocols import sftp
+
+
+def segmented_entry(server, **extra):
+    """Return a SERVERS entry that sends files of 1 MiB and up in 3 segments."""
+    return server_entry("sftp", server, segment_threshold=1024 * 1024, segments=3, **extra)
+
+
+def test_large_file_is_sent_in_segments(standin, make_engine, make_file, monkeypatch):
+    server = standin("sftp")
+    engine = make_engine({"TEST": segmented_entry(server)})
+    path = make_file("TEST_1.bin", 3 * 1024 * 1024 + 5)
+    send_segmented = sftp.send_segmented
+    calls = []
+
+    def counting_send(client, file_path, remote_path, segments, server_config, on_sent):
+        calls.append(segments)
+        send_segmented(client, file_path, remote_path, segments, server_config, on_sent)
+
+    monkeypatch.setattr(sftp, "send_segmented", counting_send)
+    outcomes = engine.upload_batch([path])
+
+    assert outcomes[0][2] == UPLOADED
+    assert calls == [3]
+    with open(path, "rb") as file:
+        assert remote_file(server, path) == file.read()
+
+
+def test_segment_channel_that_cannot_open_fails_the_upload(standin, make_engine, make_file, monkeypatch):
+    server = standin("sftp")
+    engine = make_engine({"TEST": segmented_entry(server, verify="none")})
+    path = make_file("TEST_1.bin", 3 * 1024 * 1024)
+    send_segmented = sftp.send_segmented
+    from_transport = paramiko.SFTPClient.from_transport
+    segmenting = []
+
+    def refusing_from_transport(transport, **kwargs):
+        if segmenting:
+            raise ValueError("channel refused")
+        return from_transport(transport, **kwargs)
+
+    def flagged_send(*args):
+        segmenting.append(True)
+        try:
+            send_segmented(*args)
+        finally:
+            segmenting.clear()
+
+    monkeypatch.setattr(paramiko.SFTPClient, "from_transport", staticmethod(refusing_from_transport))
+    monkeypatch.setattr(sftp, "send_segmented", flagged_send)
+    outcomes = engine.upload_batch([path])
+
+    assert outcomes[0][2:] == (FAILED, "Error: channel refused")
+
+
+def test_segments_ignore_the_algorithms_in_a_profile(standin, make_engine, make_file):
+    server = standin("sftp")
+    engine = make_engine({"TEST": segmented_entry(server, ciphers=["aes128-ctr"], macs=["hmac-sha2-256"],
+                                                  compression=True)})
+    path = make_file("TEST_1.bin", 3 * 1024 * 1024)
+
+    outcomes = engine.upload_batch([path])
+
+    assert outcomes[0][2] == UPLOADED
+    with open(path, "rb") as file:
+        assert remote_file(server, path) == file.read()
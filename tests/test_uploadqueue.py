@@ -0,0 +1,135 @@
+import sqlite3
+import threading
+import time
+
+from conftest import PASSWORD, USERNAME, server_entry
+from ftpuploader import engine as engine_module
+from ftpuploader.resilience import CircuitBreakers
+from ftpuploader.uploadqueue import DONE, FAILED, IN_FLIGHT, PENDING, UploadQueue
+
+
+def test_in_flight_entries_are_queued_again_after_a_crash(tmp_path):
+    path = str(tmp_path / "queue.sqlite3")
+    upload_queue = UploadQueue(path)
+    upload_queue.enqueue(["/data/A_1.txt", "/data/A_2.txt", "/data/A_3.txt"])
+    claimed = upload_queue.claim(2)
+    upload_queue.finish(claimed[0][0], DONE)
+    assert upload_queue.counts() == {DONE: 1, IN_FLIGHT: 1, PENDING: 1}
+    # The process dies here: the second claimed entry is never finished
+    upload_queue.close()
+
+    reopened = UploadQueue(path)
+    try:
+        assert reopened.counts() == {DONE: 1, PENDING: 2}
+        assert [path for _, path in reopened.claim(10)] == ["/data/A_2.txt", "/data/A_3.txt"]
+    finally:
+        reopened.close()
+
+
+def test_a_path_is_queued_once_while_unfinished(tmp_path):
+    upload_queue = UploadQueue(str(tmp_path / "queue.sqlite3"))
+    try:
+        assert upload_queue.enqueue(["/data/A_1.txt"]) == 1
+        assert upload_queue.enqueue(["/data/A_1.txt"]) == 0
+        entry_id, _ = upload_queue.claim(1)[0]
+        upload_queue.finish(entry_id, DONE)
+        assert upload_queue.enqueue(["/data/A_1.txt"]) == 1
+    finally:
+        upload_queue.close()
+
+
+def test_refused_login_is_tried_again_after_the_cooldown(tmp_path, standin, make_engine, make_file):
+    server = standin("ftp")
+    engine = make_engine({"TEST": server_entry("ftp", server)}, breakers=CircuitBreakers(cooldown=0.2))
+    upload_queue = UploadQueue(str(tmp_path / "queue.sqlite3"))
+    scanning = threading.Event()
+    scanning.set()
+    outcomes = []
+    drain = threading.Thread(target=lambda: outcomes.extend(engine.drain(upload_queue, more=scanning.is_set)))
+
+    def wait_for(counts):
+        deadline = time.monotonic() + 5
+        while upload_queue.counts() != counts and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert upload_queue.counts() == counts
+
+    try:
+        server.users[USERNAME] = "changed"
+        upload_queue.enqueue([make_file("TEST_1.txt", 100)])
+        drain.start()
+        wait_for({FAILED: 1})
+
+        # Same destination, same drain: the login works again once the cooldown is over
+        server.users[USERNAME] = PASSWORD
+        time.sleep(0.25)
+        upload_queue.enqueue([make_file("TEST_2.txt", 100)])
+        wait_for({FAILED: 1, DONE: 1})
+    finally:
+        scanning.clear()
+        drain.join()
+        upload_queue.close()
+
+    assert [outcome[2] for outcome in outcomes] == [engine_module.FAILED, engine_module.UPLOADED]
+
+
+def test_smallest_entries_are_claimed_first_across_the_queue(tmp_path, make_file):
+    upload_queue = UploadQueue(str(tmp_path / "queue.sqlite3"))
+    try:
+        paths = [make_file(f"A_{n}.txt", size) for n, size in enumerate((5000000, 10, 300000, 2000))]
+        upload_queue.enqueue(paths)
+        assert [path for _, path in upload_queue.claim(2)] == [paths[1], paths[3]]
+        assert [path for _, path in upload_queue.claim(2)] == [paths[2], paths[0]]
+    finally:
+        upload_queue.close()
+
+
+def test_waiting_entries_age_past_newer_smaller_ones(tmp_path, make_file, monkeypatch):
+    upload_queue = UploadQueue(str(tmp_path / "queue.sqlite3"))
+    big, small = make_file("A_1.txt", 3 * 1024 * 1024), make_file("A_2.txt", 10)
+    try:
+        # Enqueued a second apart: 10 MiB of aging outweighs the 3 MiB difference
+        monkeypatch.setattr(time, "time", lambda: 1000.0)
+        upload_queue.enqueue([big])
+        monkeypatch.setattr(time, "time", lambda: 1001.0)
+        upload_queue.enqueue([small])
+        assert [path for _, path in upload_queue.claim(2)] == [big, small]
+    finally:
+        upload_queue.close()
+
+
+def test_due_retries_take_their_place_by_size(tmp_path, make_file):
+    upload_queue = UploadQueue(str(tmp_path / "queue.sqlite3"))
+    try:
+        paths = [make_file(f"A_{n}.txt", size) for n, size in enumerate((10, 2000, 300000))]
+        upload_queue.enqueue(paths)
+        entry_id, _ = upload_queue.claim(1)[0]
+        upload_queue.defer(entry_id, 0)
+        assert [path for _, path in upload_queue.claim(3)] == paths
+    finally:
+        upload_queue.close()
+
+
+def test_queue_from_before_sizes_is_claimed_by_age(tmp_path):
+    path = str(tmp_path / "queue.sqlite3")
+    db = sqlite3.connect(path)
+    db.executescript("""
+        CREATE TABLE queue (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            path TEXT NOT NULL,
+            state TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            retry_at REAL,
+            detail TEXT,
+            updated_at REAL NOT NULL
+        );
+        INSERT INTO queue (path, state, updated_at) VALUES ('/data/A_2.txt', 'pending', 2000);
+        INSERT INTO queue (path, state, updated_at) VALUES ('/data/A_1.txt', 'pending', 1000);
+    """)
+    db.close()
+
+    upload_queue = UploadQueue(path)
+    try:
+        upload_queue.enqueue(["/data/A_3.txt"])
+        assert [path for _, path in upload_queue.claim(3)] == ["/data/A_1.txt", "/data/A_2.txt", "/data/A_3.txt"]
+    finally:
+        upload_queue.close()
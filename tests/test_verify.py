@@ -0,0 +1,97 @@
+import os
+
+import pytest
+
+from benchmarks.ftp_standin import _FTPSession
+from conftest import remote_file, server_entry
+from ftpuploader.engine import FAILED, UPLOADED
+from ftpuploader.protocols import sftp
+
+
+def test_file_gone_from_a_drop_server_counts_as_uploaded(standin, make_engine, make_file, monkeypatch):
+    server = standin("ftp")
+    engine = make_engine({"TEST": server_entry("ftp", server)})
+    paths = [make_file(f"TEST_{n}.txt", 1000) for n in range(3)]
+    stored = []
+    store = _FTPSession.do_STOR
+
+    def collect_at_once(session, argument, append=False):
+        # Like a drop server that picks every file up as soon as it arrives
+        store(session, argument, append)
+        stored.append(argument)
+        os.remove(session.path(argument)[0])
+
+    monkeypatch.setattr(_FTPSession, "do_STOR", collect_at_once)
+    outcomes = engine.upload_batch(paths)
+
+    assert [outcome[2] for outcome in outcomes] == [UPLOADED] * 3
+    assert len(stored) == 3
+
+
+@pytest.mark.parametrize("verify", ["size", "checksum"])
+def test_damaged_copy_is_uploaded_again(verify, standin, make_engine, make_file, monkeypatch):
+    server = standin("sftp")
+    engine = make_engine({"TEST": server_entry("sftp", server, verify=verify)})
+    path = make_file("TEST_1.bin", 300000)
+    send = sftp.send
+    sends = []
+
+    def damaging_send(client, file_path, remote_path, offset, server_config, on_sent, digests=()):
+        send(client, file_path, remote_path, offset, server_config, on_sent, digests)
+        sends.append(remote_path)
+        if len(sends) == 1:
+            with open(os.path.join(server.root, os.path.basename(file_path)), "r+b") as remote:
+                if verify == "size":
+                    remote.truncate(1000)
+                else:
+                    remote.write(b"damaged")
+
+    monkeypatch.setattr(sftp, "send", damaging_send)
+    outcomes = engine.upload_batch([path])
+
+    assert outcomes[0][2] == UPLOADED
+    assert len(sends) == 2
+    with open(path, "rb") as file:
+        assert remote_file(server, path) == file.read()
+
+
+def test_segmented_upload_is_size_checked_without_verify(standin, make_engine, make_file, monkeypatch):
+    server = standin("sftp")
+    engine = make_engine({"TEST": server_entry("sftp", server, verify="none", segment_threshold=1024 * 1024,
+                                               segments=3)})
+    path = make_file("TEST_1.bin", 3 * 1024 * 1024)
+    send_segmented = sftp.send_segmented
+    sends = []
+
+    def truncating_send(client, file_path, remote_path, segments, server_config, on_sent):
+        send_segmented(client, file_path, remote_path, segments, server_config, on_sent)
+        sends.append(remote_path)
+        if len(sends) == 1:
+            os.truncate(os.path.join(server.root, os.path.basename(file_path)), 1024 * 1024)
+
+    monkeypatch.setattr(sftp, "send_segmented", truncating_send)
+    outcomes = engine.upload_batch([path])
+
+    assert outcomes[0][2] == UPLOADED
+    assert len(sends) == 2
+    with open(path, "rb") as file:
+        assert remote_file(server, path) == file.read()
+
+
+def test_upload_that_cannot_be_checked_is_not_delivered(standin, make_engine, make_file, monkeypatch):
+    server = standin("ftp")
+    engine = make_engine({"TEST": server_entry("ftp", server)})
+    path = make_file("TEST_1.txt", 1000)
+    checks = []
+
+    def unreachable(group, batch):
+        checks.append(batch)
+        raise ConnectionResetError("connection dropped")
+
+    monkeypatch.setattr(engine, "_verify", unreachable)
+    outcomes = engine.upload_batch([path])
+
+    assert outcomes[0][2:] == (FAILED, "Error: could not verify upload: connection dropped")
+    assert len(checks) == 2
+    monkeypatch.delattr(engine, "_verify")
+    assert engine.upload_batch([path])[0][2] == UPLOADED